@@ -0,0 +1,233 @@
+import json
+import queue
+import struct
+import threading
+import time
+import numpy as np
+
+# --- IQ Acquisition ---
+# The producer (the librtlsdr callback, or a file reader) only copies raw
+# unsigned 8-bit IQ into one of a fixed pool of preallocated buffers. A
+# converter thread turns filled buffers into complex64 samples (one float32
+# conversion and scale, in place) and hands them to the consumer as
+# consumer(samples, source). If the live SDR fills every buffer, the block is
+# dropped and counted as an overrun rather than holding up the USB
+# transfer. A file source waits for a free buffer instead, so nothing is
+# lost.
+
+DEFAULT_BUFFER_COUNT = 64
+DEFAULT_BUFFER_BYTES = 32768
+
+# IQ recordings: the magic, a little-endian uint32 header length and a JSON
+# header (sample_rate, center_freq, gain, ...) followed by raw unsigned
+# 8-bit IQ. Files without the magic are read as plain rtl_sdr output.
+IQ_FILE_MAGIC = b'SIGREPIQ'
+
+IQ_SCALE = np.float32(1 / 127.5)
+IQ_ONE = np.float32(1.0)
+
+
+def iq_bytes_to_complex64(raw):
+    # (b - 127.5) / 127.5 per byte, as pyrtlsdr's packed_bytes_to_iq.
+    iq = raw[:len(raw) - len(raw) % 2].astype(np.float32)
+    iq *= IQ_SCALE
+    iq -= IQ_ONE
+    return iq.view(np.complex64)
+
+
+def complex_to_iq_bytes(samples):
+    samples = np.asarray(samples)
+    raw = np.empty(2 * len(samples), dtype=np.uint8)
+    raw[0::2] = np.clip(np.round((samples.real + 1.0) * 127.5), 0, 255)
+    raw[1::2] = np.clip(np.round((samples.imag + 1.0) * 127.5), 0, 255)
+    return raw
+
+
+def write_iq_header(f, metadata):
+    header = json.dumps({'format': 'cu8', **metadata}).encode()
+    f.write(IQ_FILE_MAGIC + struct.pack('<I', len(header)) + header)
+
+
+def read_iq_header(path):
+    # Returns (metadata, offset of the first IQ byte).
+    with open(path, 'rb') as f:
+        if f.read(len(IQ_FILE_MAGIC)) != IQ_FILE_MAGIC:
+            return {}, 0
+        (length,) = struct.unpack('<I', f.read(4))
+        metadata = json.loads(f.read(length))
+    return metadata, len(IQ_FILE_MAGIC) + 4 + length
+
+
+def write_iq_file(path, samples, metadata):
+    # For synthetic test signals: complex samples in [-1, 1].
+    with open(path, 'wb') as f:
+        write_iq_header(f, metadata)
+        complex_to_iq_bytes(samples).tofile(f)
+
+
+class IQSource:
+    name = 'acquire'
+
+    def __init__(self, sample_rate, buffer_count=DEFAULT_BUFFER_COUNT, buffer_bytes=DEFAULT_BUFFER_BYTES):
+        self.sample_rate = sample_rate
+        self.buffer_count = int(buffer_count)
+        self.buffer_bytes = int(buffer_bytes) - int(buffer_bytes) % 2
+        self._free = queue.SimpleQueue()
+        for _ in range(self.buffer_count):
+            self._free.put(np.empty(self.buffer_bytes, dtype=np.uint8))
+        self._filled = queue.SimpleQueue()
+        self._consumer = None
+        self._thread = None
+        self._record_file = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.blocks = 0
+        self.samples = 0
+        self.overruns = 0
+        self.dropped_samples = 0
+        self.high_water = 0
+        self.convert_seconds = 0.0
+
+    def record(self, path, metadata):
+        # Raw bytes are written by the converter thread, never the callback.
+        self._record_file = open(path, 'wb')
+        write_iq_header(self._record_file, {'sample_rate': self.sample_rate, 'started': time.time(), **metadata})
+        return self
+
+    def start(self, consumer):
+        self._consumer = consumer
+        self._thread = threading.Thread(target=self._convert_loop, name='acquire-convert', daemon=True)
+        self._thread.start()
+        return self
+
+    def _filled_block(self, buf, nbytes):
+        with self._lock:
+            self.blocks += 1
+            self.samples += nbytes // 2
+            self.high_water = max(self.high_water, self.buffer_count - self._free.qsize())
+        self._filled.put((buf, nbytes))
+
+    def _push(self, data):
+        try:
+            buf = self._free.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.overruns += 1
+                self.dropped_samples += len(data) // 2
+            return False
+        nbytes = min(len(data), self.buffer_bytes)
+        buf[:nbytes] = data[:nbytes]
+        self._filled_block(buf, nbytes)
+        return True
+
+    def _convert_loop(self):
+        while True:
+            item = self._filled.get()
+            if item is None:
+                return
+            buf, nbytes = item
+            started = time.perf_counter()
+            samples = iq_bytes_to_complex64(buf[:nbytes])
+            if self._record_file is not None:
+                self._record_file.write(buf[:nbytes])
+            self._free.put(buf)
+            with self._lock:
+                self.convert_seconds += time.perf_counter() - started
+            self._consumer(samples, self)
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self, timeout=5.0):
+        # Converts what is still buffered, then ends the converter thread.
+        if self._thread is not None:
+            self._filled.put(None)
+            self._thread.join(timeout)
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'policy': 'pool',
+                'maxsize': self.buffer_count,
+                'queued': self._filled.qsize(),
+                'enqueued': self.blocks,
+                'dropped': self.overruns,
+                'high_water': self.high_water,
+                'samples': self.samples,
+                'dropped_samples': self.dropped_samples,
+                'avg_convert_ms': (self.convert_seconds / self.blocks * 1000.0) if self.blocks else 0.0,
+            }
+
+
+class RtlSdrSource(IQSource):
+    def __init__(self, sdr, buffer_count=DEFAULT_BUFFER_COUNT, buffer_bytes=DEFAULT_BUFFER_BYTES, usb_buffers=0):
+        # librtlsdr transfers are multiples of 512 bytes; usb_buffers=0
+        # keeps its default number of transfers (15).
+        super().__init__(sdr.sample_rate, buffer_count, max(512, int(buffer_bytes) // 512 * 512))
+        self.sdr = sdr
+        self.usb_buffers = int(usb_buffers)
+
+    def run(self):
+        # Blocks until stop().
+        self.sdr.DEFAULT_ASYNC_BUF_NUMBER = self.usb_buffers
+        self.sdr.read_bytes_async(self._on_bytes, num_bytes=self.buffer_bytes)
+
+    def _on_bytes(self, values, context):
+        self._push(np.ctypeslib.as_array(values))
+
+    def stop(self):
+        super().stop()
+        self.sdr.cancel_read_async()
+
+
+class FileSource(IQSource):
+    # An IQ recording (or raw rtl_sdr output, at the given sample_rate).
+    # Paced to the sample rate like a live dongle, or as fast as the
+    # consumer keeps up.
+    def __init__(self, path, sample_rate=None, buffer_count=DEFAULT_BUFFER_COUNT, buffer_bytes=DEFAULT_BUFFER_BYTES,
+                 paced=True, loop=False):
+        self.metadata, self.data_offset = read_iq_header(path)
+        sample_rate = self.metadata.get('sample_rate', sample_rate)
+        if not sample_rate:
+            raise ValueError(f"{path} has no IQ header; a sample rate is required")
+        super().__init__(float(sample_rate), buffer_count, buffer_bytes)
+        self.path = path
+        self.paced = paced
+        self.loop = loop
+
+    def _free_buffer(self):
+        while not self._stop.is_set():
+            try:
+                return self._free.get(timeout=0.2)
+            except queue.Empty:
+                continue
+        return None
+
+    def run(self):
+        # Blocks until the end of the file (or stop()).
+        with open(self.path, 'rb') as f:
+            f.seek(self.data_offset)
+            started = time.monotonic()
+            sent = 0
+            while True:
+                buf = self._free_buffer()
+                if buf is None:
+                    return
+                nbytes = f.readinto(buf)
+                nbytes -= nbytes % 2
+                if nbytes == 0:
+                    self._free.put(buf)
+                    if self.loop and sent:
+                        f.seek(self.data_offset)
+                        continue
+                    return
+                self._filled_block(buf, nbytes)
+                sent += nbytes // 2
+                if self.paced:
+                    delay = started + sent / self.sample_rate - time.monotonic()
+                    if delay > 0 and self._stop.wait(delay):
+                        return
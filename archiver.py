@@ -0,0 +1,393 @@
+import functools
+import glob
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+import signal_db
+
+# --- Audio Transcoding ---
+# ffmpeg does the encoding; it is optional. Without it captures are still
+# sharded and aged out, just not compressed.
+TRANSCODE_ARGS = {
+    'flac': ['-c:a', 'flac', '-compression_level', '8'],
+    'opus': ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip'],
+    'mp3': ['-c:a', 'libmp3lame', '-q:a', '6'],
+}
+AUDIO_EXTENSIONS = ('.wav', '.opus', '.flac', '.mp3')
+FFMPEG_TIMEOUT_SECONDS = 120
+
+
+@functools.lru_cache(maxsize=1)
+def ffmpeg_path():
+    return shutil.which('ffmpeg')
+
+
+@functools.lru_cache(maxsize=1)
+def ffmpeg_encoders():
+    if not ffmpeg_path():
+        return frozenset()
+    try:
+        out = subprocess.run([ffmpeg_path(), '-hide_banner', '-encoders'], capture_output=True, text=True,
+                             timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return frozenset()
+    return frozenset(line.split()[1] for line in out.splitlines() if line.startswith(' A'))
+
+
+def can_transcode(fmt):
+    encoder = {'flac': 'flac', 'opus': 'libopus', 'mp3': 'libmp3lame'}.get(fmt)
+    return encoder in ffmpeg_encoders()
+
+
+def transcode(src, dst, fmt):
+    # Writes dst atomically (via a temporary file) and returns True on success.
+    tmp = dst + '.part'
+    cmd = [ffmpeg_path(), '-nostdin', '-hide_banner', '-loglevel', 'error', '-y', '-i', src,
+           *TRANSCODE_ARGS[fmt], '-f', {'opus': 'ogg'}.get(fmt, fmt), tmp]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=FFMPEG_TIMEOUT_SECONDS)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Archiver: ffmpeg failed for {src}: {e}")
+        result = None
+    if result is None or result.returncode != 0 or not os.path.exists(tmp) or os.path.getsize(tmp) == 0:
+        if result is not None and result.stderr:
+            print(f"Archiver: ffmpeg error for {src}: {result.stderr.strip()}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    os.replace(tmp, dst)
+    return True
+
+
+# --- Transcode Cache ---
+# Compressed copies served by /wavs?fmt=opus|mp3. Entries are keyed by the
+# source's path, size and mtime, so a re-archived or replaced file never
+# serves a stale copy. The oldest-used entries are evicted over max_bytes.
+_transcode_locks = {}
+_transcode_locks_guard = threading.Lock()
+
+
+def _cache_key_lock(key):
+    with _transcode_locks_guard:
+        return _transcode_locks.setdefault(key, threading.Lock())
+
+
+def _evict_cache(cache_dir, max_bytes):
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith('.part'):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            continue
+
+
+def transcoded_copy(src, cache_dir, fmt, max_bytes):
+    # Returns the path of a cached fmt copy of src, or None if ffmpeg can't
+    # produce one.
+    if not can_transcode(fmt):
+        return None
+    st = os.stat(src)
+    digest = hashlib.sha1(f"{os.path.abspath(src)}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(src))[0]
+    dst = os.path.join(cache_dir, f"{stem}.{digest}.{fmt}")
+    with _cache_key_lock(dst):
+        if os.path.exists(dst):
+            os.utime(dst)
+            return dst
+        os.makedirs(cache_dir, exist_ok=True)
+        if not transcode(src, dst, fmt):
+            return None
+    with _transcode_locks_guard:
+        _transcode_locks.pop(dst, None)
+    _evict_cache(cache_dir, max_bytes)
+    return dst
+
+
+# --- Archive Layout ---
+# Fresh captures stay flat in the output directory (the "recent" tier).
+# Once older than ARCHIVE_AFTER_HOURS they are compressed and moved to
+# <output_dir>/archive/YYYY/MM/DD/ (the "archive" tier), and the report's
+# paths are updated. Retention only ever deletes whole archive days.
+ARCHIVE_DIRNAME = 'archive'
+CAPTURE_DATE_RE = re.compile(r'_(\d{4})(\d{2})(\d{2})_\d{6}_')
+
+
+def archive_root(output_dir):
+    return os.path.join(output_dir, ARCHIVE_DIRNAME)
+
+
+def shard_dir(output_dir, ts_ms):
+    return os.path.join(archive_root(output_dir), time.strftime('%Y/%m/%d', time.localtime(ts_ms / 1000.0)))
+
+
+def companion_paths(spectrogram_path):
+    # Files that travel with a spectrogram array (its JSON sidecar).
+    if spectrogram_path and spectrogram_path.endswith('.npy'):
+        return [spectrogram_path, os.path.splitext(spectrogram_path)[0] + '.spec.json']
+    return [spectrogram_path] if spectrogram_path else []
+
+
+def resolve_archived(output_dir, filename):
+    # Finds where a capture originally served as <output_dir>/<filename>
+    # lives now, so old links keep working. Returns a path relative to
+    # output_dir, or None.
+    name = os.path.basename(filename)
+    match = CAPTURE_DATE_RE.search(name)
+    if not match:
+        return None
+    day_dir = os.path.join(archive_root(output_dir), *match.groups())
+    if os.path.exists(os.path.join(day_dir, name)):
+        return os.path.relpath(os.path.join(day_dir, name), output_dir)
+    stem, ext = os.path.splitext(name)
+    if ext.lower() not in AUDIO_EXTENSIONS:
+        return None
+    for candidate in sorted(glob.glob(os.path.join(glob.escape(day_dir), glob.escape(stem) + '.*'))):
+        if os.path.splitext(candidate)[1].lower() in AUDIO_EXTENSIONS:
+            return os.path.relpath(candidate, output_dir)
+    return None
+
+
+# --- Disk Usage ---
+_usage_cache = {}
+_usage_lock = threading.Lock()
+
+
+def _tree_usage(path, skip=None):
+    files = 0
+    total = 0
+    for root, dirs, names in os.walk(path):
+        if skip:
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != skip]
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                continue
+    return {'files': files, 'bytes': total}
+
+
+def tier_usage(output_dir, max_age=300.0):
+    # Walking the tree is slow on an SD card, so results are cached.
+    with _usage_lock:
+        cached = _usage_cache.get(output_dir)
+        if cached and time.time() - cached['sampled_at'] < max_age:
+            return cached
+    usage = {
+        'recent': _tree_usage(output_dir, skip=archive_root(output_dir)),
+        'archive': _tree_usage(archive_root(output_dir)),
+        'free_bytes': shutil.disk_usage(output_dir).free if os.path.isdir(output_dir) else 0,
+        'sampled_at': time.time(),
+    }
+    with _usage_lock:
+        _usage_cache[output_dir] = usage
+    return usage
+
+
+def format_bytes(num):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num < 1024 or unit == 'GB':
+            return f"{num:.0f} {unit}" if unit == 'B' else f"{num:.1f} {unit}"
+        num /= 1024.0
+
+
+# --- Archiver ---
+class Archiver:
+    def __init__(self, output_dir, archive_after_hours=24.0, fmt='auto', retention_days=0,
+                 max_mb=0, interval_minutes=30.0, batch_size=200):
+        self.output_dir = output_dir
+        self.archive_after_hours = float(archive_after_hours)
+        self.fmt = self._pick_format(fmt)
+        self.retention_days = float(retention_days)
+        self.max_bytes = float(max_mb) * 1024 * 1024
+        self.interval = float(interval_minutes) * 60.0
+        self.batch_size = batch_size
+        self._watermark_ms = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.archived = 0
+        self.deleted_days = 0
+        self.errors = 0
+
+    @staticmethod
+    def _pick_format(fmt):
+        if fmt == 'auto':
+            for candidate in ('opus', 'flac'):
+                if can_transcode(candidate):
+                    return candidate
+            return None
+        if fmt in ('none', None):
+            return None
+        if not can_transcode(fmt):
+            print(f"Archiver: ffmpeg with {fmt} support not found; archiving without compression.")
+            return None
+        return fmt
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='archiver', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Archiver error: {e}")
+            self._stop.wait(self.interval)
+
+    def run_once(self):
+        cutoff_ms = int((time.time() - self.archive_after_hours * 3600) * 1000)
+        archived = 0
+        # The watermark only moves past captures that were archived; one
+        # that failed (e.g. ffmpeg error) is retried on the next run.
+        cursor = self._watermark_ms
+        retry_from = None
+        seen = set()
+        while not self._stop.is_set():
+            rows = signal_db.get_unarchived_reports(
+                cursor, cutoff_ms, archive_root(self.output_dir), self.batch_size
+            )
+            start = cursor
+            for uid, ts_ms, audio_path, spectrogram_path in rows:
+                if self._stop.is_set():
+                    break
+                cursor = max(cursor, ts_ms)
+                if uid in seen:
+                    continue
+                seen.add(uid)
+                if self.archive_report(uid, ts_ms, audio_path, spectrogram_path):
+                    archived += 1
+                elif retry_from is None:
+                    retry_from = ts_ms
+            if len(rows) < self.batch_size or cursor == start:
+                break
+        self._watermark_ms = cursor if retry_from is None else max(self._watermark_ms, retry_from)
+        deleted = self.enforce_retention()
+        if archived or deleted:
+            print(f"Archiver: archived {archived} captures, removed {deleted} archive days.")
+            tier_usage(self.output_dir, max_age=0)
+        return archived, deleted
+
+    def archive_report(self, uid, ts_ms, audio_path, spectrogram_path):
+        dest_dir = shard_dir(self.output_dir, ts_ms)
+        os.makedirs(dest_dir, exist_ok=True)
+        new_audio = audio_path
+        if audio_path and os.path.exists(audio_path):
+            stem = os.path.splitext(os.path.basename(audio_path))[0]
+            if self.fmt and audio_path.endswith('.wav'):
+                new_audio = os.path.join(dest_dir, f"{stem}.{self.fmt}")
+                if not transcode(audio_path, new_audio, self.fmt):
+                    self.errors += 1
+                    return False
+            else:
+                new_audio = os.path.join(dest_dir, os.path.basename(audio_path))
+                shutil.copy2(audio_path, new_audio)
+        elif audio_path:
+            new_audio = None
+        moved = []
+        for path in companion_paths(spectrogram_path):
+            if os.path.exists(path):
+                dest = os.path.join(dest_dir, os.path.basename(path))
+                shutil.copy2(path, dest)
+                moved.append(path)
+        new_spec = spectrogram_path
+        if spectrogram_path:
+            new_spec = os.path.join(dest_dir, os.path.basename(spectrogram_path)) if spectrogram_path in moved else None
+        # Point the report at the new files before removing the old ones so
+        # the database never references a missing file.
+        signal_db.update_report_paths(uid, new_audio, new_spec)
+        signal_db.flush_writes()
+        if audio_path and new_audio != audio_path and os.path.exists(audio_path):
+            os.remove(audio_path)
+        for path in moved:
+            os.remove(path)
+        self.archived += 1
+        return True
+
+    def _archive_days(self):
+        days = []
+        for path in sorted(glob.glob(os.path.join(glob.escape(archive_root(self.output_dir)), '*', '*', '*'))):
+            parts = path.split(os.sep)[-3:]
+            try:
+                days.append((time.mktime(time.strptime('/'.join(parts), '%Y/%m/%d')), path))
+            except ValueError:
+                continue
+        return days
+
+    def _delete_day(self, path):
+        signal_db.clear_report_paths_under(path + os.sep)
+        signal_db.flush_writes()
+        shutil.rmtree(path, ignore_errors=True)
+        for parent in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+        self.deleted_days += 1
+
+    def enforce_retention(self):
+        deleted = 0
+        days = self._archive_days()
+        if self.retention_days > 0:
+            oldest_kept = time.time() - self.retention_days * 86400
+            while days and days[0][0] + 86400 < oldest_kept:
+                self._delete_day(days.pop(0)[1])
+                deleted += 1
+        if self.max_bytes > 0 and days:
+            usage = tier_usage(self.output_dir, max_age=0)
+            total = usage['recent']['bytes'] + usage['archive']['bytes']
+            while days and total > self.max_bytes:
+                _, path = days.pop(0)
+                total -= _tree_usage(path)['bytes']
+                self._delete_day(path)
+                deleted += 1
+        return deleted
+
+
+def archiver_from_config(cfg, output_dir):
+    return Archiver(
+        output_dir,
+        archive_after_hours=cfg.get('ARCHIVE_AFTER_HOURS', 24),
+        fmt=cfg.get('ARCHIVE_FORMAT', 'auto'),
+        retention_days=cfg.get('ARCHIVE_RETENTION_DAYS', 0),
+        max_mb=cfg.get('ARCHIVE_MAX_MB', 0),
+        interval_minutes=cfg.get('ARCHIVE_INTERVAL_MINUTES', 30),
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Compress, shard and age out captured audio")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--output-dir', default='wavs')
+    args = parser.parse_args()
+    with open(args.config, 'r') as f:
+        cfg = json.load(f)
+    signal_db.ensure_table_exists()
+    archiver = archiver_from_config(cfg, args.output_dir)
+    archived, deleted = archiver.run_once()
+    signal_db.close_writer()
+    usage = tier_usage(args.output_dir, max_age=0)
+    print(f"Archived {archived} captures ({archiver.fmt or 'uncompressed'}), removed {deleted} archive days.")
+    print(f"Recent: {format_bytes(usage['recent']['bytes'])}, archive: {format_bytes(usage['archive']['bytes'])}, "
+          f"free: {format_bytes(usage['free_bytes'])}")
@@ -0,0 +1,114 @@
+import numpy as np
+from scipy import signal as sig
+
+# --- Streaming NFM Demodulator ---
+# Filters are designed once and all state (last IQ sample, FIR history,
+# decimation phase) is carried between chunks, so consecutive chunks form
+# one continuous audio stream.
+
+def _split_decimation(decimation_factor):
+    # Split large decimation factors into two stages (e.g. 64 -> 8 x 8) so
+    # each FIR stays short. Returns the list of per-stage factors.
+    if decimation_factor < 16:
+        return [decimation_factor]
+    best = None
+    for d in range(4, decimation_factor // 4 + 1):
+        if decimation_factor % d == 0:
+            if best is None or abs(d - decimation_factor ** 0.5) < abs(best - decimation_factor ** 0.5):
+                best = d
+    if best is None:
+        return [decimation_factor]
+    return [best, decimation_factor // best]
+
+
+def _design_decimation_taps(fs_in, decimation_factor, passband_hz, stopband_hz):
+    transition = max(stopband_hz - passband_hz, fs_in * 0.002)
+    numtaps = int(np.ceil(3.3 * fs_in / transition))
+    # numtaps - 1 must be a multiple of the decimation factor so the
+    # polyphase outputs line up with the FIR history (see _FIRDecimator).
+    numtaps = decimation_factor * int(np.ceil((numtaps - 1) / decimation_factor)) + 1
+    cutoff = min(passband_hz + transition / 2.0, fs_in / 2.0 * 0.999)
+    return sig.firwin(numtaps, cutoff, fs=fs_in, window='hamming')
+
+
+class _FIRDecimator:
+    def __init__(self, taps, decimation_factor):
+        self.taps = np.asarray(taps, dtype=np.float64)
+        self.decimation_factor = int(decimation_factor)
+        self._history = np.zeros(len(self.taps) - 1, dtype=np.float64)
+        self._phase = 0
+
+    def reset(self):
+        self._history[:] = 0.0
+        self._phase = 0
+
+    def process(self, x):
+        D = self.decimation_factor
+        if D == 1 and len(self.taps) == 1:
+            return x * self.taps[0]
+        hist_len = len(self._history)
+        buf = np.concatenate((self._history, x))
+        work = buf[self._phase:]
+        if len(work) <= hist_len:
+            self._phase -= len(x)
+            self._history = buf[len(buf) - hist_len:] if hist_len else self._history
+            return np.zeros(0, dtype=np.float64)
+        # upfirdn evaluates the full convolution at indices 0, D, 2D, ...;
+        # keep only the outputs whose window lies entirely inside `work`.
+        first = hist_len // D
+        last = (len(work) - 1) // D
+        y = sig.upfirdn(self.taps, work, 1, D)[first:last + 1]
+        self._phase = self._phase + (last + 1) * D - len(buf)
+        if hist_len:
+            self._history = buf[len(buf) - hist_len:].copy()
+        return y
+
+
+class NFMDemodulator:
+    def __init__(self, sample_rate, audio_rate, cutoff_hz, normalize=True):
+        self.sample_rate = float(sample_rate)
+        self.decimation_factor = max(1, int(self.sample_rate / audio_rate))
+        self.audio_rate = self.sample_rate / self.decimation_factor
+        self.cutoff_hz = min(float(cutoff_hz), self.audio_rate / 2.0 * 0.999)
+        self.normalize = normalize
+        self._last_sample = None
+        self._stages = []
+        fs = self.sample_rate
+        factors = _split_decimation(self.decimation_factor)
+        for i, d in enumerate(factors):
+            fs_out = fs / d
+            if i == len(factors) - 1:
+                stopband = fs_out / 2.0
+            else:
+                # Intermediate stages only need to keep aliases out of the
+                # final passband; the last stage does the sharp cut.
+                stopband = fs_out - self.cutoff_hz
+            taps = _design_decimation_taps(fs, d, self.cutoff_hz, stopband)
+            self._stages.append(_FIRDecimator(taps, d))
+            fs = fs_out
+
+    def reset(self):
+        self._last_sample = None
+        for stage in self._stages:
+            stage.reset()
+
+    def process(self, samples):
+        samples = np.asarray(samples)
+        if len(samples) == 0:
+            return np.zeros(0, dtype=np.float64)
+        # Polar discriminator; the previous chunk's last sample keeps the
+        # first difference of this chunk continuous.
+        prev = samples[0] if self._last_sample is None else self._last_sample
+        delayed = np.empty_like(samples)
+        delayed[0] = prev
+        delayed[1:] = samples[:-1]
+        demodulated = np.angle(samples * np.conj(delayed))
+        self._last_sample = samples[-1]
+        audio = demodulated.astype(np.float64)
+        for stage in self._stages:
+            audio = stage.process(audio)
+        if self.normalize and len(audio):
+            max_abs_val = np.max(np.abs(audio))
+            if max_abs_val > 1e-9:
+                audio = audio / max_abs_val * 0.8
+        return audio
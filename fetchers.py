@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# --- Cached Fetchers ---
+# Lookups for DTMF replies (weather per ZIP code, HF band conditions) run on
+# a small thread pool and are cached per key. A fresh value (younger than
+# ttl) is returned as is; a stale one (up to max_stale past ttl) is returned
+# immediately while a refresh runs in the background; only a missing value
+# is waited for. Concurrent requests for the same key share one fetch. A
+# failed refresh keeps serving the old value.
+
+FETCH_TIMEOUT_SECONDS = 5
+MAX_CACHED_KEYS = 256
+WEATHER_API_URL = "http://api.openweathermap.org/data/2.5/weather"
+HAMQSL_URL = "https://www.hamqsl.com/solarxml.php"
+HF_BANDS = ["80m-40m", "30m-20m", "17m-15m", "12m-10m"]
+
+
+class CachedFetcher:
+    def __init__(self, name, fetch, ttl, max_stale, workers=2):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fetches = 0
+        self.errors = 0
+
+    def age(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else time.time() - entry[1]
+
+    def is_fresh(self, key):
+        age = self.age(key)
+        return age is not None and age < self.ttl
+
+    def refresh(self, key):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self._executor.submit(self._fetch, key)
+            self._inflight[key] = future
+        return future
+
+    def prefetch(self, key):
+        if not self.is_fresh(key):
+            self.refresh(key)
+
+    def _fetch(self, key):
+        try:
+            value = self.fetch(key)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self._inflight.pop(key, None)
+            print(f"{self.name}: fetch for {key} failed: {e}")
+            raise
+        now = time.time()
+        with self._lock:
+            self.fetches += 1
+            self._entries[key] = (value, now)
+            self._inflight.pop(key, None)
+            if len(self._entries) > MAX_CACHED_KEYS:
+                for old_key, _ in sorted(self._entries.items(), key=lambda item: item[1][1])[:len(self._entries) - MAX_CACHED_KEYS]:
+                    del self._entries[old_key]
+        return value
+
+    def get(self, key, timeout=FETCH_TIMEOUT_SECONDS):
+        # Raises the fetch error (or TimeoutError) only when there is no
+        # usable cached value.
+        with self._lock:
+            entry = self._entries.get(key)
+            age = None if entry is None else time.time() - entry[1]
+            if age is not None and age < self.ttl:
+                self.hits += 1
+                return entry[0]
+            stale = age is not None and age < self.ttl + self.max_stale
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+        if stale:
+            self.refresh(key)
+            return entry[0]
+        return self.refresh(key).result(timeout)
+
+    def keep_fresh(self, key):
+        # Refreshes key in the background shortly before it goes stale.
+        def loop():
+            while True:
+                age = self.age(key)
+                wait = 0 if age is None else max(0.0, self.ttl * 0.9 - age)
+                if self._stop.wait(wait):
+                    return
+                try:
+                    self.refresh(key).result(FETCH_TIMEOUT_SECONDS * 2)
+                except Exception:
+                    if self._stop.wait(min(self.ttl, 60)):
+                        return
+        threading.Thread(target=loop, name=f"{self.name}-prefetch", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {'name': self.name, 'keys': len(self._entries), 'hits': self.hits, 'stale_hits': self.stale_hits,
+                    'misses': self.misses, 'coalesced': self.coalesced, 'fetches': self.fetches, 'errors': self.errors}
+
+
+# --- Weather ---
+def weather_report(data):
+    if "main" in data and "weather" in data and "name" in data:
+        temp = data["main"].get("temp")
+        desc = data["weather"][0].get("description", "").capitalize()
+        temp_min = data["main"].get("temp_min")
+        temp_max = data["main"].get("temp_max")
+        city = data.get("name", "your area")
+        humidity = data["main"].get("humidity")
+        wind = data.get("wind", {}).get("speed")
+        report = f"The current temperature in {city} is {int(round(temp))} degrees, {desc}."
+        if temp_max is not None and temp_min is not None:
+            report += f" The high is {int(round(temp_max))} and the low is {int(round(temp_min))} degrees."
+        if humidity is not None:
+            report += f" Humidity is {humidity} percent."
+        if wind is not None:
+            report += f" Wind speed is {int(round(wind))} miles per hour."
+        return report
+    elif "message" in data:
+        return f"Sorry, weather API error: {data['message']}"
+    else:
+        return "Sorry, I could not find the weather for that zip code."
+
+
+class WeatherError(Exception):
+    # A 4xx answer (bad API key, unknown ZIP code); the message is spoken.
+    pass
+
+
+def fetch_weather(zip_code, url=WEATHER_API_URL, session=requests):
+    params = {'zip': f"{zip_code},us", 'appid': os.environ.get("OPENWEATHER_API_KEY"), 'units': 'imperial'}
+    resp = session.get(url, params=params, timeout=FETCH_TIMEOUT_SECONDS)
+    if 400 <= resp.status_code < 500:
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        raise WeatherError(weather_report(data))
+    resp.raise_for_status()
+    return weather_report(resp.json())
+
+
+# --- HF Band Conditions ---
+def hf_band_report(content):
+    root = ET.fromstring(content)
+    bands = {}
+    spoken_lines = []
+    for band_elem in root.findall(".//calculatedconditions/band"):
+        name = band_elem.attrib.get("name")
+        period = band_elem.attrib.get("time")
+        cond = band_elem.text.strip()
+        if name not in bands:
+            bands[name] = {}
+        bands[name][period] = cond
+    for band in HF_BANDS:
+        day = bands.get(band, {}).get("day", "unknown")
+        night = bands.get(band, {}).get("night", "unknown")
+        band_spoken = band.replace("m-", " to ").replace("m", " meter")
+        spoken_lines.append(f"{band_spoken} daytime {day.lower()} night time {night.lower()}")
+    return ". ".join(spoken_lines)
+
+
+def fetch_hf_band_conditions(_key=None, url=HAMQSL_URL, session=requests):
+    resp = session.get(url, timeout=FETCH_TIMEOUT_SECONDS)
+    resp.raise_for_status()
+    return hf_band_report(resp.content)
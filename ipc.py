@@ -0,0 +1,195 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+
+# --- Local IPC ---
+# sigrep serves newline-delimited JSON on a Unix domain socket (TCP on
+# 127.0.0.1 where AF_UNIX isn't available). A client sends one request per
+# line and reads one reply line back; {"cmd": "subscribe"} instead turns the
+# connection into a stream of events, one JSON object per line.
+
+IPC_SOCKET_PATH = 'sigrep.sock'
+IPC_TCP_PORT = 47001
+SUBSCRIBER_QUEUE_EVENTS = 256
+
+
+def ipc_address():
+    if hasattr(socket, 'AF_UNIX'):
+        return socket.AF_UNIX, os.path.abspath(IPC_SOCKET_PATH)
+    return socket.AF_INET, ('127.0.0.1', IPC_TCP_PORT)
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(',', ':'), default=str) + '\n').encode()
+
+
+class IPCServer:
+    def __init__(self):
+        self.family, self.address = ipc_address()
+        self._sock = None
+        self._handlers = {}
+        self._subscribers = []
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers or self._listeners)
+
+    def add_listener(self, callback):
+        # In-process subscriber: callback(event) runs on the publishing thread.
+        self._listeners.append(callback)
+
+    def register(self, cmd, handler):
+        self._handlers[cmd] = handler
+
+    def start(self):
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_UNIX:
+            self._remove_stale_socket()
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(self.address)
+        sock.listen(8)
+        self._sock = sock
+        threading.Thread(target=self._accept_loop, name='ipc-accept', daemon=True).start()
+        print(f"IPC listening on {self.address}")
+        return self
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.address):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.address)
+        except OSError:
+            os.remove(self.address)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"Another sigrep is already listening on {self.address}")
+
+    def stop(self):
+        if self._sock is None:
+            return
+        try:
+            self._sock.close()
+        finally:
+            self._sock = None
+            with self._lock:
+                for q in self._subscribers:
+                    q.put(None)
+                self._subscribers = []
+            if self.family == socket.AF_UNIX and os.path.exists(self.address):
+                os.remove(self.address)
+
+    def publish(self, event_type, **data):
+        if not self.has_subscribers:
+            return
+        data['type'] = event_type
+        data.setdefault('ts', time.time())
+        for callback in self._listeners:
+            callback(data)
+        if not self._subscribers:
+            return
+        line = _encode(data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(line)
+            except queue.Full:
+                self.dropped += 1
+
+    def _accept_loop(self):
+        while self._sock is not None:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), name='ipc-client', daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                reader = conn.makefile('rb')
+                for raw in reader:
+                    try:
+                        request = json.loads(raw)
+                        cmd = request.pop('cmd')
+                    except (ValueError, KeyError, AttributeError):
+                        conn.sendall(_encode({'ok': False, 'error': 'bad request'}))
+                        continue
+                    if cmd == 'subscribe':
+                        self._stream(conn)
+                        return
+                    handler = self._handlers.get(cmd)
+                    if handler is None:
+                        reply = {'ok': False, 'error': f"unknown command: {cmd}"}
+                    else:
+                        try:
+                            reply = {'ok': True, **(handler(**request) or {})}
+                        except Exception as e:
+                            reply = {'ok': False, 'error': str(e)}
+                    conn.sendall(_encode(reply))
+            except OSError:
+                pass
+
+    def _stream(self, conn):
+        q = queue.Queue(SUBSCRIBER_QUEUE_EVENTS)
+        with self._lock:
+            self._subscribers.append(q)
+        try:
+            conn.sendall(_encode({'type': 'hello', 'ts': time.time()}))
+            while True:
+                line = q.get()
+                if line is None:
+                    break
+                conn.sendall(line)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                if q in self._subscribers:
+                    self._subscribers.remove(q)
+
+
+def connect(timeout=1.0):
+    family, address = ipc_address()
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request(cmd, timeout=1.0, **args):
+    # Sends one command and returns its reply. Raises OSError if sigrep
+    # isn't listening or doesn't answer in time.
+    with connect(timeout) as sock:
+        sock.sendall(_encode({'cmd': cmd, **args}))
+        line = sock.makefile('rb').readline()
+    if not line:
+        raise ConnectionError(f"no reply to {cmd}")
+    return json.loads(line)
+
+
+def subscribe(timeout=None):
+    # Yields events until the connection drops. Raises OSError if sigrep
+    # isn't listening.
+    sock = connect()
+    sock.settimeout(timeout)
+    with sock:
+        sock.sendall(_encode({'cmd': 'subscribe'}))
+        for raw in sock.makefile('rb'):
+            try:
+                yield json.loads(raw)
+            except ValueError:
+                continue
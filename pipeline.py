@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+import traceback
+
+# --- Bounded Pipeline Stages ---
+# Each stage owns a bounded queue with an explicit backpressure policy:
+#   block        wait up to put_timeout for space, then drop the new item
+#   drop_newest  never wait; drop the new item when full
+#   drop_oldest  never wait; evict the oldest queued item to make room
+# Drops are counted per stage so overload is visible instead of silent.
+
+BLOCK = 'block'
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+
+
+class StageQueue:
+    def __init__(self, name, maxsize, policy=BLOCK, put_timeout=None):
+        if policy not in (BLOCK, DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def _count_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def put(self, item):
+        if self.policy == DROP_NEWEST:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._count_drop()
+                return False
+        elif self.policy == DROP_OLDEST:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self._count_drop()
+                    except queue.Empty:
+                        pass
+        else:
+            try:
+                self._queue.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                self._count_drop()
+                return False
+        with self._lock:
+            self.enqueued += 1
+            self.high_water = max(self.high_water, self._queue.qsize())
+        return True
+
+    def get(self, timeout=None):
+        return self._queue.get(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'policy': self.policy,
+                'maxsize': self.maxsize,
+                'queued': self._queue.qsize(),
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'high_water': self.high_water,
+            }
+
+
+class Stage:
+    def __init__(self, name, handler, maxsize, workers=1, policy=BLOCK, put_timeout=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.queue = StageQueue(name, maxsize, policy, put_timeout)
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._busy = 0
+        self.processed = 0
+        self.errors = 0
+        self.total_latency = 0.0
+
+    def put(self, item):
+        return self.queue.put((time.monotonic(), item))
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=5.0):
+        # Lets workers drain what is already queued before exiting.
+        deadline = time.monotonic() + timeout
+        while (len(self.queue) or self._busy) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                enqueued_at, item = self.queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._busy += 1
+            try:
+                self.handler(item)
+                with self._lock:
+                    self.processed += 1
+                    self.total_latency += time.monotonic() - enqueued_at
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Error in {self.name} stage: {e}")
+                traceback.print_exc()
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+    def stats(self):
+        stats = self.queue.stats()
+        with self._lock:
+            stats.update({
+                'workers': self.workers,
+                'processed': self.processed,
+                'errors': self.errors,
+                'avg_latency_ms': (self.total_latency / self.processed * 1000.0) if self.processed else 0.0,
+            })
+        return stats
+
+
+def format_stats(stats):
+    return (f"{stats['name']}: queued {stats['queued']}/{stats['maxsize']}, "
+            f"dropped {stats['dropped']}, high water {stats['high_water']}"
+            + (f", processed {stats['processed']}, errors {stats['errors']}, "
+               f"avg latency {stats['avg_latency_ms']:.1f} ms" if 'processed' in stats else "")
+            + (f", merged {stats['merged']}, expired {stats['expired']}" if 'merged' in stats else "")
+            + (f", dropped samples {stats['dropped_samples']}" if 'dropped_samples' in stats else ""))
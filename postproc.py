@@ -0,0 +1,103 @@
+import json
+import os
+import numpy as np
+from scipy import signal as sig
+from scipy.io import wavfile
+from spectrogram import save_spectrogram_array
+
+# --- Post-Processing Workers ---
+# Runs in ProcessPoolExecutor workers (or inline when no pool is
+# configured). init_worker runs once per process, so the HPF design and the
+# Vosk model are loaded once and reused for every segment. When streaming
+# STT transcribes captures in the main process, the model is only loaded
+# the first time a segment still needs recognizing here.
+
+_settings = {}
+_hpf_sos = None
+_vosk_model = None
+_vosk_recognizer = None
+_vosk_tried = False
+
+
+def init_worker(settings):
+    global _settings, _hpf_sos, _vosk_model, _vosk_recognizer, _vosk_tried
+    _settings = dict(settings)
+    _hpf_sos = sig.butter(
+        _settings['hpf_order'],
+        _settings['hpf_cutoff_hz'] / (_settings['sample_rate'] / 2),
+        btype='highpass',
+        output='sos'
+    )
+    _vosk_model = None
+    _vosk_recognizer = None
+    _vosk_tried = False
+    if _settings.get('vosk_preload', True):
+        load_vosk()
+
+
+def load_vosk():
+    global _vosk_model, _vosk_recognizer, _vosk_tried
+    if _vosk_tried:
+        return
+    _vosk_tried = True
+    if _settings.get('stt_engine') != 'vosk':
+        return
+    try:
+        from vosk import Model, KaldiRecognizer, SetLogLevel
+        SetLogLevel(1)
+        model_path = _settings['vosk_model_path']
+        if os.path.exists(model_path):
+            _vosk_model = Model(model_path)
+            _vosk_recognizer = KaldiRecognizer(_vosk_model, _settings['sample_rate'], _settings.get('vosk_grammar'))
+            print(f"Post-processing worker {os.getpid()}: Vosk model loaded.")
+        else:
+            print(f"ERROR: Vosk model path not found: {model_path}")
+    except ImportError:
+        print("ERROR: Vosk library not installed.")
+    except Exception as e:
+        print(f"Error loading Vosk model: {e}")
+
+
+def recognize(audio_data_int16):
+    load_vosk()
+    if _vosk_recognizer is None:
+        print("STT: Recognizer not available.")
+        return ''
+    audio_bytes = audio_data_int16.tobytes()
+    _vosk_recognizer.Reset()
+    if _vosk_recognizer.AcceptWaveform(audio_bytes):
+        result = json.loads(_vosk_recognizer.Result())
+    else:
+        result = json.loads(_vosk_recognizer.FinalResult())
+    return result.get('text', '')
+
+
+def process_segment(job):
+    sample_rate = _settings['sample_rate']
+    output_dir = _settings['output_dir']
+    capture_uid = job['uid']
+    os.makedirs(output_dir, exist_ok=True)
+    wav_filename = f"ctcss_capture_{job['file_stamp']}_{capture_uid}.wav"
+    wav_path = os.path.join(output_dir, wav_filename)
+    audio_for_wav = sig.sosfilt(_hpf_sos, job['audio'])
+    audio_data_int16 = np.clip(audio_for_wav, -1.0, 1.0) * 32767
+    audio_data_int16 = audio_data_int16.astype(np.int16)
+    wavfile.write(wav_path, sample_rate, audio_data_int16)
+
+    spec_path = None
+    if _settings.get('save_spectrogram'):
+        spec_path = os.path.join(output_dir, wav_filename.replace('.wav', '.npy'))
+        save_spectrogram_array(audio_for_wav, sample_rate, spec_path)
+
+    text = ''
+    if job.get('run_stt', True):
+        text = recognize(audio_data_int16)
+        print(f"STT recognized: '{text}'")
+
+    return {
+        'uid': capture_uid,
+        'text': text,
+        'audio_path': wav_path,
+        'spectrogram_path': spec_path,
+        'audio_len': len(job['audio']),
+    }
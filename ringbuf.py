@@ -0,0 +1,106 @@
+import numpy as np
+
+# --- Fixed-Capacity Ring Buffers ---
+
+class RingBuffer:
+    # Samples are stored twice (at i and i + capacity) so the current
+    # contents are always one contiguous slice and view() never copies.
+    # When full, the oldest samples are overwritten and counted in `dropped`.
+    # A view is only valid until the next extend(); copy it to keep it.
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = int(capacity)
+        if self.capacity <= 0:
+            raise ValueError("RingBuffer capacity must be positive")
+        self._data = np.zeros(2 * self.capacity, dtype=dtype)
+        self._start = 0
+        self._len = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def is_full(self):
+        return self._len == self.capacity
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+        self.dropped = 0
+
+    def extend(self, samples):
+        samples = np.asarray(samples)
+        n = len(samples)
+        if n == 0:
+            return
+        cap = self.capacity
+        if n >= cap:
+            self.dropped += self._len + n - cap
+            samples = samples[n - cap:]
+            self._data[:cap] = samples
+            self._data[cap:] = samples
+            self._start = 0
+            self._len = cap
+            return
+        overflow = self._len + n - cap
+        if overflow > 0:
+            self._start = (self._start + overflow) % cap
+            self._len -= overflow
+            self.dropped += overflow
+        pos = (self._start + self._len) % cap
+        first = min(n, cap - pos)
+        self._data[pos:pos + first] = samples[:first]
+        self._data[pos + cap:pos + cap + first] = samples[:first]
+        rest = n - first
+        if rest:
+            self._data[:rest] = samples[first:]
+            self._data[cap:cap + rest] = samples[first:]
+        self._len += n
+
+    def view(self):
+        return self._data[self._start:self._start + self._len]
+
+    def copy(self):
+        clone = RingBuffer(self.capacity, dtype=self._data.dtype)
+        clone.extend(self.view())
+        clone.dropped = self.dropped
+        return clone
+
+
+class IQPowerAccumulator:
+    # Running mean IQ power for a transmission, used in place of keeping the
+    # raw IQ. Per-chunk powers are kept (one float per chunk) so the noise
+    # estimate can still look at the edges of the transmission.
+    def __init__(self, max_chunks):
+        self._chunk_powers = RingBuffer(max_chunks, dtype=np.float64)
+        self.total_energy = 0.0
+        self.sample_count = 0
+
+    def __len__(self):
+        return len(self._chunk_powers)
+
+    def clear(self):
+        self._chunk_powers.clear()
+        self.total_energy = 0.0
+        self.sample_count = 0
+
+    def copy(self):
+        clone = IQPowerAccumulator(self._chunk_powers.capacity)
+        clone._chunk_powers = self._chunk_powers.copy()
+        clone.total_energy = self.total_energy
+        clone.sample_count = self.sample_count
+        return clone
+
+    def add(self, chunk_power, num_samples):
+        self._chunk_powers.extend((chunk_power,))
+        self.total_energy += float(chunk_power) * num_samples
+        self.sample_count += int(num_samples)
+
+    @property
+    def mean_power(self):
+        if self.sample_count == 0:
+            return 0.0
+        return self.total_energy / self.sample_count
+
+    def chunk_powers(self):
+        return self._chunk_powers.view()
@@ -1,4 +1,11 @@
+import contextlib
+import csv
+import io
+import json
+import queue
+import re
 import sqlite3
+import threading
 import time
 import uuid
 
@@ -13,37 +20,773 @@ CREATE TABLE IF NOT EXISTS signal_reports (
     duration_sec REAL,
     recognized_text TEXT,
     audio_path TEXT,
-    spectrogram_path TEXT
+    spectrogram_path TEXT,
+    ctcss_tone REAL
 );
 '''
 
+# Columns added after the original schema: (name, type)
+SQLITE_ADDED_COLUMNS = [
+    ('ctcss_tone', 'REAL'),
+    ('ts_ms', 'INTEGER'),       # capture time, epoch milliseconds (UTC)
+    ('signal_dbfs', 'REAL'),    # mean signal+noise power, dBFS
+    ('s_units', 'REAL'),        # S-meter as a number: S7 -> 7, S9 plus 12 dB -> 11
+]
+
+SIGNAL_REPORT_COLUMNS = [
+    'uid', 'timestamp', 'callsign', 's_meter', 'snr_db', 'duration_sec',
+    'recognized_text', 'audio_path', 'spectrogram_path',
+] + [name for name, _ in SQLITE_ADDED_COLUMNS]
+
+# Keyset pagination walks (ts_ms, uid); callsign lookups are ordered the
+# same way so filtered pages are index range scans too.
+SQLITE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_signal_reports_ts_ms ON signal_reports (ts_ms, uid)",
+    "CREATE INDEX IF NOT EXISTS idx_signal_reports_callsign_ts_ms ON signal_reports (callsign, ts_ms, uid)",
+    "CREATE INDEX IF NOT EXISTS idx_signal_reports_s_units ON signal_reports (s_units)",
+    "CREATE INDEX IF NOT EXISTS idx_signal_reports_signal_dbfs ON signal_reports (signal_dbfs)",
+]
+# Superseded by the ts_ms indexes above.
+SQLITE_DROPPED_INDEXES = [
+    "idx_signal_reports_timestamp",
+    "idx_signal_reports_callsign",
+]
+
+# Row count maintained by triggers so the unfiltered total is O(1).
+SQLITE_COUNTER_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS signal_report_counts (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)",
+    '''CREATE TRIGGER IF NOT EXISTS signal_reports_count_insert AFTER INSERT ON signal_reports
+       BEGIN UPDATE signal_report_counts SET total = total + 1 WHERE id = 0; END''',
+    '''CREATE TRIGGER IF NOT EXISTS signal_reports_count_delete AFTER DELETE ON signal_reports
+       BEGIN UPDATE signal_report_counts SET total = total - 1 WHERE id = 0; END''',
+]
+
+# Full-text index over callsigns and transcripts. External content table
+# (no second copy of the text), kept in sync by triggers; prefix indexes
+# make "as you type" prefix queries cheap.
+SQLITE_FTS_TABLE = '''CREATE VIRTUAL TABLE IF NOT EXISTS signal_reports_fts USING fts5(
+    callsign, recognized_text, content='signal_reports', content_rowid='rowid', prefix='2 3'
+)'''
+SQLITE_FTS_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS signal_reports_fts_insert AFTER INSERT ON signal_reports BEGIN
+         INSERT INTO signal_reports_fts (rowid, callsign, recognized_text)
+         VALUES (new.rowid, new.callsign, new.recognized_text);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS signal_reports_fts_delete AFTER DELETE ON signal_reports BEGIN
+         INSERT INTO signal_reports_fts (signal_reports_fts, rowid, callsign, recognized_text)
+         VALUES ('delete', old.rowid, old.callsign, old.recognized_text);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS signal_reports_fts_update AFTER UPDATE OF callsign, recognized_text ON signal_reports BEGIN
+         INSERT INTO signal_reports_fts (signal_reports_fts, rowid, callsign, recognized_text)
+         VALUES ('delete', old.rowid, old.callsign, old.recognized_text);
+         INSERT INTO signal_reports_fts (rowid, callsign, recognized_text)
+         VALUES (new.rowid, new.callsign, new.recognized_text);
+       END''',
+]
+# Callsign matches weigh more than words in the transcript.
+SQLITE_FTS_WEIGHTS = (4.0, 1.0)
+
+# --- Statistics Rollups ---
+# Per callsign x hour/day aggregates, maintained by triggers so every
+# logged report updates them in the same transaction. Averages are
+# snr_sum / snr_count. Deleting or re-logging a report adjusts counts and
+# sums; min/max keep their historical extremes until rebuild_signal_stats().
+SIGNAL_STATS_RESOLUTIONS = {
+    'hour': ('signal_stats_hourly', 13),   # "YYYY-MM-DD HH"
+    'day': ('signal_stats_daily', 10),     # "YYYY-MM-DD"
+}
+SQLITE_STATS_COLUMNS = '''(
+    callsign TEXT NOT NULL,
+    period TEXT NOT NULL,
+    reports INTEGER NOT NULL DEFAULT 0,
+    snr_count INTEGER NOT NULL DEFAULT 0,
+    snr_sum REAL NOT NULL DEFAULT 0,
+    snr_min REAL,
+    snr_max REAL,
+    airtime_sec REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (callsign, period)
+)'''
+SQLITE_S_METER_STATS_TABLE = '''CREATE TABLE IF NOT EXISTS signal_stats_s_meter (
+    callsign TEXT NOT NULL,
+    period TEXT NOT NULL,
+    s_meter TEXT NOT NULL,
+    reports INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (callsign, period, s_meter)
+)'''
+
+def _stats_add_sql(table, width, row):
+    return f'''INSERT INTO {table} (callsign, period, reports, snr_count, snr_sum, snr_min, snr_max, airtime_sec)
+         VALUES (coalesce({row}.callsign, 'Unknown'), substr({row}.timestamp, 1, {width}), 1,
+                 {row}.snr_db IS NOT NULL, coalesce({row}.snr_db, 0), {row}.snr_db, {row}.snr_db, coalesce({row}.duration_sec, 0))
+         ON CONFLICT (callsign, period) DO UPDATE SET
+             reports = reports + 1,
+             snr_count = snr_count + excluded.snr_count,
+             snr_sum = snr_sum + excluded.snr_sum,
+             snr_min = min(coalesce(snr_min, excluded.snr_min), coalesce(excluded.snr_min, snr_min)),
+             snr_max = max(coalesce(snr_max, excluded.snr_max), coalesce(excluded.snr_max, snr_max)),
+             airtime_sec = airtime_sec + excluded.airtime_sec;'''
+
+def _stats_remove_sql(table, width, row):
+    return f'''UPDATE {table} SET
+             reports = reports - 1,
+             snr_count = snr_count - ({row}.snr_db IS NOT NULL),
+             snr_sum = snr_sum - coalesce({row}.snr_db, 0),
+             airtime_sec = airtime_sec - coalesce({row}.duration_sec, 0)
+         WHERE callsign = coalesce({row}.callsign, 'Unknown') AND period = substr({row}.timestamp, 1, {width});'''
+
+def _s_meter_add_sql(row):
+    return f'''INSERT INTO signal_stats_s_meter (callsign, period, s_meter, reports)
+         VALUES (coalesce({row}.callsign, 'Unknown'), substr({row}.timestamp, 1, 10), coalesce({row}.s_meter, 'Unknown'), 1)
+         ON CONFLICT (callsign, period, s_meter) DO UPDATE SET reports = reports + 1;'''
+
+def _s_meter_remove_sql(row):
+    return f'''UPDATE signal_stats_s_meter SET reports = reports - 1
+         WHERE callsign = coalesce({row}.callsign, 'Unknown') AND period = substr({row}.timestamp, 1, 10)
+           AND s_meter = coalesce({row}.s_meter, 'Unknown');'''
+
+def _stats_schema():
+    statements = [f"CREATE TABLE IF NOT EXISTS {table} {SQLITE_STATS_COLUMNS}" for table, _ in SIGNAL_STATS_RESOLUTIONS.values()]
+    statements += [f"CREATE INDEX IF NOT EXISTS idx_{table}_period ON {table} (period)" for table, _ in SIGNAL_STATS_RESOLUTIONS.values()]
+    statements.append(SQLITE_S_METER_STATS_TABLE)
+    statements.append("CREATE INDEX IF NOT EXISTS idx_signal_stats_s_meter_period ON signal_stats_s_meter (period)")
+    add_new = ''.join(_stats_add_sql(t, w, 'new') for t, w in SIGNAL_STATS_RESOLUTIONS.values()) + _s_meter_add_sql('new')
+    remove_old = ''.join(_stats_remove_sql(t, w, 'old') for t, w in SIGNAL_STATS_RESOLUTIONS.values()) + _s_meter_remove_sql('old')
+    statements += [
+        f"CREATE TRIGGER IF NOT EXISTS signal_reports_stats_insert AFTER INSERT ON signal_reports BEGIN {add_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS signal_reports_stats_delete AFTER DELETE ON signal_reports BEGIN {remove_old} END",
+        f'''CREATE TRIGGER IF NOT EXISTS signal_reports_stats_update
+            AFTER UPDATE OF timestamp, callsign, s_meter, snr_db, duration_sec ON signal_reports
+            BEGIN {remove_old} {add_new} END''',
+    ]
+    return statements
+
+# --- Typed Column Backfill ---
+# Rows logged before the typed columns existed get them derived from the
+# text columns: ts_ms from the local-time timestamp (SQLite applies the
+# DST rules of the host's zone), s_units from the S-meter text, and
+# signal_dbfs from s_units. The S-meter only keeps 6 dB steps below S9, so
+# backfilled dBFS values are the lower edge of that S-unit.
+S9_DBFS = -62.0
+DB_PER_S_UNIT = 6.0
+S_UNITS_SQL = ("(CASE WHEN s_meter LIKE 'S9 plus %' THEN 9 + CAST(substr(s_meter, 9) AS REAL) / 6.0 "
+               "WHEN s_meter GLOB 'S[0-9]*' THEN CAST(substr(s_meter, 2) AS REAL) END)")
+SQLITE_TYPED_BACKFILL = [
+    "UPDATE signal_reports SET ts_ms = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000 WHERE ts_ms IS NULL",
+    f"UPDATE signal_reports SET s_units = {S_UNITS_SQL} WHERE s_units IS NULL",
+    f'''UPDATE signal_reports SET signal_dbfs = CASE WHEN s_units >= 1 THEN {S9_DBFS} + (s_units - 9) * {DB_PER_S_UNIT}
+                                                 WHEN s_units IS NOT NULL THEN -120 END
+        WHERE signal_dbfs IS NULL AND s_units IS NOT NULL''',
+]
+
+def s_meter_units(s_meter):
+    match = re.match(r"^S(\d+)(?: plus (\d+) dB)?$", s_meter or '')
+    if not match:
+        return None
+    units = float(match.group(1))
+    if match.group(2):
+        units += float(match.group(2)) / DB_PER_S_UNIT
+    return units
+
+def timestamp_to_ms(timestamp):
+    # Local-time "YYYY-MM-DD[ HH:MM:SS]" -> epoch ms.
+    fmt = '%Y-%m-%d %H:%M:%S' if len(timestamp) > 10 else '%Y-%m-%d'
+    return int(time.mktime(time.strptime(timestamp, fmt)) * 1000)
+
+# Writer: one long-lived connection, WAL so readers never block it and
+# synchronous=NORMAL (durable at each WAL checkpoint, safe in WAL mode).
+SQLITE_WRITER_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA temp_store=MEMORY",
+]
+SQLITE_READER_PRAGMAS = [
+    "PRAGMA cache_size=-4000",
+]
+SQLITE_BATCH_SIZE = 50
+SQLITE_BATCH_INTERVAL_SECONDS = 0.25
+SQLITE_READ_POOL_SIZE = 4
+SQLITE_BUSY_TIMEOUT_SECONDS = 5.0
+
 def get_sqlite_connection():
-    conn = sqlite3.connect(SQLITE_DB_PATH)
+    conn = sqlite3.connect(SQLITE_DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
     return conn
 
 def ensure_table_exists():
     with get_sqlite_connection() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.execute(SQLITE_TABLE_SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(signal_reports)")}
+        added = []
+        for name, col_type in SQLITE_ADDED_COLUMNS:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE signal_reports ADD COLUMN {name} {col_type}")
+                added.append(name)
+        if {'ts_ms', 'signal_dbfs', 's_units'} & set(added):
+            for statement in SQLITE_TYPED_BACKFILL:
+                conn.execute(statement)
+        for name in SQLITE_DROPPED_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        for statement in SQLITE_INDEXES + SQLITE_COUNTER_SCHEMA:
+            conn.execute(statement)
+        fts_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'signal_reports_fts'"
+        ).fetchone()
+        conn.execute(SQLITE_FTS_TABLE)
+        for statement in SQLITE_FTS_TRIGGERS:
+            conn.execute(statement)
+        if not fts_exists:
+            conn.execute("INSERT INTO signal_reports_fts (signal_reports_fts) VALUES ('rebuild')")
+        stats_exist = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'signal_stats_daily'"
+        ).fetchone()
+        for statement in _stats_schema():
+            conn.execute(statement)
+        if not stats_exist:
+            _rebuild_signal_stats(conn)
+        conn.execute(
+            "INSERT OR IGNORE INTO signal_report_counts (id, total) SELECT 0, COUNT(*) FROM signal_reports"
+        )
         conn.commit()
 
-def log_signal_report(callsign, s_meter, snr, recognized_text, duration_sec, audio_path, spectrogram_path, timestamp=None, uid=None):
+# --- Batched Writer ---
+# Writes are queued and committed by a single thread on one persistent
+# connection, in batches of up to SQLITE_BATCH_SIZE statements or every
+# SQLITE_BATCH_INTERVAL_SECONDS, whichever comes first. flush() blocks
+# until everything queued so far is committed.
+_STOP = object()
+
+class SignalDBWriter:
+    def __init__(self, db_path, batch_size=SQLITE_BATCH_SIZE, interval=SQLITE_BATCH_INTERVAL_SECONDS):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='signal-db-writer', daemon=True)
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, sql, params=()):
+        self._queue.put((sql, params))
+
+    def flush(self, timeout=5.0):
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+        for pragma in SQLITE_WRITER_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _commit(self, conn, pending):
+        try:
+            with conn:
+                for sql, params in pending:
+                    conn.execute(sql, params)
+            self.written += len(pending)
+        except sqlite3.Error as e:
+            # Retry one by one so a single bad statement doesn't lose the batch.
+            print(f"SQLite batch failed ({e}); retrying {len(pending)} statements individually.")
+            for sql, params in pending:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                    self.written += 1
+                except sqlite3.Error as e:
+                    self.errors += 1
+                    print(f"SQLite write failed: {e}")
+        self.batches += 1
+        pending.clear()
+
+    def _run(self):
+        conn = self._connect()
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if not pending else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                if pending:
+                    self._commit(conn, pending)
+                break
+            if isinstance(item, threading.Event):
+                if pending:
+                    self._commit(conn, pending)
+                item.set()
+                continue
+            if item is not None:
+                if not pending:
+                    deadline = time.monotonic() + self.interval
+                pending.append(item)
+            if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._commit(conn, pending)
+        conn.close()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.db_path != SQLITE_DB_PATH:
+            _writer = SignalDBWriter(SQLITE_DB_PATH).start()
+        return _writer
+
+def submit_write(sql, params=()):
+    get_writer().submit(sql, params)
+
+def flush_writes(timeout=5.0):
+    if _writer is not None:
+        return _writer.flush(timeout)
+    return True
+
+def close_writer(timeout=5.0):
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close(timeout)
+            _writer = None
+
+# --- Read Connection Pool ---
+# Read-only connections for the web UI, reused across requests. In WAL
+# mode they read a consistent snapshot without blocking the writer.
+_read_pools = {}
+_read_pools_lock = threading.Lock()
+
+def _open_read_connection(db_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False,
+                           timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+    for pragma in SQLITE_READER_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+@contextlib.contextmanager
+def read_connection():
+    db_path = SQLITE_DB_PATH
+    with _read_pools_lock:
+        pool = _read_pools.setdefault(db_path, queue.LifoQueue())
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open_read_connection(db_path)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if pool.qsize() < SQLITE_READ_POOL_SIZE:
+            pool.put(conn)
+        else:
+            conn.close()
+
+def log_signal_report(callsign, s_meter, snr, recognized_text, duration_sec, audio_path, spectrogram_path, timestamp=None, uid=None, ctcss_tone=None, signal_dbfs=None):
     if timestamp is None:
         timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
     if uid is None:
         uid = uuid.uuid4().hex[:16]
-    with get_sqlite_connection() as conn:
-        conn.execute(
+    ts_ms = timestamp_to_ms(timestamp)
+    s_units = s_meter_units(s_meter)
+    submit_write(
+        """
+        INSERT INTO signal_reports
+        (uid, timestamp, callsign, s_meter, snr_db, duration_sec, recognized_text, audio_path, spectrogram_path, ctcss_tone,
+         ts_ms, signal_dbfs, s_units)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(uid) DO UPDATE SET
+            timestamp = excluded.timestamp, callsign = excluded.callsign, s_meter = excluded.s_meter,
+            snr_db = excluded.snr_db, duration_sec = excluded.duration_sec,
+            recognized_text = excluded.recognized_text, audio_path = excluded.audio_path,
+            spectrogram_path = excluded.spectrogram_path, ctcss_tone = excluded.ctcss_tone,
+            ts_ms = excluded.ts_ms, signal_dbfs = excluded.signal_dbfs, s_units = excluded.s_units
+        """,
+        (uid, timestamp, callsign, s_meter, snr, duration_sec, recognized_text, audio_path, spectrogram_path, ctcss_tone,
+         ts_ms, signal_dbfs, s_units)
+    )
+    return uid
+
+def get_all_signal_reports():
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM signal_reports ORDER BY ts_ms DESC")
+        return cur.fetchall()
+
+def get_signal_report(uid):
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM signal_reports WHERE uid = ?", (uid,))
+        return cur.fetchone()
+
+# --- Capture Archive ---
+# Used by archiver.py to find captures that are still in the flat output
+# directory and to repoint reports once their files move or are deleted.
+
+def _like_prefix(prefix):
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def get_unarchived_reports(after_ms, before_ms, archive_dir, limit=200):
+    pattern = _like_prefix(archive_dir)
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
             """
-            INSERT OR REPLACE INTO signal_reports
-            (uid, timestamp, callsign, s_meter, snr_db, duration_sec, recognized_text, audio_path, spectrogram_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            SELECT uid, ts_ms, audio_path, spectrogram_path FROM signal_reports
+            WHERE ts_ms >= ? AND ts_ms < ?
+              AND ((audio_path IS NOT NULL AND audio_path NOT LIKE ? ESCAPE '\\')
+                   OR (spectrogram_path IS NOT NULL AND spectrogram_path NOT LIKE ? ESCAPE '\\'))
+            ORDER BY ts_ms, uid LIMIT ?
             """,
-            (uid, timestamp, callsign, s_meter, snr, duration_sec, recognized_text, audio_path, spectrogram_path)
+            (after_ms, before_ms, pattern, pattern, limit)
         )
-        conn.commit()
+        return cur.fetchall()
 
-def get_all_signal_reports():
+def update_report_paths(uid, audio_path, spectrogram_path):
+    submit_write(
+        "UPDATE signal_reports SET audio_path = ?, spectrogram_path = ? WHERE uid = ?",
+        (audio_path, spectrogram_path, uid)
+    )
+
+def clear_report_paths_under(directory):
+    pattern = _like_prefix(directory)
+    submit_write("UPDATE signal_reports SET audio_path = NULL WHERE audio_path LIKE ? ESCAPE '\\'", (pattern,))
+    submit_write("UPDATE signal_reports SET spectrogram_path = NULL WHERE spectrogram_path LIKE ? ESCAPE '\\'", (pattern,))
+
+# --- Paginated Queries ---
+# Pages are addressed by a keyset cursor "<ts_ms>|<uid>" of the row at
+# the page edge instead of an OFFSET, so every page is an index seek no
+# matter how deep it is. Rows come back newest first.
+
+def report_cursor(row):
+    return f"{row[SIGNAL_REPORT_COLUMNS.index('ts_ms')]}|{row[0]}"
+
+def _parse_cursor(cursor):
+    ts_ms, _, uid = cursor.partition('|')
+    return int(ts_ms), uid
+
+def _report_filters(callsign=None, start=None, end=None, min_snr=None, max_snr=None, min_s_units=None, max_s_units=None,
+                    min_dbfs=None, max_dbfs=None):
+    clauses = []
+    params = []
+    if callsign:
+        clauses.append("callsign = ?")
+        # Callsigns are stored upper case, except the 'Unknown' placeholder.
+        params.append('Unknown' if callsign.lower() == 'unknown' else callsign.upper())
+    if start:
+        clauses.append("ts_ms >= ?")
+        params.append(timestamp_to_ms(start))
+    if end:
+        # A bare date includes the whole day.
+        clauses.append("ts_ms <= ?")
+        params.append(timestamp_to_ms(end + ' 23:59:59' if len(end) == 10 else end) + 999)
+    if min_snr is not None:
+        clauses.append("snr_db >= ?")
+        params.append(min_snr)
+    if max_snr is not None:
+        clauses.append("snr_db <= ?")
+        params.append(max_snr)
+    if min_s_units is not None:
+        clauses.append("s_units >= ?")
+        params.append(min_s_units)
+    if max_s_units is not None:
+        clauses.append("s_units <= ?")
+        params.append(max_s_units)
+    if min_dbfs is not None:
+        clauses.append("signal_dbfs >= ?")
+        params.append(min_dbfs)
+    if max_dbfs is not None:
+        clauses.append("signal_dbfs <= ?")
+        params.append(max_dbfs)
+    return clauses, params
+
+def query_signal_reports(limit=20, before=None, after=None, **filters):
+    # before: rows older than this cursor; after: rows newer than it.
+    # Returns (rows, has_more) where has_more refers to the direction walked.
+    clauses, params = _report_filters(**filters)
+    if after:
+        clauses.append("(ts_ms, uid) > (?, ?)")
+        params.extend(_parse_cursor(after))
+        order = "ASC"
+    else:
+        if before:
+            clauses.append("(ts_ms, uid) < (?, ?)")
+            params.extend(_parse_cursor(before))
+        order = "DESC"
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT * FROM signal_reports {where} ORDER BY ts_ms {order}, uid {order} LIMIT ?"
+    with read_connection() as conn:
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after:
+        rows.reverse()
+    return rows, has_more
+
+def count_signal_reports(**filters):
+    clauses, params = _report_filters(**filters)
+    with read_connection() as conn:
+        if not clauses:
+            row = conn.execute("SELECT total FROM signal_report_counts WHERE id = 0").fetchone()
+            if row is not None:
+                return row[0]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return conn.execute(f"SELECT COUNT(*) FROM signal_reports {where}", params).fetchone()[0]
+
+# --- Full-Text Search ---
+# Free text is reduced to word tokens, all required (AND), so user input
+# can never be an FTS5 syntax error. Words are matched whole; a trailing
+# "*" makes a word a prefix match. Results are ranked by bm25 among the
+# SEARCH_RANK_WINDOW most recent matches, which bounds the cost of very
+# common terms; the cursor "<score>|<rowid>" continues after the last
+# result of the previous page.
+SEARCH_RANK_WINDOW = 1000
+
+def fts_match_expression(query):
+    terms = re.findall(r"(\w+)(\*?)", query or '')
+    return ' '.join(f'"{word}"{star}' for word, star in terms)
+
+def search_signal_reports(query, limit=20, cursor=None):
+    match = fts_match_expression(query)
+    if not match:
+        return [], None
+    params = [*SQLITE_FTS_WEIGHTS, match, SEARCH_RANK_WINDOW]
+    after = ""
+    if cursor:
+        score, _, rowid = cursor.partition('|')
+        after = "WHERE (m.score, m.rowid) > (?, ?)"
+        params.extend([float(score), int(rowid)])
+    sql = f"""
+        SELECT r.*, m.score, m.rowid FROM (
+            SELECT rowid, bm25(signal_reports_fts, ?, ?) AS score
+            FROM signal_reports_fts WHERE signal_reports_fts MATCH ?
+            ORDER BY rowid DESC LIMIT ?
+        ) AS m
+        JOIN signal_reports AS r ON r.rowid = m.rowid
+        {after}
+        ORDER BY m.score, m.rowid
+        LIMIT ?
+    """
+    with read_connection() as conn:
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1][-2]!r}|{rows[-1][-1]}"
+    return [row[:-2] for row in rows], next_cursor
+
+# --- Statistics Queries ---
+# These read only the rollup tables, never signal_reports.
+
+def _rebuild_signal_stats(conn):
+    for table, width in SIGNAL_STATS_RESOLUTIONS.values():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""
+            INSERT INTO {table} (callsign, period, reports, snr_count, snr_sum, snr_min, snr_max, airtime_sec)
+            SELECT coalesce(callsign, 'Unknown'), substr(timestamp, 1, {width}), COUNT(*), COUNT(snr_db),
+                   coalesce(SUM(snr_db), 0), MIN(snr_db), MAX(snr_db), coalesce(SUM(duration_sec), 0)
+            FROM signal_reports GROUP BY 1, 2
+        """)
+    conn.execute("DELETE FROM signal_stats_s_meter")
+    conn.execute("""
+        INSERT INTO signal_stats_s_meter (callsign, period, s_meter, reports)
+        SELECT coalesce(callsign, 'Unknown'), substr(timestamp, 1, 10), coalesce(s_meter, 'Unknown'), COUNT(*)
+        FROM signal_reports GROUP BY 1, 2, 3
+    """)
+
+def rebuild_signal_stats():
+    # Backfill / exact recompute of all rollups from signal_reports.
+    flush_writes()
     with get_sqlite_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM signal_reports ORDER BY timestamp DESC")
-        return cur.fetchall()
+        _rebuild_signal_stats(conn)
+        conn.commit()
+
+def _stats_filters(callsign=None, start=None, end=None):
+    clauses = ["reports > 0"]
+    params = []
+    if callsign:
+        clauses.append("callsign = ?")
+        params.append('Unknown' if callsign.lower() == 'unknown' else callsign.upper())
+    if start:
+        clauses.append("period >= ?")
+        params.append(start)
+    if end:
+        # Periods are prefixes of timestamps, so pad to the end of the range.
+        clauses.append("period <= ?")
+        params.append(end + '\uffff')
+    return "WHERE " + " AND ".join(clauses), params
+
+def get_signal_stats(resolution='day', callsign=None, start=None, end=None):
+    table, _ = SIGNAL_STATS_RESOLUTIONS[resolution]
+    where, params = _stats_filters(callsign, start, end)
+    with read_connection() as conn:
+        return conn.execute(f"""
+            SELECT callsign, period, reports,
+                   CASE WHEN snr_count > 0 THEN snr_sum / snr_count END AS avg_snr,
+                   snr_min, snr_max, airtime_sec
+            FROM {table} {where} ORDER BY period, callsign
+        """, params).fetchall()
+
+def get_callsign_summary(start=None, end=None, callsign=None):
+    where, params = _stats_filters(callsign, start, end)
+    with read_connection() as conn:
+        return conn.execute(f"""
+            SELECT callsign, SUM(reports) AS reports,
+                   CASE WHEN SUM(snr_count) > 0 THEN SUM(snr_sum) / SUM(snr_count) END AS avg_snr,
+                   MIN(snr_min), MAX(snr_max), SUM(airtime_sec), MIN(period), MAX(period)
+            FROM signal_stats_daily {where}
+            GROUP BY callsign ORDER BY reports DESC
+        """, params).fetchall()
+
+def get_s_meter_distribution(callsign=None, start=None, end=None):
+    where, params = _stats_filters(callsign, start, end)
+    with read_connection() as conn:
+        return conn.execute(f"""
+            SELECT s_meter, SUM(reports) AS reports
+            FROM signal_stats_s_meter {where}
+            GROUP BY s_meter ORDER BY reports DESC
+        """, params).fetchall()
+
+# --- Export ---
+# Rows are read in keyset-ordered batches, each its own short query on a
+# private read-only connection. Nothing is held in memory beyond one batch
+# and no read transaction stays open for the whole export, so a long
+# export neither grows the WAL nor holds up the capture writer.
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def iter_signal_report_batches(batch_size=EXPORT_BATCH_SIZE, **filters):
+    # Oldest first. Rows without ts_ms (unparseable timestamps) are skipped.
+    conn = _open_read_connection(SQLITE_DB_PATH)
+    try:
+        cursor = (-1, '')
+        while True:
+            clauses, params = _report_filters(**filters)
+            clauses.append("(ts_ms, uid) > (?, ?)")
+            params.extend(cursor)
+            rows = conn.execute(
+                f"SELECT * FROM signal_reports WHERE {' AND '.join(clauses)} ORDER BY ts_ms, uid LIMIT ?",
+                params + [batch_size]
+            ).fetchall()
+            if not rows:
+                break
+            yield rows
+            cursor = _parse_cursor(report_cursor(rows[-1]))
+            if len(rows) < batch_size:
+                break
+    finally:
+        conn.close()
+
+def _export_csv(batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(SIGNAL_REPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+def _export_ndjson(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(SIGNAL_REPORT_COLUMNS, row))) + '\n' for row in rows).encode('utf-8')
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file object that hands back whatever was written since the
+    # last drain, so a Parquet file can be streamed one row group at a time.
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _export_parquet(batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow).")
+    numeric = {'snr_db': pa.float64(), 'duration_sec': pa.float64(), 'ctcss_tone': pa.float64(),
+               'ts_ms': pa.int64(), 'signal_dbfs': pa.float64(), 's_units': pa.float64()}
+    schema = pa.schema([(name, numeric.get(name, pa.string())) for name in SIGNAL_REPORT_COLUMNS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    for rows in batches:
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def export_signal_reports(fmt='csv', batch_size=EXPORT_BATCH_SIZE, **filters):
+    # Generator of byte chunks in the requested format.
+    exporters = {'csv': _export_csv, 'ndjson': _export_ndjson, 'parquet': _export_parquet}
+    if fmt not in exporters:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return exporters[fmt](iter_signal_report_batches(batch_size, **filters))
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Signal report database maintenance")
+    parser.add_argument('--db', default=SQLITE_DB_PATH, help="SQLite database path")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild-stats', help="Recompute the statistics rollups from all reports")
+    export = sub.add_parser('export', help="Export reports as CSV, NDJSON or Parquet")
+    export.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    export.add_argument('--output', '-o', default='-', help="Output file (default: stdout)")
+    export.add_argument('--callsign')
+    export.add_argument('--start', help="YYYY-MM-DD[ HH:MM:SS]")
+    export.add_argument('--end', help="YYYY-MM-DD[ HH:MM:SS], a bare date includes the whole day")
+    for name in ('min_snr', 'max_snr', 'min_s_units', 'max_s_units', 'min_dbfs', 'max_dbfs'):
+        export.add_argument('--' + name.replace('_', '-'), dest=name, type=float)
+    args = parser.parse_args()
+    SQLITE_DB_PATH = args.db
+    ensure_table_exists()
+    if args.command == 'rebuild-stats':
+        started = time.time()
+        rebuild_signal_stats()
+        print(f"Rebuilt statistics rollups in {time.time() - started:.1f}s.")
+    elif args.command == 'export':
+        import sys
+        filters = {name: getattr(args, name) for name in (
+            'callsign', 'start', 'end', 'min_snr', 'max_snr', 'min_s_units', 'max_s_units', 'min_dbfs', 'max_dbfs')}
+        out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        try:
+            for chunk in export_signal_reports(args.format, **filters):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
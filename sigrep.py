@@ -1,32 +1,44 @@
 import os
+import sys
 import time
 import threading
 import queue
 import re
 import numpy as np
 from scipy import signal as sig
-from rtlsdr import RtlSdr
+from acquire import RtlSdrSource, FileSource
 import json
-import subprocess
-import platform
 import shlex
-from vosk import Model, KaldiRecognizer, SetLogLevel
-from scipy.io import wavfile
 import uuid
-import matplotlib.pyplot as plt
-import warnings
-import requests
-import xml.etree.ElementTree as ET
+import argparse
+import collections
+import functools
 import datetime
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
+import postproc
+import signal_db
+from demod import NFMDemodulator
+from pipeline import Stage, StageQueue, BLOCK, DROP_NEWEST, DROP_OLDEST, format_stats
+from ringbuf import RingBuffer, IQPowerAccumulator
+from stt import StreamingTranscriber
+from ipc import IPCServer
+from tts import TTSService, OUTPUT_SAMPLE_RATE
+from transmit import TransmitScheduler, TX_REPORT, TX_ID, TX_INFO
+import fetchers
+from fetchers import CachedFetcher, WeatherError
+from tones import goertzel_power, goertzel_powers, CTCSS_TONES, scan_ctcss_tones, strongest_ctcss_tone
 
-warnings.filterwarnings("ignore", message="Starting a Matplotlib GUI outside of the main thread will likely fail.")
 load_dotenv()
 
 # --- Globals and Config ---
 baseline_noise_power = None
 baseline_ctcss_powers = []
-SetLogLevel(1)
+try:
+    from vosk import SetLogLevel
+    SetLogLevel(1)
+except ImportError:
+    pass
 
 STATION_CALLSIGN = "KR4DTT"
 CONFIG_PATH = 'config.json'
@@ -68,6 +80,8 @@ if str(ctcss_threshold_cfg).lower() == 'auto':
 else:
     CTCSS_THRESHOLD = float(ctcss_threshold_cfg)
 CTCSS_HOLDTIME = float(cfg.get('CTCSS_HOLDTIME', 0.7))
+CTCSS_SCAN = bool(cfg.get('CTCSS_SCAN', False))
+CTCSS_SCAN_WINDOW_SECONDS = float(cfg.get('CTCSS_SCAN_WINDOW_SECONDS', 1.0))
 MIN_TRANSMISSION_LENGTH = float(cfg.get('MIN_TRANSMISSION_LENGTH', 0.5))
 AUDIO_WAV_OUTPUT_DIR = "wavs"
 
@@ -85,9 +99,16 @@ AUDIO_DOWNSAMPLE_RATE = 16000
 STT_ENGINE = "vosk"
 VOSK_MODEL_PATH = "vosk-model-en-us-0.22-lgraph"
 BASELINE_DURATION_SECONDS = 10
-SDR_NUM_SAMPLES_PER_CHUNK = 16384
+SDR_NUM_SAMPLES_PER_CHUNK = int(cfg.get('SDR_NUM_SAMPLES_PER_CHUNK', 16384))
+SDR_BUFFER_COUNT = int(cfg.get('SDR_BUFFER_COUNT', 64))
+SDR_USB_BUFFERS = int(cfg.get('SDR_USB_BUFFERS', 0))
 SMALL_AUDIO_CHUNK_SAMPLES = int(SDR_NUM_SAMPLES_PER_CHUNK / (SDR_SAMPLE_RATE / AUDIO_DOWNSAMPLE_RATE))
+CTCSS_BLOCK_SAMPLES = 2048
+CTCSS_SCAN_WINDOW_SAMPLES = int(CTCSS_SCAN_WINDOW_SECONDS * AUDIO_DOWNSAMPLE_RATE)
+MAX_TRANSMISSION_SECONDS = float(cfg.get('MAX_TRANSMISSION_SECONDS', 180))
+MAX_TRANSMISSION_SAMPLES = int(MAX_TRANSMISSION_SECONDS * AUDIO_DOWNSAMPLE_RATE)
 SMALL_AUDIO_CHUNK_DURATION = SMALL_AUDIO_CHUNK_SAMPLES / AUDIO_DOWNSAMPLE_RATE if AUDIO_DOWNSAMPLE_RATE > 0 else 0.016
+MAX_TRANSMISSION_CHUNKS = int(MAX_TRANSMISSION_SECONDS / SMALL_AUDIO_CHUNK_DURATION) + 1
 
 is_baselining_rf = True
 baseline_rf_power_values = []
@@ -137,141 +158,148 @@ if STT_ENGINE == "vosk":
 else:
     VOSK_GRAMMAR_STR = None
 
-audio_iq_data_queue = queue.Queue()
-
-# --- Vosk Model Load ---
-vosk_model = None
-try:
-    from vosk import Model, KaldiRecognizer
-    if os.path.exists(VOSK_MODEL_PATH):
-        vosk_model = Model(VOSK_MODEL_PATH)
-    else:
-        print(f"ERROR: Vosk model path not found: {VOSK_MODEL_PATH}")
-except ImportError:
-    print("ERROR: Vosk library not installed.")
-except Exception as e:
-    print(f"Error loading Vosk model: {e}")
-
-from signal_db import log_signal_report, ensure_table_exists
+# --- Pipeline Queues ---
+# acquire (acquire.py -> sdr_callback) -> demod -> detect (audio_processing_thread_func)
+#   -> persist (WAV, spectrogram, STT, DB) -> respond (TTS / playback)
+DEMOD_QUEUE_CHUNKS = int(cfg.get('DEMOD_QUEUE_CHUNKS', 64))
+DETECT_QUEUE_CHUNKS = int(cfg.get('DETECT_QUEUE_CHUNKS', 256))
+PERSIST_QUEUE_SEGMENTS = int(cfg.get('PERSIST_QUEUE_SEGMENTS', 16))
+POSTPROC_WORKERS = int(cfg.get('POSTPROC_WORKERS', 2))
+RESPOND_QUEUE_MESSAGES = int(cfg.get('RESPOND_QUEUE_MESSAGES', 8))
+TX_QUEUE_TIMEOUT_SECONDS = float(cfg.get('TX_QUEUE_TIMEOUT_SECONDS', 60))
+TX_CLEAR_SECONDS = float(cfg.get('TX_CLEAR_SECONDS', 0.5))
+TX_TAIL_SECONDS = float(cfg.get('TX_TAIL_SECONDS', 0.5))
+PIPELINE_STATS_INTERVAL_SECONDS = 60
+
+# --- Streaming STT ---
+STT_STREAMING = bool(cfg.get('STT_STREAMING', True))
+STT_QUEUE_CHUNKS = int(cfg.get('STT_QUEUE_CHUNKS', 512))
+STT_FINAL_TIMEOUT_SECONDS = float(cfg.get('STT_FINAL_TIMEOUT_SECONDS', 10.0))
+
+# --- Capture Archive ---
+ARCHIVE_ENABLED = bool(cfg.get('ARCHIVE_ENABLED', True))
+
+# --- Live Events ---
+# Published to webapp (and anything else subscribed) over the local IPC
+# socket: state changes, CTCSS open/close, DTMF digits, throttled RF level
+# and new reports. Nothing is encoded when there are no subscribers.
+LEVEL_EVENT_INTERVAL_SECONDS = float(cfg.get('LEVEL_EVENT_INTERVAL_SECONDS', 0.2))
+events = IPCServer()
+
+# --- Text-to-Speech ---
+TTS_ENGINE = cfg.get('TTS_ENGINE', 'auto')
+TTS_CACHE_MB = float(cfg.get('TTS_CACHE_MB', 32))
+TTS_PRELOAD_MAX_SNR = int(cfg.get('TTS_PRELOAD_MAX_SNR', 40))
+tts = TTSService(TTS_ENGINE, TTS_CACHE_MB)
+
+# --- Weather and Band Conditions ---
+# Fetched on a background pool and cached; DTMF replies are answered from
+# the cache and only wait (up to FETCH_WAIT_SECONDS) on a cold miss.
+WEATHER_API_URL = cfg.get('WEATHER_API_URL', fetchers.WEATHER_API_URL)
+HAMQSL_URL = cfg.get('HAMQSL_URL', fetchers.HAMQSL_URL)
+WEATHER_CACHE_MINUTES = float(cfg.get('WEATHER_CACHE_MINUTES', 15))
+HAMQSL_CACHE_MINUTES = float(cfg.get('HAMQSL_CACHE_MINUTES', 60))
+FETCH_MAX_STALE_MINUTES = float(cfg.get('FETCH_MAX_STALE_MINUTES', 180))
+FETCH_WAIT_SECONDS = float(cfg.get('FETCH_WAIT_SECONDS', 8))
+HAMQSL_PREFETCH = bool(cfg.get('HAMQSL_PREFETCH', True))
+weather_cache = CachedFetcher('weather', functools.partial(fetchers.fetch_weather, url=WEATHER_API_URL),
+                              WEATHER_CACHE_MINUTES * 60, FETCH_MAX_STALE_MINUTES * 60)
+band_conditions_cache = CachedFetcher('hamqsl', functools.partial(fetchers.fetch_hf_band_conditions, url=HAMQSL_URL),
+                                      HAMQSL_CACHE_MINUTES * 60, FETCH_MAX_STALE_MINUTES * 60, workers=1)
+
+audio_iq_data_queue = StageQueue('detect', DETECT_QUEUE_CHUNKS, policy=DROP_OLDEST)
+
+nfm_demodulator = NFMDemodulator(SDR_SAMPLE_RATE, AUDIO_DOWNSAMPLE_RATE, NFM_FILTER_CUTOFF)
+
+from signal_db import log_signal_report, ensure_table_exists, close_writer
+from archiver import archiver_from_config
 ensure_table_exists()
 
 # --- TTS and Transmission ---
-def speak_and_transmit(text_to_speak):
-    current_os = platform.system().lower()
-    cmd = []
-    success = False
-    command_executed = False
-    subprocess_kwargs = {
-        'text': True,
-        'check': False,
-        'timeout': 20
-    }
-    try:
-        if "windows" in current_os:
-            escaped_text = text_to_speak.replace("'", "''")
-            tts_wav_path = "tts_output.wav"
-            ps_script = (
-                f"Add-Type -AssemblyName System.Speech; "
-                f"$speak = New-Object System.Speech.Synthesis.SpeechSynthesizer; "
-                f"$speak.SetOutputToWaveFile('{tts_wav_path}'); "
-                f"$speak.Rate = 0; "
-                f"$speak.Speak('{escaped_text}');"
-            )
-            import base64
-            encoded_ps_command = base64.b64encode(ps_script.encode('utf-16-le')).decode('ascii')
-            cmd = ['powershell',
-                   '-NoProfile',
-                   '-NonInteractive',
-                   '-ExecutionPolicy', 'Bypass',
-                   '-EncodedCommand', encoded_ps_command]
-            subprocess_kwargs['stdout'] = subprocess.DEVNULL
-            subprocess_kwargs['stderr'] = subprocess.PIPE
-        elif "darwin" in current_os:
-            cmd = ['say', '-r', '180', '--', text_to_speak]
-            subprocess_kwargs['capture_output'] = True
-        elif "linux" in current_os:
-            try:
-                subprocess.run(['spd-say', '--version'], capture_output=True, text=True, check=True, timeout=2)
-                cmd = ['spd-say', '-r', '-10', '-w', '--', text_to_speak]
-            except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
-                try:
-                    subprocess.run(['espeak', '--version'], capture_output=True, text=True, check=True, timeout=2)
-                    tts_wav_path = "tts_output.wav"
-                    cmd = ['espeak', '-s', '150', '-w', tts_wav_path, '--', text_to_speak]
-                except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
-                    print("TTS ERROR: Neither spd-say nor espeak found/working.")
-                    return
-            subprocess_kwargs['capture_output'] = True
-        else:
-            print(f"TTS ERROR: Unsupported OS for TTS: {current_os}")
-            return
+HELP_TEXT = (
+    "Available commands are: "
+    "Pound Nine one for current time. "
+    "Pound Nine two for current date. "
+    "Pound Nine three followed by zip code for weather. "
+    "Pound Nine four for HF band conditions. "
+    "Pound Nine five for last signal report. "
+    "Pound Nine eight for parrot mode. "
+    "Pound Four three for this help message."
+)
 
-        if cmd:
-            process_result = subprocess.run(cmd, **subprocess_kwargs)
-            command_executed = True
-            if process_result.returncode == 0:
-                success = True
-            else:
-                print(f"TTS ERROR: Command failed (code {process_result.returncode})")
-                if process_result.stderr:
-                    print(f"TTS stderr: {process_result.stderr.strip()}")
-                if hasattr(process_result, 'stdout') and process_result.stdout:
-                    print(f"TTS stdout (on error): {process_result.stdout.strip()}")
-
-    except subprocess.TimeoutExpired:
-        print(f"TTS ERROR: Speech command timed out.")
-    except FileNotFoundError:
-        missing_cmd = cmd[0] if cmd else "TTS executable"
-        print(f"TTS ERROR: {missing_cmd} not found. Please ensure it's installed and in PATH.")
-    except Exception as e:
-        print(f"TTS ERROR: An unexpected error occurred during speech: {e}")
-        import traceback
-        traceback.print_exc()
-
-    rate, data = wavfile.read(tts_wav_path)
-    if data.dtype != np.float32:
-        data = data.astype(np.float32) / 32767.0
-    data_with_tone = mix_ultrasonic_tone(data, rate)
-    wavfile.write(tts_wav_path, rate, (data_with_tone * 32767).astype(np.int16))
-    if "windows" in current_os:
-        play_cmd = [
-            "powershell",
-            "-c",
-            f"(New-Object Media.SoundPlayer '{tts_wav_path}').PlaySync();"
-        ]
-        subprocess.run(play_cmd)
-    elif "darwin" in current_os:
-        subprocess.run(["afplay", tts_wav_path])
-    elif "linux" in current_os:
-        try:
-            subprocess.run(["aplay", tts_wav_path])
-        except FileNotFoundError:
-            subprocess.run(["paplay", tts_wav_path])
-    else:
-        print("No supported audio playback method for this OS.")
-    print(f"Transmitted: '{text_to_speak}'")
+def tts_preload_phrases():
+    phrases = [f"This is {STATION_CALLSIGN} repeater.", HELP_TEXT,
+               "Parrot mode enabled. Please transmit a phrase.", "Playing back your transmission.",
+               "No recent signal report available.", "Weather request received. Please wait."]
+    s_meters = dict.fromkeys(estimate_s_meter(dbfs) for dbfs in range(-130, 1))
+    phrases += [f"your signal is {s_meter}," for s_meter in s_meters]
+    phrases += [f"SNR {snr} dB." for snr in range(0, TTS_PRELOAD_MAX_SNR + 1)]
+    return phrases
+
+def speak_and_transmit(text_to_speak):
+    if replay_mode:
+        print(f"Replay: would transmit '{text_to_speak}'")
+        events.publish('transmit', text=text_to_speak)
+        return
+    if tts.direct:
+        if respond_stage.transmit(tts.say, text_to_speak):
+            print(f"Transmitted: '{text_to_speak}'")
+        return
+    audio = tts.prepare(text_to_speak)
+    if audio is not None and respond_stage.transmit(tts.play, audio, OUTPUT_SAMPLE_RATE):
+        print(f"Transmitted: '{text_to_speak}'")
+
+# --- Channel State ---
+# Busy while CTCSS is up (including the hold time); the respond stage waits
+# for the channel to be idle before keying up.
+channel_state = {'busy': False, 'since': time.monotonic()}
+rx_muted_chunks = 0
+
+def set_channel_busy(busy):
+    if channel_state['busy'] != busy:
+        channel_state['busy'] = busy
+        channel_state['since'] = time.monotonic()
+
+def channel_idle_seconds():
+    return 0.0 if channel_state['busy'] else time.monotonic() - channel_state['since']
+
+# --- Respond Stage ---
+# Everything that keys the transmitter goes through the respond stage so
+# the detect loop never blocks on TTS, playback or network lookups.
+# Signal reports go out before station IDs, and IDs before other replies;
+# a message already waiting in the queue is not queued twice.
+def queue_transmit(text_to_speak, priority=TX_INFO):
+    if not respond_stage.put(('speak', text_to_speak), priority, ('speak', text_to_speak.lower())):
+        print(f"Respond queue full: dropped '{text_to_speak}'")
+
+def queue_transmit_composed(compose_func, *args, priority=TX_INFO, max_age=None):
+    if not respond_stage.put(('compose', (compose_func, args)), priority, (compose_func.__name__, args), max_age):
+        print(f"Respond queue full: dropped {compose_func.__name__} reply")
+
+def respond_stage_handler(item):
+    kind, payload = item
+    if kind == 'speak':
+        speak_and_transmit(payload)
+    elif kind == 'compose':
+        compose_func, args = payload
+        text_to_speak = compose_func(*args)
+        if text_to_speak:
+            speak_and_transmit(text_to_speak)
+    elif kind == 'play_audio' and not replay_mode:
+        respond_stage.transmit(tts.play, payload, AUDIO_DOWNSAMPLE_RATE)
 
 # --- SDR Callback ---
+# Runs on the acquisition converter thread (the librtlsdr callback only
+# copies raw bytes): hand the complex64 samples to the demod stage.
 def sdr_callback(samples, sdr_instance):
-    try:
-        current_samples_shifted = samples
-        chunk_rf_power = np.mean(np.abs(current_samples_shifted)**2)
-        angle = np.unwrap(np.angle(current_samples_shifted))
-        demodulated_signal = np.diff(angle, prepend=angle[0])
-        cutoff_norm = NFM_FILTER_CUTOFF / (SDR_SAMPLE_RATE / 2.0)
-        if (cutoff_norm >= 1.0): cutoff_norm = 0.999
-        b, a = sig.butter(8, cutoff_norm, btype='low', analog=False)
-        audio_filtered = sig.lfilter(b, a, demodulated_signal)
-        decimation_factor = int(SDR_SAMPLE_RATE / AUDIO_DOWNSAMPLE_RATE)
-        if (decimation_factor < 1): decimation_factor = 1
-        num_resampled_points = int(len(audio_filtered) / decimation_factor)
-        if (num_resampled_points <= 0): return
-        audio_resampled = sig.resample(audio_filtered, num_resampled_points)
-        max_abs_val = np.max(np.abs(audio_resampled))
-        audio_normalized = (audio_resampled / max_abs_val * 0.8) if max_abs_val > 1e-9 else audio_resampled
-        audio_iq_data_queue.put((audio_normalized, chunk_rf_power, np.copy(current_samples_shifted)))
-    except Exception as e:
-        print(f"Error in sdr_callback: {e}")
+    demod_stage.put(samples)
+
+def demod_chunk(samples):
+    current_samples_shifted = samples
+    chunk_rf_power = np.mean(np.abs(current_samples_shifted)**2)
+    audio_normalized = nfm_demodulator.process(current_samples_shifted)
+    if (len(audio_normalized) <= 0): return
+    audio_iq_data_queue.put((audio_normalized, chunk_rf_power, len(current_samples_shifted)))
 
 # --- Signal Metrics ---
 def estimate_s_meter(power_dbfs):
@@ -288,25 +316,22 @@ def estimate_s_meter(power_dbfs):
         else: closest_s_unit = "S9"
     return closest_s_unit
 
-def calculate_signal_metrics(iq_samples_list):
+def calculate_signal_metrics(iq_power):
     global baseline_noise_power
-    if not iq_samples_list:
-        return "Unknown", 0.0
+    if iq_power is None or iq_power.sample_count == 0:
+        return "Unknown", 0.0, None
     try:
-        full_iq_segment = np.concatenate(iq_samples_list)
-        if len(full_iq_segment) == 0:
-            return "Unknown", 0.0
-        signal_plus_noise_power = np.mean(np.abs(full_iq_segment)**2)
+        signal_plus_noise_power = iq_power.mean_power
         if signal_plus_noise_power < 1e-12:
-            return "S0", 0.0
+            return "S0", 0.0, None
         signal_plus_noise_dbfs = 10 * np.log10(signal_plus_noise_power)
         if baseline_noise_power and baseline_noise_power > 0:
             noise_power = baseline_noise_power
         else:
-            n = len(full_iq_segment)
+            chunk_powers = iq_power.chunk_powers()
+            n = len(chunk_powers)
             edge = max(1, n // 10)
-            noise_samples = np.concatenate([full_iq_segment[:edge], full_iq_segment[-edge:]])
-            noise_power = np.median(np.abs(noise_samples)**2)
+            noise_power = np.median(np.concatenate([chunk_powers[:edge], chunk_powers[-edge:]]))
             if noise_power < 1e-12:
                 noise_power = 1e-12
         noise_dbfs = 10 * np.log10(noise_power)
@@ -314,10 +339,10 @@ def calculate_signal_metrics(iq_samples_list):
         snr_db = 10 * np.log10(max(snr_linear, 1e-12))
         s_meter_reading = estimate_s_meter(signal_plus_noise_dbfs)
         print(f"signal+noise: {signal_plus_noise_power}, noise: {noise_power}, snr_linear: {snr_linear}, snr_db: {snr_db}")
-        return s_meter_reading, snr_db
+        return s_meter_reading, snr_db, float(signal_plus_noise_dbfs)
     except Exception as e:
         print(f"Error calculating signal metrics: {e}")
-        return "Unknown", 0.0
+        return "Unknown", 0.0, None
 
 # --- Callsign and STT Processing ---
 def convert_nato_to_text(nato_words_from_stt):
@@ -332,101 +357,279 @@ def validate_callsign_format(callsign_text):
     if not callsign_text: return False
     return bool(re.match(CALLSIGN_REGEX, callsign_text.upper()))
 
-def process_stt_result(text_input, iq_data_for_snr_list, uid=None, audio_path=None, spectrogram_path=None):
+def parse_callsign(text_lower):
+    nato_callsign_words = []
+    for word in text_lower.split():
+        if word == "signal": break
+        nato_callsign_words.append(word)
+    return convert_nato_to_text(nato_callsign_words).upper() if nato_callsign_words else ''
+
+last_call_info = {'callsign': "", 'time': 0}
+last_call_lock = threading.Lock()
+
+def compose_signal_report(callsign, iq_power):
+    global last_call_info
+    current_time = time.time()
+    s_meter, snr, _ = calculate_signal_metrics(iq_power)
+    with last_call_lock:
+        if last_call_info['callsign'] == callsign and (current_time - last_call_info['time']) < 10:
+            print(f"Callsign {callsign} processed recently. Skipping response.")
+            return None
+        last_call_info = {'callsign': callsign, 'time': current_time, 's_meter': s_meter, 'snr': snr}
+    response_text = f"{callsign}, your signal is {s_meter}, SNR {int(round(snr))} dB."
+    print(f"Response: {response_text}")
+    return response_text
+
+def process_stt_result(text_input, iq_power, uid=None, audio_path=None, spectrogram_path=None, ctcss_tone=None, timestamp=None, respond=True, duration_sec=0.0):
     text_lower = text_input.lower(); print(f"STT recognized: '{text_input}'")
     try:
-        words = text_lower.split(); nato_callsign_words = []
-        for word in words:
-            if word == "signal": break
-            nato_callsign_words.append(word)
-        actual_callsign_text = convert_nato_to_text(nato_callsign_words).upper() if nato_callsign_words else ''
-        current_time = time.time()
-        s_meter, snr = calculate_signal_metrics(iq_data_for_snr_list)
-        duration_sec = getattr(process_stt_result, 'last_audio_len', 0) / AUDIO_DOWNSAMPLE_RATE
+        actual_callsign_text = parse_callsign(text_lower)
+        s_meter, snr, signal_dbfs = calculate_signal_metrics(iq_power)
         log_callsign = actual_callsign_text if validate_callsign_format(actual_callsign_text) else 'Unknown'
         log_signal_report(
             log_callsign, s_meter, snr, text_input, duration_sec,
-            audio_path, spectrogram_path
+            audio_path, spectrogram_path, timestamp=timestamp, uid=uid, ctcss_tone=ctcss_tone,
+            signal_dbfs=signal_dbfs
+        )
+        events.publish(
+            'report', uid=uid, callsign=log_callsign, s_meter=s_meter, snr=round(float(snr), 1),
+            text=text_input, duration=round(duration_sec, 2), timestamp=timestamp,
+            signal_dbfs=None if signal_dbfs is None else round(signal_dbfs, 1)
         )
         if text_lower.endswith(TRIGGER_PHRASE_END) and validate_callsign_format(actual_callsign_text):
-            if hasattr(process_stt_result, 'last_call_info') and \
-               process_stt_result.last_call_info['callsign'] == actual_callsign_text and \
-               (current_time - process_stt_result.last_call_info['time']) < 10:
-                print(f"Callsign {actual_callsign_text} processed recently. Skipping response.")
-            else:
-                process_stt_result.last_call_info = {'callsign': actual_callsign_text, 'time': current_time}
-                response_text = f"{actual_callsign_text}, your signal is {s_meter}, SNR {int(round(snr))} dB."
-                print(f"Response: {response_text}")
-                speak_and_transmit(response_text)
+            if respond:
+                response_text = compose_signal_report(actual_callsign_text, iq_power)
+                if response_text:
+                    queue_transmit(response_text, TX_REPORT)
         elif not validate_callsign_format(actual_callsign_text):
             print(f"Invalid or missing callsign for '{actual_callsign_text}', logged as 'Unknown'.")
     except Exception as e:
         print(f"Error processing command: {e}"); import traceback; traceback.print_exc()
 
-if not hasattr(process_stt_result, 'last_call_info'):
-    process_stt_result.last_call_info = {'callsign':"", 'time':0}
-
-SIGREP_STATUS_FILE = 'sigrep_status.json'
-
-def write_status(state):
+# --- Streaming STT Stage ---
+# While a transmission is being captured its audio is also fed, chunk by
+# chunk, to a Vosk recognizer in this process. When a partial result
+# already contains the trigger phrase with a valid callsign, the reply is
+# queued the moment the transmission ends (not after the final decode or
+# the WAV/spectrogram work) and composed from the complete IQ power. The
+# final transcript is handed to the persist stage for logging. When no
+# post-processing STT is needed, the workers don't load a model of their
+# own unless a capture misses the stream.
+stt_transcriber = None
+stt_streams = {}
+stt_streams_lock = threading.Lock()
+
+class TranscriptStream:
+    def __init__(self, uid):
+        self.uid = uid
+        self.text = ''
+        self.replied = False
+        self.reply_callsign = None
+        self.ended = False
+        self.finished = threading.Event()
+        self.iq_power = None
+
+def start_stt_streaming():
+    global stt_transcriber
+    if not STT_STREAMING or STT_ENGINE != 'vosk':
+        return
+    stt_transcriber = StreamingTranscriber(VOSK_MODEL_PATH, AUDIO_DOWNSAMPLE_RATE, VOSK_GRAMMAR_STR, HPF_SOS)
+    if not stt_transcriber.available:
+        print("Streaming STT unavailable; falling back to post-processing STT.")
+        stt_transcriber = None
+
+def stt_stream_begin(uid):
+    if stt_transcriber is None:
+        return False
+    with stt_streams_lock:
+        stt_streams[uid] = TranscriptStream(uid)
+    return stt_stage.put(('start', uid))
+
+def stt_stream_end(uid, iq_power, keep):
+    with stt_streams_lock:
+        stream = stt_streams.get(uid) if keep else stt_streams.pop(uid, None)
+        if stream is None:
+            return
+        stream.iq_power = iq_power
+        stream.ended = True
+        callsign = stream.reply_callsign
+    if callsign:
+        queue_transmit_composed(compose_streamed_signal_report, stream, priority=TX_REPORT)
+    stt_stage.put(('end' if keep else 'cancel', uid))
+
+def stt_stream_result(uid, timeout):
+    with stt_streams_lock:
+        stream = stt_streams.get(uid)
+    if stream is None:
+        return None
+    if not stream.finished.wait(timeout):
+        print(f"Streaming STT: no final result for {uid} after {timeout:.0f}s.")
+    with stt_streams_lock:
+        stt_streams.pop(uid, None)
+    return stream
+
+def compose_streamed_signal_report(stream):
+    return compose_signal_report(stream.reply_callsign, stream.iq_power)
+
+def maybe_reply_from_transcript(stream, text):
+    if stream.replied or TRIGGER_PHRASE_END not in text:
+        return
+    callsign = parse_callsign(text)
+    if validate_callsign_format(callsign):
+        stream.replied = True
+        with stt_streams_lock:
+            stream.reply_callsign = callsign
+            ended = stream.ended
+        if ended:
+            queue_transmit_composed(compose_streamed_signal_report, stream, priority=TX_REPORT)
+        else:
+            print(f"Trigger phrase heard from {callsign}; reply will be queued at the end of transmission.")
+
+def stt_stage_handler(item):
+    kind, payload = item
+    if kind == 'start':
+        stt_transcriber.start(payload)
+        return
+    if kind == 'cancel':
+        stt_transcriber.cancel()
+        return
+    with stt_streams_lock:
+        stream = stt_streams.get(payload if kind == 'end' else stt_transcriber.uid)
+    if kind == 'audio':
+        partial = stt_transcriber.feed(payload)
+        if stream is not None and partial:
+            maybe_reply_from_transcript(stream, partial.lower())
+    elif kind == 'end':
+        text = stt_transcriber.finish()
+        if stream is not None:
+            stream.text = text
+            if text.lower().endswith(TRIGGER_PHRASE_END):
+                maybe_reply_from_transcript(stream, text.lower())
+            stream.finished.set()
+
+# --- Run State ---
+# Kept in memory and served over the IPC control socket.
+run_state = {'state': 'initializing', 'last_started': None, 'pid': os.getpid(), 'started_at': time.time()}
+
+def set_state(state):
+    run_state['state'] = state
     if state == 'ready':
-        status = {'state': state, 'last_started': time.strftime('%Y-%m-%d %H:%M:%S')}
-    else:
-        status = {'state': state}
-    with open(SIGREP_STATUS_FILE, 'w') as f:
-        json.dump(status, f)
-
-write_status('initializing')
+        run_state['last_started'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    events.publish('state', state=state, last_started=run_state['last_started'])
 
 ID_INTERVAL_SECONDS = 600
 last_id_time = time.time()
 
+# --- Segment Hand-off ---
+# Called when CTCSS drops (or on shutdown, for a transmission still in
+# progress) to send the captured audio on to the persist stage.
+def finish_segment(audio_buffer, iq_power, ctcss_tone_powers, segment_uid, segment_streamed, reason="CTCSS lost"):
+    buffer_duration = len(audio_buffer) / AUDIO_DOWNSAMPLE_RATE
+    print(f"{reason}: processing segment ({buffer_duration:.2f}s audio).")
+    if CTCSS_SCAN:
+        ctcss_tone, ctcss_margin_db = strongest_ctcss_tone(ctcss_tone_powers)
+        if ctcss_tone is not None:
+            print(f"CTCSS scan: {ctcss_tone:.1f} Hz ({ctcss_margin_db:.1f} dB over next tone).")
+        ctcss_tone_powers[:] = 0.0
+    else:
+        ctcss_tone = CTCSS_FREQ
+    keep_segment = buffer_duration >= MIN_TRANSMISSION_LENGTH
+    set_channel_busy(False)
+    events.publish('ctcss', open=False, uid=segment_uid if keep_segment else None, tone=ctcss_tone,
+                   duration=round(buffer_duration, 2))
+    if segment_streamed:
+        stt_stream_end(segment_uid, iq_power.copy(), keep_segment)
+    if keep_segment:
+        if audio_buffer.dropped:
+            print(f"Transmission exceeded {MAX_TRANSMISSION_SECONDS:.0f}s; kept the last {MAX_TRANSMISSION_SECONDS:.0f}s.")
+        segment = {
+            'uid': segment_uid,
+            'captured_at': time.localtime(),
+            'audio': audio_buffer.view().copy(),
+            'iq_power': iq_power.copy(),
+            'ctcss_tone': ctcss_tone,
+            'parrot': parrot_mode,
+            'streamed': segment_streamed,
+        }
+        if not persist_stage.put(segment):
+            print(f"Persist queue full: dropped capture {segment['uid']}.")
+    audio_buffer.clear()
+    iq_power.clear()
+
 # --- Main Audio Processing Thread ---
 def audio_processing_thread_func():
     global is_baselining_rf, baseline_rf_power_values
     global dtmf_last_digit, dtmf_last_time, dtmf_buffer
     global parrot_mode, parrot_recording, parrot_audio, parrot_waiting_for_next_transmission, parrot_ready_to_record
     global CTCSS_THRESHOLD
-    global last_id_time
+    global last_id_time, rx_muted_chunks
 
     print("Audio processing thread started.")
-    write_status('baselining')
-    audio_buffer = np.array([], dtype=np.float32)
-    iq_buffer = []
-    ctcss_buffer = np.array([], dtype=np.float32)
+    set_state('baselining')
+    audio_buffer = RingBuffer(MAX_TRANSMISSION_SAMPLES)
+    iq_power = IQPowerAccumulator(MAX_TRANSMISSION_CHUNKS)
+    ctcss_buffer = RingBuffer(CTCSS_BLOCK_SAMPLES + 2 * SMALL_AUDIO_CHUNK_SAMPLES)
     ctcss_active = False
     last_ctcss_time = 0
     baselining_start_time = time.time()
-    vosk_recognizer_instance = None
-
-    if STT_ENGINE == "vosk" and vosk_model:
-        try:
-            vosk_recognizer_instance = KaldiRecognizer(vosk_model, AUDIO_DOWNSAMPLE_RATE, VOSK_GRAMMAR_STR)
-            print("Vosk KaldiRecognizer initialized.")
-            print("RF Baselining in progress... Please wait for baseline to complete before transmitting signal.")
-        except Exception as e:
-            print(f"Error initializing Vosk KaldiRecognizer: {e}")
-            vosk_recognizer_instance = None
-
-    baseline_ctcss_buffer = np.array([], dtype=np.float32)
+    current_time = baselining_start_time
+    stream_samples = 0
+    if replay_mode:
+        last_id_time = baselining_start_time
+    print("RF Baselining in progress... Please wait for baseline to complete before transmitting signal.")
+
+    baseline_ctcss_buffer = RingBuffer(CTCSS_BLOCK_SAMPLES + 2 * SMALL_AUDIO_CHUNK_SAMPLES)
+    ctcss_scan_history = RingBuffer(CTCSS_SCAN_WINDOW_SAMPLES)
+    ctcss_tone_powers = np.zeros(len(CTCSS_TONES))
     ctcss_consecutive_count = 0
     CTCSS_CONSECUTIVE_REQUIRED = 8
+    segment_uid = None
+    segment_streamed = False
+    last_level_event = 0.0
+    rx_muted = False
 
     while True:
         try:
             # --- Automatic Station ID ---
-            if time.time() - last_id_time > ID_INTERVAL_SECONDS:
-                speak_and_transmit(f"This is {STATION_CALLSIGN} repeater.")
-                last_id_time = time.time()
-
-            audio_chunk_normalized, chunk_rf_power, iq_data_for_chunk = audio_iq_data_queue.get(timeout=0.1)
-            current_time = time.time()
+            id_clock = current_time if replay_mode else time.time()
+            if id_clock - last_id_time > ID_INTERVAL_SECONDS:
+                queue_transmit(f"This is {STATION_CALLSIGN} repeater.", TX_ID)
+                last_id_time = id_clock
+
+            audio_chunk_normalized, chunk_rf_power, iq_sample_count = audio_iq_data_queue.get(timeout=0.1)
+            # A replay runs on the sample clock, so hold times and baselining
+            # don't depend on how fast the file is read. Live chunks can be
+            # dropped under load, so live runs keep the wall clock.
+            if replay_mode:
+                stream_samples += iq_sample_count
+                current_time = baselining_start_time + stream_samples / SDR_SAMPLE_RATE
+            else:
+                current_time = time.time()
+            if events.has_subscribers and current_time - last_level_event >= LEVEL_EVENT_INTERVAL_SECONDS:
+                level_dbfs = 10 * np.log10(max(float(chunk_rf_power), 1e-12))
+                events.publish('level', dbfs=round(level_dbfs, 1), s_meter=estimate_s_meter(level_dbfs), ctcss=ctcss_active)
+                last_level_event = current_time
+
+            # --- Own Transmission ---
+            # Our own signal comes straight back in while we transmit; keep
+            # draining the queue but don't decode it.
+            if respond_stage.transmitting.is_set():
+                rx_muted = True
+                rx_muted_chunks += 1
+                continue
+            if rx_muted:
+                rx_muted = False
+                ctcss_buffer.clear()
+                ctcss_scan_history.clear()
+                ctcss_consecutive_count = 0
+                dtmf_last_digit = None
 
             dtmf_digit = detect_dtmf_digit(audio_chunk_normalized, AUDIO_DOWNSAMPLE_RATE)
             if dtmf_digit:
-                now = time.time()
+                now = current_time
                 if dtmf_digit != dtmf_last_digit or (now - dtmf_last_time) > DTMF_DEBOUNCE_TIME:
                     print(f"DTMF detected: {dtmf_digit}")
+                    events.publish('dtmf', digit=dtmf_digit)
                     dtmf_buffer += dtmf_digit
                     dtmf_last_digit = dtmf_digit
                     dtmf_last_time = now
@@ -435,7 +638,7 @@ def audio_processing_thread_func():
                 if dtmf_buffer.endswith("#91"):
                     now = datetime.datetime.now()
                     time_str = now.strftime("%I:%M %p").lstrip("0")
-                    speak_and_transmit(f"The current time is {time_str}.")
+                    queue_transmit(f"The current time is {time_str}.")
                     dtmf_buffer = ""
                     dtmf_last_digit = None
                     dtmf_last_time = 0
@@ -443,7 +646,7 @@ def audio_processing_thread_func():
                 if dtmf_buffer.endswith("#92"):
                     now = datetime.datetime.now()
                     date_str = now.strftime("%A, %B %d, %Y")
-                    speak_and_transmit(f"Today is {date_str}.")
+                    queue_transmit(f"Today is {date_str}.")
                     dtmf_buffer = ""
                     dtmf_last_digit = None
                     dtmf_last_time = 0
@@ -452,22 +655,27 @@ def audio_processing_thread_func():
                 if match:
                     zip_code = match.group(1)
                     print(f"Weather request triggered by DTMF #93{zip_code}.")
-                    speak_and_transmit("Weather request received. Please wait.")
-                    weather = get_weather_for_zip(zip_code)
-                    speak_and_transmit(weather)
+                    # A stale answer is given at once while it refreshes;
+                    # only ask the caller to wait when there is none.
+                    weather_age = weather_cache.age(zip_code)
+                    weather_cache.prefetch(zip_code)
+                    if weather_age is None or weather_age >= weather_cache.ttl + weather_cache.max_stale:
+                        queue_transmit("Weather request received. Please wait.")
+                    queue_transmit_composed(get_weather_for_zip, zip_code)
                     dtmf_buffer = ""
                     dtmf_last_digit = None
                     dtmf_last_time = 0
 
                 if dtmf_buffer.endswith("#95"):
-                    last_call = getattr(process_stt_result, 'last_call_info', None)
-                    if last_call and last_call.get('callsign'):
+                    with last_call_lock:
+                        last_call = last_call_info
+                    if last_call.get('callsign'):
                         s_meter = last_call.get('s_meter', 'Unknown')
                         snr = last_call.get('snr', 0)
                         callsign = last_call.get('callsign', 'Unknown')
-                        speak_and_transmit(f"Last signal was {callsign}, S meter {s_meter}, SNR {int(round(snr))} dB.")
+                        queue_transmit(f"Last signal was {callsign}, S meter {s_meter}, SNR {int(round(snr))} dB.")
                     else:
-                        speak_and_transmit("No recent signal report available.")
+                        queue_transmit("No recent signal report available.")
                     dtmf_buffer = ""
                     dtmf_last_digit = None
                     dtmf_last_time = 0
@@ -482,25 +690,14 @@ def audio_processing_thread_func():
 
             if dtmf_buffer.endswith("#94"):
                 print("HF band conditions requested by DTMF #94.")
-                band_report = get_hamqsl_hf_band_conditions()
-                speak_and_transmit(band_report)
+                queue_transmit_composed(get_hamqsl_hf_band_conditions)
                 dtmf_buffer = ""
                 dtmf_last_digit = None
                 dtmf_last_time = 0
 
             if dtmf_buffer.endswith("#43"):
                 print("Help requested by DTMF #43.")
-                help_text = (
-                    "Available commands are: "
-                    "Pound Nine one for current time. "
-                    "Pound Nine two for current date. "
-                    "Pound Nine three followed by zip code for weather. "
-                    "Pound Nine four for HF band conditions. "
-                    "Pound Nine five for last signal report. "
-                    "Pound Nine eight for parrot mode. "
-                    "Pound Four three for this help message."
-                )
-                speak_and_transmit(help_text)
+                queue_transmit(HELP_TEXT)
                 dtmf_buffer = ""
                 dtmf_last_digit = None
                 dtmf_last_time = 0
@@ -508,13 +705,13 @@ def audio_processing_thread_func():
             # --- Baselining ---
             if is_baselining_rf:
                 baseline_rf_power_values.append(chunk_rf_power)
-                baseline_ctcss_buffer = np.concatenate((baseline_ctcss_buffer, audio_chunk_normalized))
-                if len(baseline_ctcss_buffer) >= 2048:
-                    ctcss_power = detect_ctcss_tone(baseline_ctcss_buffer, AUDIO_DOWNSAMPLE_RATE, return_power=True)
+                baseline_ctcss_buffer.extend(audio_chunk_normalized)
+                if len(baseline_ctcss_buffer) >= CTCSS_BLOCK_SAMPLES:
+                    ctcss_power = ctcss_block_power(baseline_ctcss_buffer.view())
                     print(f"Baseline CTCSS power: {ctcss_power}")
                     baseline_ctcss_powers.append(ctcss_power)
-                    baseline_ctcss_buffer = np.array([], dtype=np.float32)
-                if (time.time() - baselining_start_time) >= BASELINE_DURATION_SECONDS:
+                    baseline_ctcss_buffer.clear()
+                if (current_time - baselining_start_time) >= BASELINE_DURATION_SECONDS:
                     if baseline_rf_power_values:
                         avg_rf_noise = np.mean(baseline_rf_power_values)
                         std_rf_noise = np.std(baseline_rf_power_values)
@@ -532,20 +729,24 @@ def audio_processing_thread_func():
                         CTCSS_THRESHOLD = float(cfg.get('CTCSS_THRESHOLD'))
                         print(f"Manual CTCSS threshold set to {CTCSS_THRESHOLD:.2f}")
                     baseline_ctcss_powers.clear()
-                    write_status('ready')
-                    ctcss_buffer = np.array([], dtype=np.float32)
+                    set_state('ready')
+                    ctcss_buffer.clear()
                     ctcss_consecutive_count = 0
                     ctcss_active = False
                     last_ctcss_time = current_time
                     continue
 
             # --- CTCSS Detection ---
-            ctcss_buffer = np.concatenate((ctcss_buffer, audio_chunk_normalized))
+            ctcss_buffer.extend(audio_chunk_normalized)
+            if CTCSS_SCAN:
+                ctcss_scan_history.extend(audio_chunk_normalized)
             ctcss_detected = False
-            if len(ctcss_buffer) >= 2048 and CTCSS_THRESHOLD is not None:
-                ctcss_power = detect_ctcss_tone(ctcss_buffer, AUDIO_DOWNSAMPLE_RATE, return_power=True)
+            if len(ctcss_buffer) >= CTCSS_BLOCK_SAMPLES and CTCSS_THRESHOLD is not None:
+                ctcss_power = ctcss_block_power(ctcss_buffer.view())
                 ctcss_detected = ctcss_power > CTCSS_THRESHOLD
-                ctcss_buffer = np.array([], dtype=np.float32)
+                ctcss_buffer.clear()
+                if CTCSS_SCAN and (ctcss_active or ctcss_detected) and ctcss_scan_history.is_full:
+                    ctcss_tone_powers += scan_ctcss_tones(ctcss_scan_history.view(), AUDIO_DOWNSAMPLE_RATE)
 
                 if ctcss_detected:
                     ctcss_consecutive_count += 1
@@ -557,75 +758,40 @@ def audio_processing_thread_func():
                     if not ctcss_active:
                         print("CTCSS detected: starting capture.")
                         ctcss_active = True
+                        set_channel_busy(True)
+                        events.publish('ctcss', open=True)
 
             if ctcss_active or ctcss_detected or (current_time - last_ctcss_time) <= CTCSS_HOLDTIME:
-                audio_buffer = np.concatenate((audio_buffer, audio_chunk_normalized))
-                if iq_data_for_chunk is not None:
-                    iq_buffer.append(iq_data_for_chunk)
+                if segment_uid is None:
+                    segment_uid = uuid.uuid4().hex[:16]
+                    segment_streamed = not parrot_mode and stt_stream_begin(segment_uid)
+                audio_buffer.extend(audio_chunk_normalized)
+                iq_power.add(chunk_rf_power, iq_sample_count)
+                if segment_streamed:
+                    stt_stage.put(('audio', audio_chunk_normalized))
 
             if ctcss_detected:
                 last_ctcss_time = current_time
                 if not ctcss_active:
                     print("CTCSS detected: starting capture.")
                     ctcss_active = True
+                    set_channel_busy(True)
+                    events.publish('ctcss', open=True)
 
             # --- End of CTCSS, process segment ---
             if ctcss_active and (current_time - last_ctcss_time) > CTCSS_HOLDTIME:
-                buffer_duration = len(audio_buffer) / AUDIO_DOWNSAMPLE_RATE
-                print(f"CTCSS lost: processing segment ({buffer_duration:.2f}s audio).")
-                if buffer_duration >= MIN_TRANSMISSION_LENGTH:
-                    os.makedirs(AUDIO_WAV_OUTPUT_DIR, exist_ok=True)
-                    capture_uid = uuid.uuid4().hex[:16]
-                    wav_filename = f"ctcss_capture_{time.strftime('%Y%m%d_%H%M%S')}_{capture_uid}.wav"
-                    wav_path = os.path.join(AUDIO_WAV_OUTPUT_DIR, wav_filename)
-                    audio_for_wav = sig.sosfilt(HPF_SOS, audio_buffer)
-                    audio_data_int16 = np.clip(audio_for_wav, -1.0, 1.0) * 32767
-                    audio_data_int16 = audio_data_int16.astype(np.int16)
-                    wavfile.write(wav_path, AUDIO_DOWNSAMPLE_RATE, audio_data_int16)
-
-                    # --- Save Spectrogram ---
-                    if SAVE_SPECTROGRAM:
-                        spec_filename = wav_filename.replace('.wav', '.png')
-                        spec_path = os.path.join(AUDIO_WAV_OUTPUT_DIR, spec_filename)
-                        plt.figure(figsize=(8, 4))
-                        plt.specgram(audio_for_wav, NFFT=256, Fs=AUDIO_DOWNSAMPLE_RATE, noverlap=128, cmap='viridis')
-                        plt.title(f"Spectrogram {capture_uid}")
-                        plt.xlabel("Time (s)")
-                        plt.ylabel("Frequency (Hz)")
-                        plt.colorbar(label="Intensity (dB)")
-                        plt.savefig(spec_path, bbox_inches='tight')
-                        plt.close()
-
-                    # --- Speech-to-Text (STT) Processing ---
-                    if not parrot_mode:
-                        recognized_text_segment = ''
-                        if vosk_recognizer_instance:
-                            audio_bytes = audio_data_int16.tobytes()
-                            vosk_recognizer_instance.Reset()
-                            if vosk_recognizer_instance.AcceptWaveform(audio_bytes):
-                                result = json.loads(vosk_recognizer_instance.Result())
-                                recognized_text_segment = result.get('text', '')
-                            else:
-                                final_result_json = json.loads(vosk_recognizer_instance.FinalResult())
-                                recognized_text_segment = final_result_json.get('text', '')
-                            print(f"STT recognized: '{recognized_text_segment}'")
-                        else:
-                            print("STT: Recognizer not available.")
-
-                        process_stt_result.last_audio_len = len(audio_buffer)
-                        process_stt_result(
-                            recognized_text_segment or '',
-                            list(iq_buffer),
-                            uid=capture_uid,
-                            audio_path=wav_path,
-                            spectrogram_path=spec_path if SAVE_SPECTROGRAM else None
-                        )
-
-                audio_buffer = np.array([], dtype=np.float32)
-                iq_buffer.clear()
+                finish_segment(audio_buffer, iq_power, ctcss_tone_powers, segment_uid, segment_streamed)
                 ctcss_active = False
+                segment_uid = None
+                segment_streamed = False
 
         except queue.Empty:
+            if detect_stopping.is_set():
+                if ctcss_active:
+                    finish_segment(audio_buffer, iq_power, ctcss_tone_powers, segment_uid, segment_streamed,
+                                   reason="Shutting down")
+                print("Audio processing thread stopped.")
+                return
             continue
         except Exception as e:
             print(f"Error in audio processing thread: {e}")
@@ -635,7 +801,7 @@ def audio_processing_thread_func():
         # --- Parrot Mode ---
         if parrot_mode and parrot_waiting_for_next_vad and not ctcss_active:
             print("Parrot mode enabled. Please transmit a phrase.")
-            speak_and_transmit("Parrot mode enabled. Please transmit a phrase.")
+            queue_transmit("Parrot mode enabled. Please transmit a phrase.")
             parrot_waiting_for_next_vad = False
             parrot_ready_to_record = True
 
@@ -651,25 +817,8 @@ def audio_processing_thread_func():
 
         if parrot_mode and parrot_recording and len(parrot_audio) > 0 and not ctcss_active:
             print("Playing back your transmission...")
-            speak_and_transmit("Playing back your transmission.")
-            parrot_samples = np.concatenate(parrot_audio)
-            parrot_wav_path = os.path.join(AUDIO_WAV_OUTPUT_DIR, "parrot_playback.wav")
-            wavfile.write(parrot_wav_path, AUDIO_DOWNSAMPLE_RATE, (parrot_samples * 32767).astype(np.int16))
-            current_os = platform.system().lower()
-            if "windows" in current_os:
-                play_cmd = [
-                    "powershell",
-                    "-c",
-                    f"(New-Object Media.SoundPlayer '{parrot_wav_path}').PlaySync();"
-                ]
-                subprocess.run(play_cmd)
-            elif "darwin" in current_os:
-                subprocess.run(["afplay", parrot_wav_path])
-            elif "linux" in current_os:
-                try:
-                    subprocess.run(["aplay", parrot_wav_path])
-                except FileNotFoundError:
-                    subprocess.run(["paplay", parrot_wav_path])
+            queue_transmit("Playing back your transmission.")
+            respond_stage.put(('play_audio', np.concatenate(parrot_audio)))
             parrot_mode = False
             parrot_recording = False
             parrot_audio = []
@@ -684,16 +833,9 @@ def input_monitor_thread_func():
             command = input()
             if command.strip().lower() == 'exit':
                 print("Exit command received. Shutting down...")
-                if sdr: print("Stopping SDR..."); sdr.cancel_read_async(); sdr.close(); print("SDR closed.")
-                print("Exiting script."); os._exit(0)
-        except EOFError: print("EOF on input, exiting."); os._exit(0)
-        except Exception as e: print(f"Input monitor error: {e}, exiting."); os._exit(0)
-
-# --- Utility: Mix Ultrasonic Tone ---
-def mix_ultrasonic_tone(audio, sample_rate, tone_freq=18000, tone_level=0.01):
-    t = np.arange(len(audio)) / sample_rate
-    tone = tone_level * np.sin(2 * np.pi * tone_freq * t)
-    return audio + tone
+                request_shutdown(); return
+        except EOFError: print("EOF on input, exiting."); request_shutdown(); return
+        except Exception as e: print(f"Input monitor error: {e}, exiting."); request_shutdown(); return
 
 # --- DTMF Detection ---
 DTMF_FREQS = {
@@ -718,52 +860,20 @@ parrot_waiting_for_next_vad = False
 parrot_ready_to_record = False
 
 def get_weather_for_zip(zip_code):
-    api_key = os.environ.get("OPENWEATHER_API_KEY")
-    url = f"http://api.openweathermap.org/data/2.5/weather?zip={zip_code},us&appid={api_key}&units=imperial"
     try:
-        resp = requests.get(url, timeout=5)
-        data = resp.json()
-        if "main" in data and "weather" in data and "name" in data:
-            temp = data["main"].get("temp")
-            desc = data["weather"][0].get("description", "").capitalize()
-            temp_min = data["main"].get("temp_min")
-            temp_max = data["main"].get("temp_max")
-            city = data.get("name", "your area")
-            humidity = data["main"].get("humidity")
-            wind = data.get("wind", {}).get("speed")
-            report = f"The current temperature in {city} is {int(round(temp))} degrees, {desc}."
-            if temp_max is not None and temp_min is not None:
-                report += f" The high is {int(round(temp_max))} and the low is {int(round(temp_min))} degrees."
-            if humidity is not None:
-                report += f" Humidity is {humidity} percent."
-            if wind is not None:
-                report += f" Wind speed is {int(round(wind))} miles per hour."
-            return report
-        elif "message" in data:
-            return f"Sorry, weather API error: {data['message']}"
-        else:
-            return "Sorry, I could not find the weather for that zip code."
-    except Exception as e:
+        return weather_cache.get(zip_code, FETCH_WAIT_SECONDS)
+    except WeatherError as e:
+        return str(e)
+    except Exception:
         return "Sorry, there was an error retrieving the weather."
 
+DTMF_ALL_FREQS = tuple(DTMF_FREQS['low'] + DTMF_FREQS['high'])
+
 def detect_dtmf_digit(samples, sample_rate):
-    def goertzel(samples, freq, sample_rate):
-        N = len(samples)
-        k = int(0.5 + N * freq / sample_rate)
-        w = 2 * np.pi * k / N
-        cosine = np.cos(w)
-        coeff = 2 * cosine
-        q0 = 0
-        q1 = 0
-        q2 = 0
-        for sample in samples:
-            q0 = coeff * q1 - q2 + sample
-            q2 = q1
-            q1 = q0
-        return q1**2 + q2**2 - q1*q2*coeff
-
-    low_strengths = {f: goertzel(samples, f, sample_rate) for f in DTMF_FREQS['low']}
-    high_strengths = {f: goertzel(samples, f, sample_rate) for f in DTMF_FREQS['high']}
+    powers = goertzel_powers(samples, sample_rate, DTMF_ALL_FREQS)
+    n_low = len(DTMF_FREQS['low'])
+    low_strengths = dict(zip(DTMF_FREQS['low'], powers[:n_low]))
+    high_strengths = dict(zip(DTMF_FREQS['high'], powers[n_low:]))
     low = max(low_strengths, key=low_strengths.get)
     high = max(high_strengths, key=high_strengths.get)
     low_val = low_strengths[low]
@@ -788,72 +898,374 @@ def detect_ctcss_tone(audio_samples, sample_rate, ctcss_freq=CTCSS_FREQ, thresho
     N = len(audio_samples)
     if N < int(sample_rate * 0.02):
         return (0.0 if return_power else False)
-    k = int(0.5 + N * ctcss_freq / sample_rate)
-    w = 2 * np.pi * k / N
-    cosine = np.cos(w)
-    coeff = 2 * cosine
-    q0 = 0
-    q1 = 0
-    q2 = 0
-    for sample in audio_samples:
-        q0 = coeff * q1 - q2 + sample
-        q2 = q1
-        q1 = q0
-    power = q1**2 + q2**2 - q1*q2*coeff
+    power = goertzel_power(audio_samples, sample_rate, ctcss_freq)
     if return_power:
         return power
     if threshold is None:
         threshold = CTCSS_THRESHOLD if CTCSS_THRESHOLD is not None else 1000
     return power > threshold
 
+def ctcss_block_power(audio_samples):
+    # In scan mode any standard tone opens capture; the tone itself is
+    # identified over the whole transmission by scan_ctcss_tones.
+    if CTCSS_SCAN:
+        if len(audio_samples) < int(AUDIO_DOWNSAMPLE_RATE * 0.02):
+            return 0.0
+        return float(np.max(goertzel_powers(audio_samples, AUDIO_DOWNSAMPLE_RATE, CTCSS_TONES, exact=True)))
+    return detect_ctcss_tone(audio_samples, AUDIO_DOWNSAMPLE_RATE, return_power=True)
+
 def get_hamqsl_hf_band_conditions():
-    url = "https://www.hamqsl.com/solarxml.php"
     try:
-        resp = requests.get(url, timeout=5)
-        root = ET.fromstring(resp.content)
-        bands = {}
-        spoken_lines = []
-        for band_elem in root.findall(".//calculatedconditions/band"):
-            name = band_elem.attrib.get("name")
-            time = band_elem.attrib.get("time")
-            cond = band_elem.text.strip()
-            if name not in bands:
-                bands[name] = {}
-            bands[name][time] = cond
-        for band in ["80m-40m", "30m-20m", "17m-15m", "12m-10m"]:
-            day = bands.get(band, {}).get("day", "unknown")
-            night = bands.get(band, {}).get("night", "unknown")
-            band_spoken = band.replace("m-", " meter to ").replace("m", " meter")
-            spoken_lines.append(f"{band_spoken} daytime {day.lower()} night time {night.lower()}")
-        return ". ".join(spoken_lines)
+        return band_conditions_cache.get('hf', FETCH_WAIT_SECONDS)
     except Exception as e:
         print(f"Error fetching HF band conditions: {e}")
         return "Sorry, I could not retrieve HF band conditions."
 
+# --- Persist Stage ---
+# Completed segments are handed to a pool of post-processing processes
+# (postproc.process_segment: HPF, WAV, spectrogram, Vosk). Each persist
+# thread waits on one job, so up to POSTPROC_WORKERS segments are processed
+# in parallel; results are logged and answered back in this process.
+postproc_executor = None
+
+def postproc_settings():
+    return {
+        'sample_rate': AUDIO_DOWNSAMPLE_RATE,
+        'output_dir': AUDIO_WAV_OUTPUT_DIR,
+        'hpf_cutoff_hz': HPF_CUTOFF_HZ,
+        'hpf_order': HPF_ORDER,
+        'save_spectrogram': SAVE_SPECTROGRAM,
+        'stt_engine': STT_ENGINE,
+        'vosk_model_path': VOSK_MODEL_PATH,
+        'vosk_preload': stt_transcriber is None,
+        'vosk_grammar': VOSK_GRAMMAR_STR,
+    }
+
+def start_postproc_workers():
+    global postproc_executor
+    if POSTPROC_WORKERS > 0:
+        postproc_executor = ProcessPoolExecutor(
+            max_workers=POSTPROC_WORKERS,
+            initializer=postproc.init_worker,
+            initargs=(postproc_settings(),)
+        )
+        # Start the workers now, before the SDR and stage threads exist.
+        postproc_executor.submit(os.getpid).result()
+        print(f"Started {POSTPROC_WORKERS} post-processing worker processes.")
+    else:
+        postproc.init_worker(postproc_settings())
+
+def persist_segment(segment):
+    job = {
+        'uid': segment['uid'],
+        'file_stamp': time.strftime('%Y%m%d_%H%M%S', segment['captured_at']),
+        'audio': segment['audio'],
+        'run_stt': not segment['parrot'] and not segment['streamed'],
+    }
+    if postproc_executor is not None:
+        result = postproc_executor.submit(postproc.process_segment, job).result()
+    else:
+        result = postproc.process_segment(job)
+    if segment['parrot']:
+        return
+    text = result['text'] or ''
+    respond = True
+    if segment['streamed']:
+        stream = stt_stream_result(segment['uid'], None if replay_mode else STT_FINAL_TIMEOUT_SECONDS)
+        if stream is not None:
+            text = stream.text
+        respond = False
+    process_stt_result(
+        text,
+        segment['iq_power'],
+        uid=result['uid'],
+        audio_path=result['audio_path'],
+        spectrogram_path=result['spectrogram_path'],
+        ctcss_tone=segment['ctcss_tone'],
+        timestamp=time.strftime('%Y-%m-%d %H:%M:%S', segment['captured_at']),
+        respond=respond,
+        duration_sec=result['audio_len'] / AUDIO_DOWNSAMPLE_RATE
+    )
+
+# --- Pipeline Stages ---
+demod_stage = Stage('demod', demod_chunk, DEMOD_QUEUE_CHUNKS, policy=DROP_OLDEST)
+persist_stage = Stage('persist', persist_segment, PERSIST_QUEUE_SEGMENTS, workers=max(1, POSTPROC_WORKERS), policy=DROP_NEWEST)
+respond_stage = TransmitScheduler('respond', respond_stage_handler, RESPOND_QUEUE_MESSAGES, channel_idle_seconds,
+                                  TX_QUEUE_TIMEOUT_SECONDS, TX_CLEAR_SECONDS, TX_TAIL_SECONDS)
+# Dropping audio would corrupt the transcript, so the STT stage blocks
+# briefly instead; the queue holds several seconds of audio.
+stt_stage = Stage('stt', stt_stage_handler, STT_QUEUE_CHUNKS, policy=BLOCK, put_timeout=0.5)
+
+def pipeline_stats():
+    acquire_stats = [iq_source.stats()] if iq_source is not None else []
+    return acquire_stats + [demod_stage.stats(), audio_iq_data_queue.stats(), stt_stage.stats(), persist_stage.stats(), respond_stage.stats()]
+
+def print_pipeline_stats():
+    for stats in pipeline_stats():
+        print(f"Pipeline {format_stats(stats)}")
+
+# --- Control API ---
+# Commands served on the IPC socket next to the event stream (see ipc.py).
+# A stop request unblocks the SDR read; the main thread then drains
+# every stage, hands off any transmission still in progress and flushes the
+# database before exiting.
+shutdown_requested = threading.Event()
+detect_stopping = threading.Event()
+sdr = None
+iq_source = None
+archiver = None
+
+def request_shutdown():
+    if shutdown_requested.is_set():
+        return
+    shutdown_requested.set()
+    if iq_source is not None:
+        try:
+            iq_source.stop()
+        except Exception as e:
+            print(f"Error cancelling SDR read: {e}")
+
+def control_status():
+    return {
+        **run_state,
+        'uptime': time.time() - run_state['started_at'],
+        'stopping': shutdown_requested.is_set(),
+        'freq_hz': SDR_CENTER_FREQ, 'sample_rate': SDR_SAMPLE_RATE, 'gain': SDR_GAIN,
+    }
+
+def control_counters():
+    counters = {'pipeline': pipeline_stats(), 'events_dropped': events.dropped, 'rx_muted_chunks': rx_muted_chunks}
+    if archiver:
+        counters['archiver'] = {'archived': archiver.archived, 'deleted_days': archiver.deleted_days, 'errors': archiver.errors}
+    counters['tts_cache'] = tts.cache.stats()
+    counters['fetchers'] = [weather_cache.stats(), band_conditions_cache.stats()]
+    return counters
+
+def control_stop():
+    print("Stop requested over IPC.")
+    threading.Thread(target=request_shutdown, daemon=True).start()
+    return {'stopping': True}
+
+# Settings that take effect without a restart; anything else that changed
+# is reported back as needing one.
+def reload_config():
+    global cfg, CTCSS_THRESHOLD, CTCSS_HOLDTIME, MIN_TRANSMISSION_LENGTH, S9_DBFS_REF
+    global SDR_CENTER_FREQ, SDR_GAIN, LEVEL_EVENT_INTERVAL_SECONDS
+    new_cfg = load_config()
+    changed = sorted(k for k in set(cfg) | set(new_cfg) if cfg.get(k) != new_cfg.get(k))
+    applied = []
+    for key in changed:
+        value = new_cfg.get(key)
+        if key == 'CTCSS_THRESHOLD' and str(value).lower() != 'auto':
+            CTCSS_THRESHOLD = float(value)
+        elif key == 'CTCSS_HOLDTIME':
+            CTCSS_HOLDTIME = float(value)
+        elif key == 'MIN_TRANSMISSION_LENGTH':
+            MIN_TRANSMISSION_LENGTH = float(value)
+        elif key == 'S9_DBFS_REF':
+            S9_DBFS_REF = float(value)
+        elif key == 'LEVEL_EVENT_INTERVAL_SECONDS':
+            LEVEL_EVENT_INTERVAL_SECONDS = float(value)
+        elif key == 'SDR_CENTER_FREQ':
+            freq = float(value)
+            SDR_CENTER_FREQ = freq * 1e6 if freq < 1e6 else freq
+            if sdr is not None:
+                sdr.center_freq = SDR_CENTER_FREQ
+        elif key == 'SDR_GAIN':
+            SDR_GAIN = int(value)
+            if sdr is not None:
+                sdr.gain = SDR_GAIN
+        else:
+            continue
+        applied.append(key)
+    cfg = new_cfg
+    restart_required = [k for k in changed if k not in applied]
+    print(f"Config reloaded: applied {applied or 'nothing'}" + (f", restart needed for {restart_required}" if restart_required else ""))
+    return {'applied': applied, 'restart_required': restart_required}
+
+events.register('status', control_status)
+events.register('counters', control_counters)
+events.register('stop', control_stop)
+events.register('reload', reload_config)
+
+# --- IQ Record / Replay ---
+# --record-iq saves the raw dongle output (with rate, frequency and gain)
+# while running normally. --replay-iq feeds such a recording, or any
+# rtl_sdr .cu8 file, through the same acquire/demod/detect/persist path in
+# place of the dongle: captures and reports go to REPLAY_DIR instead of the
+# live database, nothing is transmitted, and throughput, stage latency and
+# detections are printed at the end. --fast replays as fast as the pipeline
+# allows; every stage then blocks instead of dropping, so the detections in
+# replay_summary.json are the same on every run. Timing goes to
+# replay_stats.json.
+REPLAY_DIR = 'replay'
+replay_mode = False
+replay_events = collections.Counter()
+replay_reports = []
+replay_replies = []
+replay_dtmf = []
+
+def record_replay_event(event):
+    kind = event['type']
+    if kind == 'ctcss':
+        replay_events['ctcss_open' if event.get('open') else 'ctcss_close'] += 1
+        if not event.get('open') and event.get('uid'):
+            replay_events['captures'] += 1
+    elif kind == 'dtmf':
+        replay_dtmf.append(event['digit'])
+    elif kind == 'report':
+        replay_reports.append({k: event.get(k) for k in ('callsign', 's_meter', 'snr', 'duration', 'text')})
+    elif kind == 'transmit':
+        replay_replies.append(event['text'])
+
+def start_replay(path, fast, output_dir):
+    global replay_mode, AUDIO_WAV_OUTPUT_DIR, SDR_SAMPLE_RATE, nfm_demodulator
+    global SMALL_AUDIO_CHUNK_SAMPLES, SMALL_AUDIO_CHUNK_DURATION, MAX_TRANSMISSION_CHUNKS, RF_VAD_SILENCE_CHUNKS_FOR_END
+    replay_mode = True
+    source = FileSource(path, SDR_SAMPLE_RATE, SDR_BUFFER_COUNT, 2 * SDR_NUM_SAMPLES_PER_CHUNK, paced=not fast)
+    meta = source.metadata
+    if source.sample_rate != SDR_SAMPLE_RATE:
+        SDR_SAMPLE_RATE = source.sample_rate
+        SMALL_AUDIO_CHUNK_SAMPLES = int(SDR_NUM_SAMPLES_PER_CHUNK / (SDR_SAMPLE_RATE / AUDIO_DOWNSAMPLE_RATE))
+        SMALL_AUDIO_CHUNK_DURATION = SMALL_AUDIO_CHUNK_SAMPLES / AUDIO_DOWNSAMPLE_RATE
+        MAX_TRANSMISSION_CHUNKS = int(MAX_TRANSMISSION_SECONDS / SMALL_AUDIO_CHUNK_DURATION) + 1
+        RF_VAD_SILENCE_CHUNKS_FOR_END = int(RF_VAD_SILENCE_TO_END_SECONDS / SMALL_AUDIO_CHUNK_DURATION)
+        nfm_demodulator = NFMDemodulator(SDR_SAMPLE_RATE, AUDIO_DOWNSAMPLE_RATE, NFM_FILTER_CUTOFF)
+    print(f"Replaying {path}: {SDR_SAMPLE_RATE/1e6:.3f} Msps"
+          + (f", recorded at {float(meta['center_freq'])/1e6:.3f} MHz, gain {meta.get('gain')} dB" if 'center_freq' in meta else "")
+          + (" (as fast as possible)" if fast else " (real time)"))
+    os.makedirs(output_dir, exist_ok=True)
+    AUDIO_WAV_OUTPUT_DIR = os.path.join(output_dir, 'wavs')
+    signal_db.SQLITE_DB_PATH = os.path.join(output_dir, 'signal_reports.db')
+    ensure_table_exists()
+    if fast:
+        # Nothing may be dropped, and captures are persisted one at a time
+        # so reports come out in capture order.
+        for stage_queue in (demod_stage.queue, audio_iq_data_queue, stt_stage.queue, persist_stage.queue):
+            stage_queue.policy = BLOCK
+            stage_queue.put_timeout = None
+        persist_stage.workers = 1
+    events.add_listener(record_replay_event)
+    return source
+
+def print_replay_summary(source, elapsed, output_dir):
+    seconds = source.samples / source.sample_rate
+    summary = {
+        'file': source.path,
+        'iq_seconds': round(seconds, 2),
+        'ctcss_openings': replay_events['ctcss_open'],
+        'captures': replay_events['captures'],
+        'dtmf': ''.join(replay_dtmf),
+        'reports': replay_reports,
+        # Replies from different stages can reach the transmit queue in
+        # either order.
+        'replies': sorted(replay_replies),
+    }
+    stats = {
+        'wall_seconds': round(elapsed, 2),
+        'msps': round(source.samples / elapsed / 1e6, 3) if elapsed else None,
+        'realtime_factor': round(seconds / elapsed, 2) if elapsed else None,
+        'stages': pipeline_stats(),
+    }
+    print(f"Replay: {seconds:.1f}s of IQ in {elapsed:.1f}s ({stats['msps']} Msps, {stats['realtime_factor']}x real time)")
+    print(f"Replay: {summary['ctcss_openings']} CTCSS openings, {summary['captures']} captures, "
+          f"{len(replay_reports)} reports, DTMF '{summary['dtmf']}', {len(replay_replies)} replies")
+    for report in replay_reports:
+        print(f"Replay report: {report['callsign']} {report['s_meter']} SNR {report['snr']} dB, {report['duration']}s: {report['text']}")
+    with open(os.path.join(output_dir, 'replay_summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    with open(os.path.join(output_dir, 'replay_stats.json'), 'w') as f:
+        json.dump(stats, f, indent=2)
+
 # --- Main Entrypoint ---
 if __name__ == "__main__":
-    sdr = None; audio_thread = None; input_thread = None
-    if vosk_model: print(f"Vosk model loaded: {VOSK_MODEL_PATH}")
-    else: print("WARNING: Vosk model not loaded.")
+    parser = argparse.ArgumentParser(description="SignalReport receiver")
+    parser.add_argument('--record-iq', metavar='FILE', help="Also save the raw IQ from the dongle to FILE")
+    parser.add_argument('--replay-iq', metavar='FILE', help="Process an IQ recording instead of the dongle")
+    parser.add_argument('--fast', action='store_true', help="Replay as fast as possible instead of in real time")
+    parser.add_argument('--replay-dir', default=REPLAY_DIR, help="Output directory for replayed captures")
+    args = parser.parse_args()
+    audio_thread = None; input_thread = None; acquire_thread = None
+    # A replay stays off the control socket so the web app doesn't take it
+    # for the live receiver.
+    if not args.replay_iq:
+        try:
+            events.start()
+        except (OSError, RuntimeError) as e:
+            print(f"IPC disabled: {e}")
+    set_state('initializing')
+    if args.replay_iq:
+        try:
+            iq_source = start_replay(args.replay_iq, args.fast, args.replay_dir)
+        except (OSError, ValueError) as e:
+            print(f"Cannot replay {args.replay_iq}: {e}"); sys.stdout.flush(); os._exit(1)
+    start_stt_streaming()
+    start_postproc_workers()
+    if not replay_mode:
+        tts.start(preload=tts_preload_phrases())
+        if HAMQSL_PREFETCH:
+            band_conditions_cache.keep_fresh('hf')
+        if ARCHIVE_ENABLED:
+            archiver = archiver_from_config(cfg, AUDIO_WAV_OUTPUT_DIR).start()
     print(f"Signal Reporter started: {time.ctime()}")
+    replay_started = None; replay_elapsed = None
     try:
-        print("Initializing SDR..."); sdr = RtlSdr()
-        sdr.center_freq = SDR_CENTER_FREQ
-        sdr.sample_rate = SDR_SAMPLE_RATE; sdr.gain = SDR_GAIN
-        sdr.offset_tuning = SDR_OFFSET_TUNING
-        print(f"SDR Configured: Freq={sdr.center_freq/1e6:.3f}MHz, Rate={sdr.sample_rate/1e6:.3f}Msps, Gain={sdr.get_gain()}dB, OffsetTuning={sdr.offset_tuning}")
+        if not replay_mode:
+            from rtlsdr import RtlSdr
+            print("Initializing SDR..."); sdr = RtlSdr()
+            sdr.center_freq = SDR_CENTER_FREQ
+            sdr.sample_rate = SDR_SAMPLE_RATE; sdr.gain = SDR_GAIN
+            sdr.offset_tuning = SDR_OFFSET_TUNING
+            print(f"SDR Configured: Freq={sdr.center_freq/1e6:.3f}MHz, Rate={sdr.sample_rate/1e6:.3f}Msps, Gain={sdr.get_gain()}dB, OffsetTuning={sdr.offset_tuning}")
+            iq_source = RtlSdrSource(sdr, SDR_BUFFER_COUNT, 2 * SDR_NUM_SAMPLES_PER_CHUNK, SDR_USB_BUFFERS)
+            if args.record_iq:
+                iq_source.record(args.record_iq, {'center_freq': SDR_CENTER_FREQ, 'gain': SDR_GAIN})
+                print(f"Recording IQ to {args.record_iq}")
+        demod_stage.start(); stt_stage.start(); persist_stage.start(); respond_stage.start()
         audio_thread = threading.Thread(target=audio_processing_thread_func, daemon=True); audio_thread.start()
-        input_thread = threading.Thread(target=input_monitor_thread_func, daemon=True); input_thread.start()
+        if not replay_mode:
+            input_thread = threading.Thread(target=input_monitor_thread_func, daemon=True); input_thread.start()
         print(f"Performing {BASELINE_DURATION_SECONDS}s RF baselining...")
         print(f"Listening on {SDR_CENTER_FREQ/1e6:.3f} MHz for '{TRIGGER_PHRASE_END}'...")
-        sdr.read_samples_async(sdr_callback, num_samples=SDR_NUM_SAMPLES_PER_CHUNK)
-        while True:
-            time.sleep(1)
+        iq_source.start(sdr_callback)
+        replay_started = time.perf_counter()
+        acquire_thread = threading.Thread(target=iq_source.run, name='acquire', daemon=True); acquire_thread.start()
+        last_stats_time = time.time(); last_dropped = 0
+        while not shutdown_requested.wait(1):
             if audio_thread and not audio_thread.is_alive():
                 print("ERROR: Audio processing thread died. Exiting."); os._exit(1)
+            if not acquire_thread.is_alive():
+                print("End of replay." if replay_mode else "SDR read stopped.")
+                break
+            if time.time() - last_stats_time >= PIPELINE_STATS_INTERVAL_SECONDS:
+                dropped = sum(stats['dropped'] for stats in pipeline_stats())
+                if dropped != last_dropped:
+                    print_pipeline_stats()
+                last_stats_time = time.time(); last_dropped = dropped
     except KeyboardInterrupt: print("\nCtrl+C. Shutting down...");
     except Exception as e: print(f"Main loop error: {e}"); import traceback; traceback.print_exc()
     finally:
         print("Main: Initiating final shutdown...")
-        if sdr: sdr.cancel_read_async(); sdr.close()
-        print("Shutdown complete.")
\ No newline at end of file
+        set_state('stopping')
+        request_shutdown()
+        if acquire_thread: acquire_thread.join(timeout=5.0)
+        if iq_source: iq_source.close()
+        if sdr: sdr.close()
+        demod_stage.stop(timeout=30.0 if replay_mode else 5.0)
+        detect_stopping.set()
+        if audio_thread: audio_thread.join(timeout=30.0 if replay_mode else 5.0)
+        if replay_started is not None:
+            replay_elapsed = time.perf_counter() - replay_started
+        stt_stage.stop(); persist_stage.stop(timeout=30.0)
+        if postproc_executor: postproc_executor.shutdown(wait=True)
+        if archiver: archiver.stop()
+        tts.close()
+        weather_cache.stop(); band_conditions_cache.stop()
+        close_writer()
+        events.stop()
+        print_pipeline_stats()
+        if replay_mode and replay_elapsed is not None:
+            print_replay_summary(iq_source, replay_elapsed, args.replay_dir)
+        print("Shutdown complete.")
+        # The input monitor is still blocked reading stdin; don't wait on it.
+        sys.stdout.flush(); os._exit(0)
\ No newline at end of file
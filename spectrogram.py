@@ -0,0 +1,335 @@
+import functools
+import json
+import os
+import struct
+import zlib
+import numpy as np
+from scipy import fft as scipy_fft
+
+# --- Fast Spectrogram Renderer ---
+# STFT with NumPy, colour mapping through a viridis lookup table and a
+# palette PNG written directly with zlib; no matplotlib figures involved.
+# Axes, tick labels and the colour bar frame are drawn once per layout and
+# cached as a mask that is stamped onto each image.
+
+SPEC_NFFT = 256
+SPEC_NOVERLAP = 128
+
+PLOT_WIDTH = 720
+# Narrowest window a tile may show (as the zoomable viewer).
+MIN_SPAN_SECONDS = 0.05
+MIN_SPAN_HZ = 100.0
+PLOT_HEIGHT = 258
+MARGIN_LEFT = 40
+MARGIN_RIGHT = 44
+MARGIN_TOP = 8
+MARGIN_BOTTOM = 24
+COLORBAR_GAP = 8
+COLORBAR_WIDTH = 12
+
+# Palette: 254 viridis levels, then white background and black ink.
+N_COLOR_LEVELS = 254
+WHITE_INDEX = 254
+BLACK_INDEX = 255
+
+# Polynomial fit of matplotlib's viridis colour map.
+_VIRIDIS_COEFFS = np.array([
+    [0.2777273272234177, 0.005407344544966578, 0.3340998053353061],
+    [0.1050930431085774, 1.404613529898575, 1.384590162594685],
+    [-0.3308618287255563, 0.214847559468213, 0.09509516302823659],
+    [-4.634230498983486, -5.799100973351585, -19.33244095627987],
+    [6.228269936347081, 14.17993336680509, 56.69055260068105],
+    [4.776384997670288, -13.74514537774601, -65.35303263337234],
+    [-5.435455855934631, 4.645852612178535, 26.3124352495832],
+])
+
+
+def _build_palette():
+    t = np.linspace(0.0, 1.0, N_COLOR_LEVELS)[:, None]
+    rgb = np.zeros((N_COLOR_LEVELS, 3))
+    for coeff in _VIRIDIS_COEFFS[::-1]:
+        rgb = rgb * t + coeff
+    lut = np.clip(np.round(rgb * 255), 0, 255).astype(np.uint8)
+    return np.vstack((lut, [[255, 255, 255], [0, 0, 0]])).astype(np.uint8)
+
+
+VIRIDIS_PALETTE = _build_palette()
+
+# 3x5 bitmap glyphs for tick labels.
+_GLYPHS = {
+    '0': ("111", "101", "101", "101", "111"),
+    '1': ("010", "110", "010", "010", "111"),
+    '2': ("111", "001", "111", "100", "111"),
+    '3': ("111", "001", "111", "001", "111"),
+    '4': ("101", "101", "111", "001", "001"),
+    '5': ("111", "100", "111", "001", "111"),
+    '6': ("111", "100", "111", "101", "111"),
+    '7': ("111", "001", "001", "001", "001"),
+    '8': ("111", "101", "111", "101", "111"),
+    '9': ("111", "101", "111", "001", "111"),
+    '.': ("000", "000", "000", "000", "010"),
+    '-': ("000", "000", "111", "000", "000"),
+    'k': ("100", "101", "110", "101", "101"),
+    'H': ("101", "101", "111", "101", "101"),
+    'z': ("000", "111", "010", "100", "111"),
+    's': ("000", "011", "010", "001", "110"),
+    'd': ("001", "001", "111", "101", "111"),
+    'B': ("110", "101", "110", "101", "110"),
+    ' ': ("000", "000", "000", "000", "000"),
+}
+GLYPH_SCALE = 2
+GLYPH_WIDTH = 3 * GLYPH_SCALE
+GLYPH_HEIGHT = 5 * GLYPH_SCALE
+GLYPH_SPACING = GLYPH_SCALE
+
+
+def _text_width(text):
+    return len(text) * (GLYPH_WIDTH + GLYPH_SPACING) - GLYPH_SPACING
+
+
+def _draw_text(mask, x, y, text):
+    for ch in text:
+        glyph = _GLYPHS.get(ch, _GLYPHS[' '])
+        for row, bits in enumerate(glyph):
+            for col, bit in enumerate(bits):
+                if bit == '1':
+                    y0 = y + row * GLYPH_SCALE
+                    x0 = x + col * GLYPH_SCALE
+                    mask[max(y0, 0):max(y0 + GLYPH_SCALE, 0), max(x0, 0):max(x0 + GLYPH_SCALE, 0)] = True
+        x += GLYPH_WIDTH + GLYPH_SPACING
+
+
+def _format_tick(value):
+    if abs(value - round(value)) < 1e-6:
+        return str(int(round(value)))
+    return f"{value:.1f}"
+
+
+def _image_size(plot_w, plot_h):
+    width = MARGIN_LEFT + plot_w + COLORBAR_GAP + COLORBAR_WIDTH + MARGIN_RIGHT
+    height = MARGIN_TOP + plot_h + MARGIN_BOTTOM
+    return width, height
+
+
+def _nice_step(span, max_ticks):
+    span = max(span, 1e-9)
+    magnitude = 10 ** np.floor(np.log10(span / max_ticks))
+    for multiple in (1, 2, 5, 10):
+        if span / (multiple * magnitude) <= max_ticks:
+            return multiple * magnitude
+    return 10 * magnitude
+
+
+@functools.lru_cache(maxsize=32)
+def _frame_overlay(plot_w, plot_h, f0, f1):
+    # Plot frame, frequency ticks/labels and the colour bar outline.
+    width, height = _image_size(plot_w, plot_h)
+    mask = np.zeros((height, width), dtype=bool)
+    x0, x1 = MARGIN_LEFT - 1, MARGIN_LEFT + plot_w
+    y0, y1 = MARGIN_TOP - 1, MARGIN_TOP + plot_h
+    mask[y0, x0:x1 + 1] = True
+    mask[y1, x0:x1 + 1] = True
+    mask[y0:y1 + 1, x0] = True
+    mask[y0:y1 + 1, x1] = True
+    cx0 = MARGIN_LEFT + plot_w + COLORBAR_GAP - 1
+    cx1 = cx0 + COLORBAR_WIDTH + 1
+    mask[y0, cx0:cx1 + 1] = True
+    mask[y1, cx0:cx1 + 1] = True
+    mask[y0:y1 + 1, cx0] = True
+    mask[y0:y1 + 1, cx1] = True
+    step = _nice_step(f1 - f0, max(2, plot_h // 40))
+    for f in np.arange(np.ceil(f0 / step) * step, f1 + 1e-6, step):
+        y = MARGIN_TOP + plot_h - 1 - int(round((f - f0) / (f1 - f0) * (plot_h - 1)))
+        mask[y, x0 - 4:x0] = True
+        label = f"{_format_tick(f / 1000)}k" if f else "0"
+        ty = min(max(y - GLYPH_HEIGHT // 2, 0), height - GLYPH_HEIGHT)
+        _draw_text(mask, x0 - 6 - _text_width(label), ty, label)
+    mask.flags.writeable = False
+    return mask
+
+
+@functools.lru_cache(maxsize=64)
+def _time_overlay(plot_w, plot_h, t0_cs, t1_cs):
+    # Time ticks for the window [t0, t1] given in hundredths of a second.
+    width, height = _image_size(plot_w, plot_h)
+    mask = np.zeros((height, width), dtype=bool)
+    t0 = t0_cs / 100.0
+    t1 = max(t1_cs / 100.0, t0 + 0.01)
+    step = _nice_step(t1 - t0, max(2, plot_w // 90))
+    y = MARGIN_TOP + plot_h
+    for t in np.arange(np.ceil(t0 / step - 1e-9) * step, t1 + 1e-9, step):
+        x = MARGIN_LEFT + int(round((t - t0) / (t1 - t0) * (plot_w - 1)))
+        mask[y:y + 4, x] = True
+        label = _format_tick(t) if step >= 0.1 else f"{t:.2f}"
+        tx = min(max(x - _text_width(label) // 2, 0), width - _text_width(label))
+        _draw_text(mask, tx, y + 6, label)
+    mask.flags.writeable = False
+    return mask
+
+
+@functools.lru_cache(maxsize=4)
+def _stft_window(nfft):
+    window = np.hanning(nfft).astype(np.float32)
+    window.flags.writeable = False
+    return window
+
+
+def compute_spectrogram(audio, sample_rate, nfft=SPEC_NFFT, noverlap=SPEC_NOVERLAP):
+    # Returns (power_db [freq x time], freqs, duration_seconds); PSD scaling
+    # matches matplotlib's specgram defaults.
+    audio = np.asarray(audio, dtype=np.float32)
+    hop = nfft - noverlap
+    if len(audio) < nfft:
+        audio = np.pad(audio, (0, nfft - len(audio)))
+    n_frames = 1 + (len(audio) - nfft) // hop
+    frames = np.lib.stride_tricks.sliding_window_view(audio, nfft)[::hop][:n_frames]
+    window = _stft_window(nfft)
+    spectrum = scipy_fft.rfft(frames * window, axis=1)
+    spec = spectrum.real ** 2 + spectrum.imag ** 2
+    spec *= 1.0 / (sample_rate * float(np.sum(window.astype(np.float64) ** 2)))
+    spec[:, 1:-1] *= 2.0
+    power_db = 10 * np.log10(np.maximum(spec.T, 1e-20))
+    freqs = np.fft.rfftfreq(nfft, 1.0 / sample_rate)
+    return power_db, freqs, len(audio) / float(sample_rate)
+
+
+def _resample_axis(n_in, n_out):
+    # Bin edges mapping n_in source cells onto n_out output cells.
+    return np.minimum((np.arange(n_out) * n_in) // n_out, n_in - 1)
+
+
+def resample_levels(levels, out_h, out_w):
+    # Nearest-neighbour when zooming in, max-pooling when zooming out so
+    # short tones and DTMF bursts survive downscaling. Low frequency first
+    # in, top row = highest frequency out.
+    n_f, n_t = levels.shape
+    if n_f == 0 or n_t == 0:
+        return np.zeros((out_h, out_w), dtype=np.uint8)
+    cols = _resample_axis(n_t, out_w)
+    if n_t > out_w:
+        levels = np.maximum.reduceat(levels, cols, axis=1)
+    else:
+        levels = levels[:, cols]
+    rows = _resample_axis(n_f, out_h)
+    if n_f > out_h:
+        levels = np.maximum.reduceat(levels, rows, axis=0)
+    else:
+        levels = levels[rows]
+    return levels[::-1]
+
+
+def render_indices(levels, t0, t1, f0, f1, vmin, vmax, plot_w=PLOT_WIDTH, plot_h=PLOT_HEIGHT, axes=True):
+    # levels: uint8 [freq x time] palette indices (0..N_COLOR_LEVELS-1)
+    # covering exactly the window [t0, t1] x [f0, f1].
+    plot = resample_levels(levels, plot_h, plot_w)
+    if not axes:
+        return plot
+    width, height = _image_size(plot_w, plot_h)
+    canvas = np.full((height, width), WHITE_INDEX, dtype=np.uint8)
+    canvas[MARGIN_TOP:MARGIN_TOP + plot_h, MARGIN_LEFT:MARGIN_LEFT + plot_w] = plot
+    cx = MARGIN_LEFT + plot_w + COLORBAR_GAP
+    bar = np.linspace(N_COLOR_LEVELS - 1, 0, plot_h).round().astype(np.uint8)
+    canvas[MARGIN_TOP:MARGIN_TOP + plot_h, cx:cx + COLORBAR_WIDTH] = bar[:, None]
+    canvas[_frame_overlay(plot_w, plot_h, int(f0), int(f1))] = BLACK_INDEX
+    canvas[_time_overlay(plot_w, plot_h, int(round(t0 * 100)), int(round(t1 * 100)))] = BLACK_INDEX
+    label_mask = np.zeros_like(canvas, dtype=bool)
+    lx = cx + COLORBAR_WIDTH + 5
+    _draw_text(label_mask, lx, MARGIN_TOP, f"{vmax:.0f}")
+    _draw_text(label_mask, lx, MARGIN_TOP + plot_h - GLYPH_HEIGHT, f"{vmin:.0f}")
+    _draw_text(label_mask, lx, MARGIN_TOP + plot_h // 2 - GLYPH_HEIGHT // 2, "dB")
+    canvas[label_mask] = BLACK_INDEX
+    return canvas
+
+
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+
+def encode_png_indexed(indices, palette=VIRIDIS_PALETTE, compress_level=3):
+    height, width = indices.shape
+    raw = np.zeros((height, width + 1), dtype=np.uint8)
+    raw[:, 1:] = indices  # filter type 0 on every row
+    header = struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"PLTE", palette.tobytes())
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), compress_level))
+            + _png_chunk(b"IEND", b""))
+
+
+# --- Stored Spectrogram Arrays ---
+# Captures keep a uint8 STFT (.npy, memory-mappable) quantized on a fixed
+# absolute dB scale, plus a small JSON sidecar describing the axes. Images
+# are rendered from it on demand for any time/frequency window.
+ARRAY_DB_MIN = -150.0
+ARRAY_DB_MAX = -20.0
+
+
+def spectrogram_meta_path(npy_path):
+    return os.path.splitext(npy_path)[0] + '.spec.json'
+
+
+def save_spectrogram_array(audio, sample_rate, npy_path, nfft=SPEC_NFFT, noverlap=SPEC_NOVERLAP):
+    power_db, freqs, duration = compute_spectrogram(audio, sample_rate, nfft, noverlap)
+    scaled = (power_db - ARRAY_DB_MIN) * ((N_COLOR_LEVELS - 1) / (ARRAY_DB_MAX - ARRAY_DB_MIN))
+    levels = np.clip(np.round(scaled), 0, N_COLOR_LEVELS - 1).astype(np.uint8)
+    np.save(npy_path, np.ascontiguousarray(levels))
+    meta = {
+        'sample_rate': sample_rate,
+        'nfft': nfft,
+        'hop': nfft - noverlap,
+        'duration': duration,
+        'max_freq': float(freqs[-1]),
+        'db_min': ARRAY_DB_MIN,
+        'db_max': ARRAY_DB_MAX,
+    }
+    with open(spectrogram_meta_path(npy_path), 'w') as f:
+        json.dump(meta, f)
+    return npy_path
+
+
+@functools.lru_cache(maxsize=32)
+def _load_array(npy_path, mtime):
+    levels = np.load(npy_path, mmap_mode='r')
+    with open(spectrogram_meta_path(npy_path), 'r') as f:
+        meta = json.load(f)
+    return levels, meta
+
+
+def load_spectrogram_array(npy_path):
+    return _load_array(npy_path, os.path.getmtime(npy_path))
+
+
+def _clamp_span(lo, hi, limit, min_span):
+    lo = 0.0 if lo is None else lo
+    hi = limit if hi is None else hi
+    span = min(max(hi - lo, min_span), limit)
+    lo = min(max(lo, 0.0), limit - span)
+    return lo, lo + span
+
+
+def render_spectrogram_tile(npy_path, t0=None, t1=None, f0=None, f1=None,
+                            width=PLOT_WIDTH, height=PLOT_HEIGHT, axes=True):
+    levels, meta = load_spectrogram_array(npy_path)
+    n_f, n_t = levels.shape
+    duration = meta['duration']
+    max_freq = meta['max_freq']
+    t0, t1 = _clamp_span(t0, t1, duration, MIN_SPAN_SECONDS)
+    f0, f1 = _clamp_span(f0, f1, max_freq, MIN_SPAN_HZ)
+    frame_seconds = meta['hop'] / float(meta['sample_rate'])
+    c0 = min(int(t0 / frame_seconds), n_t - 1)
+    c1 = max(c0 + 1, min(int(np.ceil(t1 / frame_seconds)), n_t))
+    r0 = min(int(f0 / max_freq * (n_f - 1)), n_f - 1)
+    r1 = max(r0 + 1, min(int(np.ceil(f1 / max_freq * (n_f - 1))) + 1, n_f))
+    window = np.asarray(levels[r0:r1, c0:c1])
+    # Stretch the window's own range over the palette for local contrast.
+    lo = int(window.min()) if window.size else 0
+    hi = int(window.max()) if window.size else 1
+    if hi - lo < 8:
+        lo = max(0, hi - 8)
+    stretched = ((window.astype(np.int32) - lo) * (N_COLOR_LEVELS - 1) // max(hi - lo, 1)).astype(np.uint8)
+    db_per_level = (meta['db_max'] - meta['db_min']) / (N_COLOR_LEVELS - 1)
+    vmin = meta['db_min'] + lo * db_per_level
+    vmax = meta['db_min'] + hi * db_per_level
+    canvas = render_indices(stretched, t0, t1, f0, f1, vmin, vmax, width, height, axes)
+    return encode_png_indexed(canvas)
@@ -7,6 +7,8 @@ document.addEventListener('DOMContentLoaded', function() {
         if (s.state === 'initializing') html += '<div class="msg" style="color:blue;font-weight:bold;">SigRep is initializing...</div>';
         else if (s.state === 'baselining') html += '<div class="msg" style="color:orange;font-weight:bold;">SigRep is baselining... Please wait.</div>';
         else if (s.state === 'ready') html += '<div class="msg" style="color:green;font-weight:bold;">SigRep is running and ready.</div>';
+        else if (s.state === 'starting') html += '<div class="msg" style="color:blue;font-weight:bold;">SigRep is starting...</div>';
+        else if (s.state === 'stopping') html += '<div class="msg" style="color:orange;font-weight:bold;">SigRep is stopping (finishing pending captures)...</div>';
         else html += '<div class="msg" style="color:gray;">SigRep is running (status unknown).</div>';
       } else {
         html += '<div class="msg" style="color:red;">SigRep is stopped.</div>';
@@ -18,8 +20,59 @@ document.addEventListener('DOMContentLoaded', function() {
       document.getElementById('stop-btn').disabled = !s.running;
     });
   }
-  setInterval(fetchStatus, 3000);
   fetchStatus();
+  // Live updates are pushed over /events; poll only if the browser can't.
+  if (window.EventSource) {
+    let events = new EventSource('/events');
+    let activity = document.getElementById('activity');
+    function logActivity(text) {
+      let li = document.createElement('li');
+      li.innerText = new Date().toLocaleTimeString() + '  ' + text;
+      activity.insertBefore(li, activity.firstChild);
+      while (activity.children.length > 50) activity.removeChild(activity.lastChild);
+    }
+    function setCtcss(open) {
+      document.getElementById('ctcss-indicator').style.color = open ? '#1dbf1d' : '#888';
+    }
+    events.addEventListener('link', function(e) {
+      let d = JSON.parse(e.data);
+      let link = document.getElementById('live-link');
+      link.innerText = d.connected ? 'connected' : 'not connected';
+      link.style.color = d.connected ? '#1dbf1d' : '#888';
+      if (!d.connected) {
+        document.getElementById('level-bar').style.width = '0';
+        document.getElementById('level-text').innerText = '--';
+        setCtcss(false);
+      }
+      fetchStatus();
+    });
+    events.addEventListener('state', function(e) {
+      logActivity('State: ' + JSON.parse(e.data).state);
+      fetchStatus();
+    });
+    events.addEventListener('level', function(e) {
+      let d = JSON.parse(e.data);
+      let pct = Math.max(0, Math.min(100, (d.dbfs + 120)));
+      document.getElementById('level-bar').style.width = pct + '%';
+      document.getElementById('level-text').innerText = d.dbfs.toFixed(1) + ' dBFS (' + d.s_meter + ')';
+      setCtcss(d.ctcss);
+    });
+    events.addEventListener('ctcss', function(e) {
+      let d = JSON.parse(e.data);
+      setCtcss(d.open);
+      if (d.open) logActivity('CTCSS open');
+      else logActivity('CTCSS closed after ' + d.duration + 's' + (d.tone ? ' (' + d.tone.toFixed(1) + ' Hz)' : ''));
+    });
+    events.addEventListener('dtmf', function(e) {
+      logActivity('DTMF ' + JSON.parse(e.data).digit);
+    });
+    events.addEventListener('report', function(e) {
+      let d = JSON.parse(e.data);
+      logActivity('Report: ' + d.callsign + ' ' + d.s_meter + ', SNR ' + d.snr + ' dB' + (d.text ? ' "' + d.text + '"' : ''));
+    });
+  } else {
+    setInterval(fetchStatus, 3000);
+  }
   // Toast feedback
   function showToast(msg, color) {
     let t = document.getElementById('toast');
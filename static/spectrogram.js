@@ -1,75 +1,152 @@
-let scale = 1.0;
-let originX = 0, originY = 0;
-let isPanning = false, startX = 0, startY = 0, imgX = 0, imgY = 0;
-const img = document.getElementById('spectrogram-img');
-const container = document.getElementById('spectrogram-container');
-function updateTransform() {
-  img.style.transform = `scale(${scale}) translate(${imgX/scale}px,${imgY/scale}px)`;
+// Zoomable spectrogram viewer. Every zoom/pan step requests a freshly
+// rendered tile for the visible time/frequency window from
+// /spectrogram/<uid>, so zooming adds real detail instead of scaling pixels.
+// Layout constants mirror spectrogram.py.
+const SPEC_MARGIN_LEFT = 40, SPEC_MARGIN_TOP = 8;
+const SPEC_EXTRA_W = 104, SPEC_EXTRA_H = 32;
+const SPEC_MIN_SPAN_T = 0.05, SPEC_MIN_SPAN_F = 100;
+
+const specView = {uid: null, duration: 0, maxFreq: 0, t0: 0, t1: 0, f0: 0, f1: 0, timer: null};
+const specImg = document.getElementById('spectrogram-img');
+
+function specPlotSize() {
+  const w = Math.max(200, Math.min(1600, Math.floor(window.innerWidth * 0.9) - SPEC_EXTRA_W));
+  const h = Math.max(120, Math.min(900, Math.floor(window.innerHeight * 0.75) - SPEC_EXTRA_H));
+  return {w: w, h: h};
 }
-function zoomIn() {
-  scale = Math.min(scale * 1.25, 10);
-  updateTransform();
+
+function specRequestTile() {
+  clearTimeout(specView.timer);
+  specView.timer = setTimeout(function() {
+    const size = specPlotSize();
+    const q = new URLSearchParams({
+      t0: specView.t0.toFixed(2), t1: specView.t1.toFixed(2),
+      f0: Math.round(specView.f0), f1: Math.round(specView.f1),
+      w: size.w, h: size.h
+    });
+    specImg.src = `/spectrogram/${encodeURIComponent(specView.uid)}?${q}`;
+  }, 120);
 }
-function zoomOut() {
-  scale = Math.max(scale / 1.25, 0.2);
-  updateTransform();
+
+function specClamp() {
+  let spanT = Math.min(Math.max(specView.t1 - specView.t0, SPEC_MIN_SPAN_T), specView.duration);
+  specView.t0 = Math.min(Math.max(specView.t0, 0), specView.duration - spanT);
+  specView.t1 = specView.t0 + spanT;
+  let spanF = Math.min(Math.max(specView.f1 - specView.f0, SPEC_MIN_SPAN_F), specView.maxFreq);
+  specView.f0 = Math.min(Math.max(specView.f0, 0), specView.maxFreq - spanF);
+  specView.f1 = specView.f0 + spanF;
 }
+
+// Fraction (0..1) of the plot area under a client point, low frequency = 0.
+function specPlotFraction(clientX, clientY) {
+  const rect = specImg.getBoundingClientRect();
+  const sx = specImg.naturalWidth ? rect.width / specImg.naturalWidth : 1;
+  const sy = specImg.naturalHeight ? rect.height / specImg.naturalHeight : 1;
+  const plotW = (specImg.naturalWidth - SPEC_EXTRA_W) * sx;
+  const plotH = (specImg.naturalHeight - SPEC_EXTRA_H) * sy;
+  const fx = (clientX - rect.left - SPEC_MARGIN_LEFT * sx) / plotW;
+  const fy = 1 - (clientY - rect.top - SPEC_MARGIN_TOP * sy) / plotH;
+  return {x: Math.min(Math.max(fx, 0), 1), y: Math.min(Math.max(fy, 0), 1)};
+}
+
+function specZoom(factor, fx, fy, axis) {
+  if (axis !== 'f') {
+    const t = specView.t0 + (specView.t1 - specView.t0) * fx;
+    specView.t0 = t - (t - specView.t0) * factor;
+    specView.t1 = t + (specView.t1 - t) * factor;
+  }
+  if (axis !== 't') {
+    const f = specView.f0 + (specView.f1 - specView.f0) * fy;
+    specView.f0 = f - (f - specView.f0) * factor;
+    specView.f1 = f + (specView.f1 - f) * factor;
+  }
+  specClamp();
+  specRequestTile();
+}
+
+function zoomIn() { specZoom(0.8, 0.5, 0.5, 't'); }
+function zoomOut() { specZoom(1.25, 0.5, 0.5, 't'); }
 function resetZoom() {
-  scale = 1.0; imgX = 0; imgY = 0;
-  updateTransform();
+  specView.t0 = 0; specView.t1 = specView.duration;
+  specView.f0 = 0; specView.f1 = specView.maxFreq;
+  specRequestTile();
 }
-img.addEventListener('mousedown', function(e) {
-  isPanning = true;
-  startX = e.clientX - imgX;
-  startY = e.clientY - imgY;
-  img.style.cursor = 'grabbing';
-});
-document.addEventListener('mousemove', function(e) {
-  if (!isPanning) return;
-  imgX = e.clientX - startX;
-  imgY = e.clientY - startY;
-  updateTransform();
-});
-document.addEventListener('mouseup', function(e) {
-  isPanning = false;
-  img.style.cursor = 'grab';
+
+function openSpectrogram(uid) {
+  specView.uid = uid;
+  return fetch(`/spectrogram/${encodeURIComponent(uid)}/info`)
+    .then(function(r) { return r.json(); })
+    .then(function(info) {
+      specView.duration = info.duration;
+      specView.maxFreq = info.max_freq;
+      resetZoom();
+    });
+}
+
+// Wheel zooms time around the cursor; shift+wheel zooms frequency.
+specImg.addEventListener('wheel', function(e) {
+  e.preventDefault();
+  const p = specPlotFraction(e.clientX, e.clientY);
+  specZoom(e.deltaY < 0 ? 0.8 : 1.25, p.x, p.y, e.shiftKey ? 'f' : 't');
 });
-img.addEventListener('wheel', function(e) {
+
+let specPan = null;
+function specPanStart(x, y) {
+  specPan = {x: x, y: y, t0: specView.t0, t1: specView.t1, f0: specView.f0, f1: specView.f1};
+}
+function specPanMove(x, y) {
+  if (!specPan) return;
+  const rect = specImg.getBoundingClientRect();
+  const sx = rect.width / (specImg.naturalWidth || rect.width);
+  const sy = rect.height / (specImg.naturalHeight || rect.height);
+  const dt = (x - specPan.x) / ((specImg.naturalWidth - SPEC_EXTRA_W) * sx) * (specPan.t1 - specPan.t0);
+  const df = (y - specPan.y) / ((specImg.naturalHeight - SPEC_EXTRA_H) * sy) * (specPan.f1 - specPan.f0);
+  specView.t0 = specPan.t0 - dt; specView.t1 = specPan.t1 - dt;
+  specView.f0 = specPan.f0 + df; specView.f1 = specPan.f1 + df;
+  specClamp();
+  specRequestTile();
+}
+
+specImg.addEventListener('mousedown', function(e) {
   e.preventDefault();
-  if (e.deltaY < 0) zoomIn();
-  else zoomOut();
+  specPanStart(e.clientX, e.clientY);
+  specImg.style.cursor = 'grabbing';
 });
+document.addEventListener('mousemove', function(e) { specPanMove(e.clientX, e.clientY); });
+document.addEventListener('mouseup', function() {
+  specPan = null;
+  specImg.style.cursor = 'grab';
+});
+
 // Touch support for mobile
 let lastTouchDist = null;
-img.addEventListener('touchstart', function(e) {
+specImg.addEventListener('touchstart', function(e) {
   if (e.touches.length === 2) {
     lastTouchDist = Math.hypot(
       e.touches[0].clientX - e.touches[1].clientX,
       e.touches[0].clientY - e.touches[1].clientY
     );
   } else if (e.touches.length === 1) {
-    isPanning = true;
-    startX = e.touches[0].clientX - imgX;
-    startY = e.touches[0].clientY - imgY;
+    specPanStart(e.touches[0].clientX, e.touches[0].clientY);
   }
 });
-img.addEventListener('touchmove', function(e) {
+specImg.addEventListener('touchmove', function(e) {
+  e.preventDefault();
   if (e.touches.length === 2 && lastTouchDist !== null) {
-    let newDist = Math.hypot(
+    const newDist = Math.hypot(
       e.touches[0].clientX - e.touches[1].clientX,
       e.touches[0].clientY - e.touches[1].clientY
     );
-    let factor = newDist / lastTouchDist;
-    scale = Math.max(0.2, Math.min(10, scale * factor));
+    const mx = (e.touches[0].clientX + e.touches[1].clientX) / 2;
+    const my = (e.touches[0].clientY + e.touches[1].clientY) / 2;
+    const p = specPlotFraction(mx, my);
+    specZoom(lastTouchDist / newDist, p.x, p.y, 't');
     lastTouchDist = newDist;
-    updateTransform();
-  } else if (e.touches.length === 1 && isPanning) {
-    imgX = e.touches[0].clientX - startX;
-    imgY = e.touches[0].clientY - startY;
-    updateTransform();
+  } else if (e.touches.length === 1) {
+    specPanMove(e.touches[0].clientX, e.touches[0].clientY);
   }
 });
-img.addEventListener('touchend', function(e) {
+specImg.addEventListener('touchend', function(e) {
   if (e.touches.length < 2) lastTouchDist = null;
-  if (e.touches.length === 0) isPanning = false;
+  if (e.touches.length === 0) specPan = null;
 });
@@ -0,0 +1,88 @@
+import json
+import os
+import numpy as np
+from scipy import signal as sig
+
+# --- Streaming Speech Recognition ---
+# Feeds Vosk chunk by chunk while a transmission is still in progress, so
+# by the time CTCSS drops only the last fraction of a second is left to
+# decode. Audio goes through the same high-pass filter as the saved WAV
+# (with filter state carried across chunks) so results match the WAV.
+
+
+class StreamingTranscriber:
+    def __init__(self, model_path, sample_rate, grammar=None, hpf_sos=None):
+        self.sample_rate = sample_rate
+        self.grammar = grammar
+        self.hpf_sos = hpf_sos
+        self._model = None
+        self._recognizer = None
+        self._zi = None
+        self._final_parts = []
+        self.uid = None
+        self.partial = ''
+        try:
+            from vosk import Model
+            if os.path.exists(model_path):
+                self._model = Model(model_path)
+                print("Streaming STT: Vosk model loaded.")
+            else:
+                print(f"ERROR: Vosk model path not found: {model_path}")
+        except ImportError:
+            print("ERROR: Vosk library not installed.")
+        except Exception as e:
+            print(f"Error loading Vosk model: {e}")
+
+    @property
+    def available(self):
+        return self._model is not None
+
+    def _new_recognizer(self):
+        from vosk import KaldiRecognizer
+        if self.grammar:
+            return KaldiRecognizer(self._model, self.sample_rate, self.grammar)
+        return KaldiRecognizer(self._model, self.sample_rate)
+
+    def start(self, uid):
+        if self._recognizer is None:
+            self._recognizer = self._new_recognizer()
+        else:
+            self._recognizer.Reset()
+        if self.hpf_sos is not None:
+            self._zi = np.zeros((self.hpf_sos.shape[0], 2))
+        self._final_parts = []
+        self.uid = uid
+        self.partial = ''
+
+    def _text(self, pending=''):
+        return ' '.join(part for part in self._final_parts + [pending] if part)
+
+    def feed(self, audio):
+        # Returns the running transcript (finalized utterances + partial).
+        if self.uid is None:
+            return self.partial
+        audio = np.asarray(audio, dtype=np.float64)
+        if self.hpf_sos is not None:
+            audio, self._zi = sig.sosfilt(self.hpf_sos, audio, zi=self._zi)
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        if self._recognizer.AcceptWaveform(pcm.tobytes()):
+            self._final_parts.append(json.loads(self._recognizer.Result()).get('text', ''))
+            self.partial = self._text()
+        else:
+            self.partial = self._text(json.loads(self._recognizer.PartialResult()).get('partial', ''))
+        return self.partial
+
+    def finish(self):
+        if self.uid is None:
+            return ''
+        self._final_parts.append(json.loads(self._recognizer.FinalResult()).get('text', ''))
+        text = self._text()
+        self.uid = None
+        self.partial = ''
+        return text
+
+    def cancel(self):
+        if self.uid is not None and self._recognizer is not None:
+            self._recognizer.Reset()
+        self.uid = None
+        self.partial = ''
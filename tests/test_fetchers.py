@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fetchers
+from fetchers import CachedFetcher, WeatherError
+
+WEATHER = {
+    "name": "Springfield",
+    "main": {"temp": 71.6, "temp_min": 65, "temp_max": 78, "humidity": 40},
+    "weather": [{"description": "clear sky"}],
+    "wind": {"speed": 5.2},
+}
+SOLAR_XML = b"""<solar><solardata><calculatedconditions>
+<band name="80m-40m" time="day">Fair</band><band name="80m-40m" time="night">Good</band>
+<band name="30m-20m" time="day">Good</band><band name="30m-20m" time="night">Fair</band>
+</calculatedconditions></solardata></solar>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            status, body, content_type = server.response
+        time.sleep(server.delay)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.delay = 0.0
+        self.respond(200, WEATHER)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.fetcher = None
+
+    def tearDown(self):
+        if self.fetcher is not None:
+            self.fetcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, status, data, content_type='application/json'):
+        body = data if isinstance(data, bytes) else json.dumps(data).encode()
+        with self.server.lock:
+            self.server.response = (status, body, content_type)
+
+    def weather_fetcher(self, ttl=60, max_stale=60):
+        self.fetcher = CachedFetcher('weather', lambda key: fetchers.fetch_weather(key, url=self.url), ttl, max_stale)
+        return self.fetcher
+
+    def test_fresh_value_is_served_from_cache(self):
+        fetcher = self.weather_fetcher()
+        first = fetcher.get('12345')
+        second = fetcher.get('12345')
+        self.assertEqual(first, second)
+        self.assertIn("Springfield is 72 degrees, Clear sky", first)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(fetcher.stats()['hits'], 1)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        fetcher = self.weather_fetcher(ttl=0.1)
+        old = fetcher.get('12345')
+        time.sleep(0.2)
+        self.respond(200, dict(WEATHER, name="Shelbyville"))
+        self.assertEqual(fetcher.get('12345'), old)
+        self.assertEqual(fetcher.stats()['stale_hits'], 1)
+        deadline = time.monotonic() + 5
+        while self.server.requests < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        fetcher.refresh('12345').result(5)
+        self.assertIn("Shelbyville", fetcher.get('12345'))
+
+    def test_concurrent_requests_share_one_fetch(self):
+        fetcher = self.weather_fetcher()
+        self.server.delay = 0.3
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(fetcher.get('12345'))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(len(results), 10)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(fetcher.stats()['coalesced'], 9)
+
+    def test_client_error_is_not_cached(self):
+        fetcher = self.weather_fetcher()
+        self.respond(401, {"cod": 401, "message": "Invalid API key"})
+        with self.assertRaises(WeatherError) as raised:
+            fetcher.get('12345')
+        self.assertEqual(str(raised.exception), "Sorry, weather API error: Invalid API key")
+        self.respond(200, WEATHER)
+        self.assertIn("Springfield", fetcher.get('12345'))
+        self.assertEqual(self.server.requests, 2)
+
+    def test_server_error_keeps_stale_value(self):
+        fetcher = self.weather_fetcher(ttl=0.1)
+        old = fetcher.get('12345')
+        time.sleep(0.2)
+        self.respond(503, {})
+        self.assertEqual(fetcher.get('12345'), old)
+        with self.assertRaises(Exception):
+            fetcher.refresh('12345').result(5)
+        self.assertEqual(fetcher.get('12345'), old)
+        self.assertGreaterEqual(fetcher.stats()['errors'], 1)
+
+    def test_server_error_without_cached_value_raises(self):
+        fetcher = self.weather_fetcher()
+        self.respond(500, {})
+        with self.assertRaises(Exception):
+            fetcher.get('12345')
+
+    def test_hf_band_conditions(self):
+        self.respond(200, SOLAR_XML, 'text/xml')
+        self.fetcher = CachedFetcher('hamqsl', lambda key: fetchers.fetch_hf_band_conditions(key, url=self.url), 60, 60)
+        report = self.fetcher.get('bands')
+        self.assertTrue(report.startswith("80 to 40 meter daytime fair night time good. 30 to 20 meter daytime good"))
+        self.assertIn("17 to 15 meter daytime unknown", report)
+
+
+if __name__ == '__main__':
+    unittest.main()
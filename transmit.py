@@ -0,0 +1,187 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+# --- Transmit Scheduler ---
+# A single thread keys the transmitter. Queued messages go out highest
+# priority first (FIFO within a priority). A message equal to one still
+# waiting is merged into it instead of being sent twice, and a message that
+# can't be sent within its max age is dropped. Before keying up the handler
+# calls transmit(), which waits until the channel has been idle for
+# clear_seconds; `transmitting` is set while we are on the air (plus a
+# short tail for the radio to drop) so the receive side can ignore its own
+# signal.
+
+TX_REPORT = 0
+TX_ID = 1
+TX_INFO = 2
+
+_MERGED = object()
+
+
+class TransmitScheduler:
+    def __init__(self, name, handler, maxsize, channel_idle_seconds, max_age=60.0,
+                 clear_seconds=0.5, tail_seconds=0.5):
+        self.name = name
+        self.handler = handler
+        self.maxsize = maxsize
+        self.channel_idle_seconds = channel_idle_seconds
+        self.max_age = max_age
+        self.clear_seconds = clear_seconds
+        self.tail_seconds = tail_seconds
+        self.transmitting = threading.Event()
+        self._heap = []
+        self._waiting = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._deadline = None
+        self._busy = 0
+        self.queued = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.merged = 0
+        self.expired = 0
+        self.high_water = 0
+        self.processed = 0
+        self.errors = 0
+        self.total_latency = 0.0
+
+    def __len__(self):
+        return self.queued
+
+    def put(self, item, priority=TX_INFO, key=None, max_age=None):
+        now = time.monotonic()
+        deadline = now + (self.max_age if max_age is None else max_age)
+        requeued = False
+        with self._cond:
+            existing = self._waiting.get(key) if key is not None else None
+            if existing is not None:
+                self.merged += 1
+                existing[3] = max(existing[3], deadline)
+                if priority >= existing[0]:
+                    return True
+                # Re-queue at the higher priority, keeping its original age.
+                existing[5] = _MERGED
+                self.queued -= 1
+                now = existing[2]
+                requeued = True
+            elif self.queued >= self.maxsize:
+                victim = max((e for e in self._heap if e[5] is not _MERGED), key=lambda e: (e[0], e[1]))
+                self.dropped += 1
+                if priority >= victim[0]:
+                    return False
+                victim[5] = _MERGED
+                self.queued -= 1
+                if victim[4] is not None:
+                    self._waiting.pop(victim[4], None)
+            entry = [priority, next(self._seq), now, deadline, key, item]
+            heapq.heappush(self._heap, entry)
+            if key is not None:
+                self._waiting[key] = entry
+            self.queued += 1
+            if not requeued:
+                self.enqueued += 1
+            self.high_water = max(self.high_water, self.queued)
+            self._cond.notify()
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while (self.queued or self._busy) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+
+    def _next(self):
+        with self._cond:
+            while not self._stop.is_set():
+                while self._heap:
+                    priority, seq, enqueued_at, deadline, key, item = heapq.heappop(self._heap)
+                    if item is _MERGED:
+                        continue
+                    self.queued -= 1
+                    if key is not None:
+                        self._waiting.pop(key, None)
+                    if time.monotonic() > deadline:
+                        self.expired += 1
+                        print(f"Transmit: dropped message queued {time.monotonic() - enqueued_at:.0f}s ago.")
+                        continue
+                    self._busy += 1
+                    return enqueued_at, deadline, item
+                self._cond.wait(0.2)
+        return None
+
+    def _worker(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                return
+            enqueued_at, self._deadline, item = entry
+            try:
+                self.handler(item)
+                with self._cond:
+                    self.processed += 1
+                    self.total_latency += time.monotonic() - enqueued_at
+            except Exception as e:
+                with self._cond:
+                    self.errors += 1
+                print(f"Error in {self.name} stage: {e}")
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    self._busy -= 1
+
+    def wait_clear(self, deadline=None):
+        while not self._stop.is_set():
+            idle = self.channel_idle_seconds()
+            if idle >= self.clear_seconds:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(max(0.02, min(0.1, self.clear_seconds - idle)))
+        return False
+
+    def transmit(self, play, *args):
+        # Called by the handler once the audio is ready to go out.
+        if not self.wait_clear(self._deadline):
+            with self._cond:
+                self.expired += 1
+            print("Transmit: channel stayed busy; message dropped.")
+            return False
+        self.transmitting.set()
+        try:
+            play(*args)
+        finally:
+            time.sleep(self.tail_seconds)
+            self.transmitting.clear()
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                'name': self.name,
+                'policy': 'priority',
+                'maxsize': self.maxsize,
+                'queued': self.queued,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'high_water': self.high_water,
+                'merged': self.merged,
+                'expired': self.expired,
+                'workers': 1,
+                'processed': self.processed,
+                'errors': self.errors,
+                'avg_latency_ms': (self.total_latency / self.processed * 1000.0) if self.processed else 0.0,
+            }
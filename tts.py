@@ -0,0 +1,351 @@
+import base64
+import collections
+import io
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import numpy as np
+from scipy import signal as sig
+from scipy.io import wavfile
+
+# --- Text-to-Speech Service ---
+# The engine is picked once at startup. Speech is rendered phrase by phrase
+# (split at commas and sentence ends) into an LRU cache of PCM at the output
+# rate, so fixed phrases (station ID, help, parrot prompts) and the variable
+# parts of a signal report ("your signal is S7", "SNR 12 dB") are
+# synthesized once and afterwards just stitched together. The stitched
+# audio is mixed with the ultrasonic tone and written straight to the audio
+# device, without temporary files where the platform allows it.
+
+OUTPUT_SAMPLE_RATE = 48000
+PHRASE_GAP_SECONDS = 0.12
+ULTRASONIC_TONE_HZ = 18000
+ULTRASONIC_TONE_LEVEL = 0.01
+SYNTH_TIMEOUT_SECONDS = 20
+
+
+def mix_ultrasonic_tone(audio, sample_rate, tone_freq=ULTRASONIC_TONE_HZ, tone_level=ULTRASONIC_TONE_LEVEL):
+    t = np.arange(len(audio)) / sample_rate
+    tone = tone_level * np.sin(2 * np.pi * tone_freq * t)
+    return audio + tone
+
+
+def to_output_rate(audio, sample_rate):
+    audio = np.asarray(audio, dtype=np.float32)
+    if sample_rate == OUTPUT_SAMPLE_RATE:
+        return audio
+    g = np.gcd(int(sample_rate), OUTPUT_SAMPLE_RATE)
+    return sig.resample_poly(audio, OUTPUT_SAMPLE_RATE // g, int(sample_rate) // g).astype(np.float32)
+
+
+def _pcm_from_wav(data):
+    rate, pcm = wavfile.read(io.BytesIO(data) if isinstance(data, bytes) else data)
+    if pcm.ndim > 1:
+        pcm = pcm.mean(axis=1)
+    if pcm.dtype == np.int16:
+        pcm = pcm.astype(np.float32) / 32767.0
+    return to_output_rate(pcm, rate)
+
+
+def split_phrases(text):
+    phrases = []
+    for part in re.split(r'(?<=[,.;!?])\s+', text.strip()):
+        part = part.rstrip(',.;').strip()
+        if part:
+            phrases.append(part)
+    return phrases
+
+
+# --- Engines ---
+class EspeakEngine:
+    direct = False
+
+    def __init__(self, exe, words_per_minute=150):
+        self.name = os.path.basename(exe)
+        self.exe = exe
+        self.words_per_minute = words_per_minute
+
+    def synthesize(self, text):
+        result = subprocess.run([self.exe, '-s', str(self.words_per_minute), '--stdout', '--', text],
+                                capture_output=True, timeout=SYNTH_TIMEOUT_SECONDS, check=True)
+        return _pcm_from_wav(result.stdout)
+
+    def close(self):
+        pass
+
+
+class SayEngine:
+    name = 'say'
+    direct = False
+
+    def __init__(self, words_per_minute=180):
+        self.words_per_minute = words_per_minute
+
+    def synthesize(self, text):
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            subprocess.run(['say', '-r', str(self.words_per_minute), '--data-format=LEI16@22050', '-o', path,
+                            '--', text], capture_output=True, timeout=SYNTH_TIMEOUT_SECONDS, check=True)
+            return _pcm_from_wav(path)
+        finally:
+            os.remove(path)
+
+    def close(self):
+        pass
+
+
+class SapiEngine:
+    # One PowerShell process holds a SpeechSynthesizer for the life of the
+    # service; each request is a line "<wav path>\t<base64 text>" answered by
+    # "ok" once the file is written. Starting PowerShell per phrase costs
+    # about a second.
+    name = 'sapi'
+    direct = False
+    SCRIPT = (
+        "Add-Type -AssemblyName System.Speech; "
+        "$s = New-Object System.Speech.Synthesis.SpeechSynthesizer; $s.Rate = 0; "
+        "while (($line = [Console]::In.ReadLine()) -ne $null) { "
+        "$parts = $line.Split(\"`t\"); "
+        "$text = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($parts[1])); "
+        "$s.SetOutputToWaveFile($parts[0]); $s.Speak($text); $s.SetOutputToNull(); "
+        "[Console]::Out.WriteLine('ok'); [Console]::Out.Flush() }"
+    )
+
+    def __init__(self):
+        encoded = base64.b64encode(self.SCRIPT.encode('utf-16-le')).decode('ascii')
+        self._proc = subprocess.Popen(
+            ['powershell', '-NoProfile', '-NonInteractive', '-ExecutionPolicy', 'Bypass', '-EncodedCommand', encoded],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+
+    def synthesize(self, text):
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            self._proc.stdin.write(f"{path}\t{base64.b64encode(text.encode()).decode('ascii')}\n")
+            self._proc.stdin.flush()
+            if self._proc.stdout.readline().strip() != 'ok':
+                raise RuntimeError("SAPI worker exited")
+            return _pcm_from_wav(path)
+        finally:
+            os.remove(path)
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.stdin.close()
+            self._proc.wait(timeout=5)
+
+
+class SpdSayEngine:
+    # speech-dispatcher plays the speech itself and can't hand back audio,
+    # so nothing is cached and no ultrasonic tone is mixed in.
+    name = 'spd-say'
+    direct = True
+
+    def __init__(self, rate=-10):
+        self.rate = rate
+
+    def say(self, text):
+        subprocess.run(['spd-say', '-r', str(self.rate), '-w', '--', text],
+                       capture_output=True, timeout=SYNTH_TIMEOUT_SECONDS * 3, check=True)
+
+    def close(self):
+        pass
+
+
+def detect_engine(preferred='auto'):
+    system = platform.system().lower()
+    if preferred in ('auto', 'espeak'):
+        for exe in ('espeak-ng', 'espeak'):
+            path = shutil.which(exe)
+            if path:
+                return EspeakEngine(path)
+    if preferred in ('auto', 'say') and 'darwin' in system and shutil.which('say'):
+        return SayEngine()
+    if preferred in ('auto', 'sapi') and 'windows' in system:
+        return SapiEngine()
+    if preferred in ('auto', 'spd-say') and 'linux' in system and shutil.which('spd-say'):
+        return SpdSayEngine()
+    return None
+
+
+# --- Audio Output ---
+class AudioOutput:
+    # sounddevice (PortAudio) when installed; otherwise aplay/paplay fed
+    # raw PCM on stdin, winsound from memory, or afplay from a temp file.
+    def __init__(self):
+        self.system = platform.system().lower()
+        self.method = None
+        try:
+            import sounddevice
+            self._sd = sounddevice
+            self.method = 'sounddevice'
+            return
+        except (ImportError, OSError):
+            self._sd = None
+        if 'linux' in self.system:
+            self.method = 'aplay' if shutil.which('aplay') else ('paplay' if shutil.which('paplay') else None)
+        elif 'darwin' in self.system:
+            self.method = 'afplay'
+        elif 'windows' in self.system:
+            self.method = 'winsound'
+
+    def play(self, audio, sample_rate=OUTPUT_SAMPLE_RATE):
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        if self.method == 'sounddevice':
+            self._sd.play(pcm, sample_rate, blocking=True)
+        elif self.method == 'aplay':
+            subprocess.run(['aplay', '-q', '-t', 'raw', '-f', 'S16_LE', '-c', '1', '-r', str(sample_rate), '-'],
+                           input=pcm.tobytes(), check=False)
+        elif self.method == 'paplay':
+            subprocess.run(['paplay', '--raw', '--format=s16le', '--channels=1', f'--rate={sample_rate}'],
+                           input=pcm.tobytes(), check=False)
+        elif self.method == 'winsound':
+            import winsound
+            buf = io.BytesIO()
+            wavfile.write(buf, sample_rate, pcm)
+            winsound.PlaySound(buf.getvalue(), winsound.SND_MEMORY)
+        elif self.method == 'afplay':
+            fd, path = tempfile.mkstemp(suffix='.wav')
+            os.close(fd)
+            try:
+                wavfile.write(path, sample_rate, pcm)
+                subprocess.run(['afplay', path], check=False)
+            finally:
+                os.remove(path)
+        else:
+            print("No supported audio playback method for this OS.")
+
+
+# --- Phrase Cache ---
+class PhraseCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        with self._lock:
+            pcm = self._items.get(key)
+            if pcm is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return pcm
+
+    def put(self, key, pcm):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old.nbytes
+            self._items[key] = pcm
+            self.bytes += pcm.nbytes
+            while self.bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'phrases': len(self._items), 'bytes': self.bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+
+class TTSService:
+    def __init__(self, engine='auto', cache_mb=32):
+        self.preferred = engine
+        self.engine = None
+        self.output = None
+        self.cache = PhraseCache(float(cache_mb) * 1024 * 1024)
+        self._synth_lock = threading.Lock()
+        self._gap = np.zeros(int(PHRASE_GAP_SECONDS * OUTPUT_SAMPLE_RATE), dtype=np.float32)
+
+    def start(self, preload=()):
+        self.engine = detect_engine(self.preferred)
+        self.output = AudioOutput()
+        if self.engine is None:
+            print("TTS ERROR: no speech engine found (install espeak-ng, espeak or speech-dispatcher).")
+        elif self.direct:
+            print(f"TTS: using {self.engine.name} (plays directly, no phrase cache).")
+        else:
+            print(f"TTS: using {self.engine.name}, playback via {self.output.method}.")
+            if preload:
+                threading.Thread(target=self.preload, args=(list(preload),), name='tts-preload', daemon=True).start()
+        return self
+
+    def close(self):
+        if self.engine is not None:
+            self.engine.close()
+
+    @property
+    def direct(self):
+        return self.engine is not None and self.engine.direct
+
+    def say(self, text):
+        # For direct engines: speak text on the default audio device.
+        try:
+            self.engine.say(text)
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"TTS ERROR: {e}")
+
+    def phrase(self, text):
+        key = text.lower()
+        pcm = self.cache.get(key)
+        if pcm is None:
+            with self._synth_lock:
+                pcm = self.engine.synthesize(text)
+            self.cache.put(key, pcm)
+        return pcm
+
+    def preload(self, texts):
+        for text in texts:
+            for part in split_phrases(text):
+                if part.lower() not in self.cache:
+                    try:
+                        self.phrase(part)
+                    except Exception as e:
+                        print(f"TTS preload failed for '{part}': {e}")
+                        return
+
+    def render(self, text):
+        parts = []
+        for part in split_phrases(text):
+            if parts:
+                parts.append(self._gap)
+            parts.append(self.phrase(part))
+        return np.concatenate(parts) if parts else self._gap
+
+    def prepare(self, text):
+        # Rendered and mixed audio ready for play(), or None on failure.
+        if self.engine is None:
+            print(f"TTS ERROR: cannot speak '{text}' (no engine).")
+            return None
+        try:
+            audio = self.render(text)
+        except (OSError, subprocess.SubprocessError, RuntimeError, ValueError) as e:
+            print(f"TTS ERROR: {e}")
+            return None
+        return mix_ultrasonic_tone(audio, OUTPUT_SAMPLE_RATE)
+
+    def speak(self, text):
+        audio = self.prepare(text)
+        if audio is None:
+            return False
+        self.output.play(audio, OUTPUT_SAMPLE_RATE)
+        return True
+
+    def play(self, audio, sample_rate):
+        self.output.play(to_output_rate(audio, sample_rate), OUTPUT_SAMPLE_RATE)
@@ -1,5 +1,9 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory, flash
-from signal_db import get_all_signal_reports, log_signal_report
+from flask import Flask, render_template, request, redirect, url_for, jsonify, send_file, flash, abort, Response, stream_with_context
+from signal_db import ensure_table_exists, get_signal_report, log_signal_report, query_signal_reports, count_signal_reports, report_cursor, search_signal_reports, SIGNAL_REPORT_COLUMNS, timestamp_to_ms, get_signal_stats, get_callsign_summary, get_s_meter_distribution, export_signal_reports, EXPORT_FORMATS
+from spectrogram import render_spectrogram_tile, load_spectrogram_array
+from archiver import tier_usage, resolve_archived, format_bytes, transcoded_copy, CAPTURE_DATE_RE, AUDIO_EXTENSIONS
+from werkzeug.utils import safe_join
+import collections
 import os
 import glob
 import json
@@ -8,12 +12,20 @@ import psutil
 import time
 import re
 import sys
+import threading
+import queue
+import ipc
 
 app = Flask(__name__)
+ensure_table_exists()
 
 CONFIG_PATH = 'config.json'
 SIGREP_PROCESS_NAME = 'sigrep.py'
-SIGREP_STATUS_FILE = 'sigrep_status.json'
+WAVS_DIR = os.path.join(os.getcwd(), 'wavs')
+WAVS_CACHE_DIR = os.path.join(os.getcwd(), 'wavs_cache')
+WAVS_CACHE_MAX_MB = 256
+WAVS_IMMUTABLE_MAX_AGE = 365 * 86400
+TRANSCODE_FORMATS = ('opus', 'mp3')
 
 def load_config():
     with open(CONFIG_PATH, 'r') as f:
@@ -23,30 +35,197 @@ def save_config(cfg):
     with open(CONFIG_PATH, 'w') as f:
         json.dump(cfg, f, indent=2)
 
-# Helper to check if sigrep.py is running
-def is_sigrep_running():
-    abs_script = os.path.abspath(SIGREP_PROCESS_NAME)
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+# --- Process Tracking & System Metrics ---
+# A background sampler keeps CPU/RAM/disk figures and sigrep's status in
+# memory, so /run and the status poll never block on psutil or scan the
+# process table. Status comes from sigrep's IPC control socket; the process
+# itself is tracked by PID (the one this webapp launched, or the one the
+# control socket reports) so a launch that hasn't started listening yet,
+# or a hung process, is still seen.
+SAMPLE_INTERVAL_SECONDS = 2.0
+SIGREP_STOP_TIMEOUT_SECONDS = 45.0
+IPC_TIMEOUT_SECONDS = 1.0
+
+class SystemSampler:
+    def __init__(self, interval=SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._proc = None
+        self._wake = threading.Event()
+        self.metrics = {'cpu': 0.0, 'ram': 0.0, 'disk': 0.0, 'sampled_at': 0.0}
+        self.status = {'state': 'stopped'}
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        psutil.cpu_percent(interval=None)
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"System sampler error: {e}")
+
+    def refresh(self):
+        self._wake.set()
+
+    def track(self, proc):
+        # proc is the Popen this webapp launched, a psutil.Process for the
+        # PID sigrep reported, or None once it has exited.
+        with self._lock:
+            self._proc = proc
+            self.running = proc is not None
+            if proc is not None:
+                self.status = {'state': 'starting'}
+        self.refresh()
+
+    def tracked(self):
+        with self._lock:
+            return self._proc
+
+    def _alive(self, proc):
+        if isinstance(proc, subprocess.Popen):
+            return proc.poll() is None
         try:
-            cmdline = proc.info['cmdline']
-            if not cmdline:
-                continue
-            # Check for both script name and absolute path
-            if any((SIGREP_PROCESS_NAME in arg or abs_script in arg) for arg in cmdline):
-                return True
-        except Exception:
-            continue
-    return False
+            return proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+
+    def _sample_sigrep(self):
+        proc = self.tracked()
+        try:
+            status = ipc.request('status', timeout=IPC_TIMEOUT_SECONDS)
+        except (OSError, ValueError):
+            status = None
+        if status is not None:
+            if proc is None or proc.pid != status.get('pid'):
+                try:
+                    proc = psutil.Process(status['pid'])
+                except (psutil.Error, KeyError, TypeError):
+                    proc = None
+            return proc, True, status
+        if proc is not None and self._alive(proc):
+            return proc, True, {'state': 'starting'}
+        return None, False, {'state': 'stopped'}
+
+    def sample(self):
+        metrics = {
+            'cpu': psutil.cpu_percent(interval=None),
+            'ram': psutil.virtual_memory().percent,
+            'disk': psutil.disk_usage('.').percent,
+            'sampled_at': time.time(),
+        }
+        tier_usage(WAVS_DIR)
+        before = self.tracked()
+        proc, running, status = self._sample_sigrep()
+        with self._lock:
+            self.metrics = metrics
+            # Leave it alone if start/stop changed the tracked process meanwhile.
+            if self._proc is before:
+                self._proc = proc
+                self.running = running
+                self.status = status
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.metrics), dict(self.status)
+
+sampler = SystemSampler().start()
+
+def is_sigrep_running():
+    return sampler.running
 
-# Helper to get status (loading/baselining/ready)
 def get_sigrep_status():
-    if not os.path.exists(SIGREP_STATUS_FILE):
-        return {'state': 'stopped'}
-    try:
-        with open(SIGREP_STATUS_FILE, 'r') as f:
-            return json.load(f)
-    except Exception:
-        return {'state': 'unknown'}
+    return sampler.snapshot()[1]
+
+# --- Live Events ---
+# One subscription to sigrep's IPC socket is shared by every /events client
+# and only held open while someone is listening. Each client gets a small
+# queue; a slow client loses its oldest events instead of holding up the
+# others. New clients are sent the last known state and level straight away.
+EVENT_CLIENT_QUEUE_EVENTS = 100
+EVENT_HEARTBEAT_SECONDS = 15.0
+EVENT_RECONNECT_SECONDS = 2.0
+
+class EventRelay:
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._last = {}
+        self.connected = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='event-relay', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self._wanted.wait()
+            try:
+                for event in ipc.subscribe():
+                    if event.get('type') == 'hello':
+                        self._set_connected(True)
+                    else:
+                        self._broadcast(event)
+                    if not self._clients:
+                        break
+            except OSError:
+                pass
+            self._set_connected(False)
+            if self._clients:
+                time.sleep(EVENT_RECONNECT_SECONDS)
+
+    def _set_connected(self, connected):
+        if connected != self.connected:
+            self.connected = connected
+            self._broadcast({'type': 'link', 'connected': connected, 'ts': time.time()})
+
+    def _broadcast(self, event):
+        if event.get('type') in ('state', 'level', 'link'):
+            self._last[event['type']] = event
+        if event.get('type') in ('state', 'link'):
+            sampler.refresh()
+        with self._lock:
+            clients = list(self._clients.items())
+        for q, types in clients:
+            if types and event.get('type') not in types:
+                continue
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    q.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def listen(self, types=None):
+        q = queue.Queue(EVENT_CLIENT_QUEUE_EVENTS)
+        for event in list(self._last.values()):
+            if not types or event['type'] in types:
+                q.put_nowait(event)
+        with self._lock:
+            self._clients[q] = types
+        self._wanted.set()
+        return q
+
+    def unlisten(self, q):
+        with self._lock:
+            self._clients.pop(q, None)
+            if not self._clients:
+                self._wanted.clear()
+
+relay = EventRelay().start()
 
 # Start sigrep.py as a subprocess
 def start_sigrep():
@@ -60,25 +239,36 @@ def start_sigrep():
                 sys.executable, os.path.abspath(SIGREP_PROCESS_NAME)
             ], cwd=os.path.dirname(os.path.abspath(SIGREP_PROCESS_NAME)), stdout=logf, stderr=logf)
             logf.write(f"Started sigrep.py with PID {proc.pid}\n")
+        sampler.track(proc)
         return True
     except Exception as e:
         with open('sigrep_webapp_launch.log', 'a') as logf:
             logf.write(f"Failed to start sigrep.py: {e}\n")
         return False
 
-# Stop sigrep.py by killing the process
-def stop_sigrep():
-    abs_script = os.path.abspath(SIGREP_PROCESS_NAME)
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+# Stop sigrep.py: ask it over IPC to shut down cleanly (finish pending
+# captures, flush the database); kill it only if it doesn't answer or
+# doesn't exit within SIGREP_STOP_TIMEOUT_SECONDS when waiting.
+def stop_sigrep(wait=False):
+    proc = sampler.tracked()
+    try:
+        graceful = ipc.request('stop', timeout=IPC_TIMEOUT_SECONDS).get('ok', False)
+    except (OSError, ValueError):
+        graceful = False
+    if proc is not None and (wait or not graceful):
         try:
-            cmdline = proc.info['cmdline']
-            if not cmdline:
-                continue
-            # Match both script name and absolute path
-            if any((SIGREP_PROCESS_NAME in arg or abs_script in arg) for arg in cmdline):
+            if not graceful:
                 proc.kill()
-        except Exception:
-            continue
+            proc.wait(timeout=SIGREP_STOP_TIMEOUT_SECONDS)
+        except (psutil.TimeoutExpired, subprocess.TimeoutExpired):
+            print("sigrep did not exit in time; killing it.")
+            proc.kill()
+            proc.wait(timeout=SIGREP_STOP_TIMEOUT_SECONDS)
+        except (psutil.Error, OSError):
+            pass
+        sampler.track(None)
+    sampler.refresh()
+    return graceful
 
 @app.route('/')
 def index():
@@ -91,6 +281,7 @@ NAVBAR = '''
     <a href="/run">Run</a>
     <a href="/config">Configuration</a>
     <a href="/logs">Logs</a>
+    <a href="/stats">Stats</a>
   </div>
   <button id="theme-toggle" class="theme-toggle" onclick="toggleTheme()">Toggle Dark Mode</button>
 </div>
@@ -197,11 +388,12 @@ def run_status():
                 else:
                     error = 'Failed to start SignalReport. See sigrep_webapp_launch.log.'
             elif action == 'stop':
-                stop_sigrep()
-                message = 'Stopped SignalReport.'
+                if stop_sigrep():
+                    message = 'Stopping SignalReport (finishing pending captures).'
+                else:
+                    message = 'Stopped SignalReport.'
             elif action == 'restart':
-                stop_sigrep()
-                time.sleep(1)
+                stop_sigrep(wait=True)
                 result = start_sigrep()
                 if result:
                     message = 'Restarted SignalReport.'
@@ -211,8 +403,7 @@ def run_status():
             error = str(e)
             with open('sigrep_webapp_launch.log', 'a') as logf:
                 logf.write(f"Exception in /run POST: {e}\n")
-        time.sleep(1)
-    status = get_sigrep_status()
+    metrics, status = sampler.snapshot()
     running = is_sigrep_running()
     last_started = status.get('last_started', None)
     if last_started and last_started != 'N/A':
@@ -227,9 +418,7 @@ def run_status():
     else:
         last_started_fmt = 'N/A'
         uptime_str = 'N/A'
-    cpu = psutil.cpu_percent(interval=0.1)
-    mem = psutil.virtual_memory()
-    disk = psutil.disk_usage('.')
+    tiers = tier_usage(WAVS_DIR)
     freq_mhz = float(cfg['SDR_CENTER_FREQ'])/1e6
     sample_rate = cfg['SDR_SAMPLE_RATE']
     gain = cfg['SDR_GAIN']
@@ -237,9 +426,14 @@ def run_status():
         'run.html',
         navbar=NAVBAR,
         title='Run',
-        cpu=f"{cpu:.1f}",
-        ram=f"{mem.percent:.1f}",
-        disk=f"{disk.percent:.1f}",
+        cpu=f"{metrics['cpu']:.1f}",
+        ram=f"{metrics['ram']:.1f}",
+        disk=f"{metrics['disk']:.1f}",
+        recent_size=format_bytes(tiers['recent']['bytes']),
+        recent_files=tiers['recent']['files'],
+        archive_size=format_bytes(tiers['archive']['bytes']),
+        archive_files=tiers['archive']['files'],
+        free_size=format_bytes(tiers['free_bytes']),
         freq_mhz=f"{freq_mhz:.3f}",
         sample_rate=sample_rate,
         gain=gain,
@@ -262,6 +456,37 @@ def run_status_json():
     }
     return jsonify(resp)
 
+@app.route('/api/counters')
+def api_counters():
+    try:
+        return jsonify(ipc.request('counters', timeout=IPC_TIMEOUT_SECONDS))
+    except (OSError, ValueError):
+        return jsonify({'ok': False, 'error': 'SigRep is not running'}), 503
+
+@app.route('/events')
+def events_stream():
+    # Server-sent events; ?types=report,state limits what is sent.
+    types = frozenset(t for t in request.args.get('types', '').split(',') if t)
+    q = relay.listen(types)
+
+    def stream():
+        try:
+            yield f"retry: {int(EVENT_RECONNECT_SECONDS * 1000)}\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=EVENT_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            relay.unlisten(q)
+
+    resp = Response(stream(), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
 @app.route('/config', methods=['GET', 'POST'])
 def config():
     cfg = load_config()
@@ -313,6 +538,7 @@ def config():
             cfg['HPF_CUTOFF_HZ'] = hpf_cutoff
             cfg['HPF_ORDER'] = hpf_order
             cfg['CTCSS_FREQ'] = ctcss_freq
+            cfg['CTCSS_SCAN'] = request.form.get('CTCSS_SCAN') == 'on'
             cfg['CTCSS_THRESHOLD'] = ctcss_threshold
             cfg['CTCSS_HOLDTIME'] = ctcss_holdtime
             cfg['MIN_TRANSMISSION_LENGTH'] = min_trans_len
@@ -322,11 +548,19 @@ def config():
             cfg['WEB_PORT'] = web_port
             cfg['WEB_HOST'] = web_host
             save_config(cfg)
+            if is_sigrep_running():
+                try:
+                    reload = ipc.request('reload', timeout=IPC_TIMEOUT_SECONDS)
+                    return redirect(url_for('config', applied=','.join(reload.get('applied', [])),
+                                            restart=','.join(reload.get('restart_required', []))))
+                except (OSError, ValueError):
+                    pass
             return redirect(url_for('config'))
         except Exception as e:
             error = str(e)
     checked_offset = 'checked' if cfg.get('SDR_OFFSET_TUNING') else ''
     checked_spec = 'checked' if cfg.get('SAVE_SPECTROGRAM') else ''
+    checked_scan = 'checked' if cfg.get('CTCSS_SCAN') else ''
     center_freq_val = cfg['SDR_CENTER_FREQ']
     if center_freq_val >= 1e6 and center_freq_val % 1e6 == 0:
         center_freq_display = str(center_freq_val / 1e6)
@@ -341,35 +575,297 @@ def config():
         cfg=cfg,
         checked_offset=checked_offset,
         checked_spec=checked_spec,
+        checked_scan=checked_scan,
         center_freq_display=center_freq_display,
+        applied=request.args.get('applied', ''),
+        restart_required=request.args.get('restart', ''),
         error=error
     )
 
+LOGS_PER_PAGE = 20
+
+def filter_date(value):
+    # "YYYY-MM-DD[ HH:MM:SS]"; anything else raises ValueError.
+    timestamp_to_ms(value)
+    return value
+
+LOG_FILTER_ARGS = {
+    'callsign': str, 'start': filter_date, 'end': filter_date,
+    'min_snr': float, 'max_snr': float, 'min_s_units': float, 'max_s_units': float,
+    'min_dbfs': float, 'max_dbfs': float,
+}
+
+def log_filters(args):
+    filters = {}
+    for name, conv in LOG_FILTER_ARGS.items():
+        value = args.get(name, '').strip()
+        if not value:
+            continue
+        try:
+            filters[name] = conv(value)
+        except ValueError:
+            continue
+    return filters
+
 @app.route('/logs')
 def logs():
-    page = int(request.args.get('page', 1))
-    per_page = 20  # or any number you prefer
-    all_reports = get_all_signal_reports()
-    total = len(all_reports)
-    start = (page - 1) * per_page
-    end = start + per_page
-    reports = all_reports[start:end]
-    total_pages = (total + per_page - 1) // per_page
+    query = request.args.get('q', '').strip()
+    if query:
+        try:
+            reports, next_cursor = search_signal_reports(query, LOGS_PER_PAGE, request.args.get('cursor'))
+        except ValueError:
+            # Malformed cursor: restart from the first page of results.
+            return redirect(url_for('logs', q=query))
+        return render_template(
+            'logs.html',
+            reports=reports,
+            query=query,
+            filters={},
+            total=None,
+            search_cursor=next_cursor
+        )
+    filters = log_filters(request.args)
+    before = request.args.get('before')
+    after = request.args.get('after')
+    try:
+        reports, has_more = query_signal_reports(LOGS_PER_PAGE, before=before, after=after, **filters)
+    except ValueError:
+        # Malformed paging cursor: start again from the newest page.
+        args = {k: v for k, v in request.args.items() if k not in ('before', 'after')}
+        return redirect(url_for('logs', **args))
+    older_cursor = newer_cursor = None
+    if reports:
+        if has_more or after:
+            older_cursor = report_cursor(reports[-1])
+        if before or (after and has_more):
+            newer_cursor = report_cursor(reports[0])
+    # The unfiltered total comes from a trigger-maintained counter.
+    total = None if filters else count_signal_reports()
     return render_template(
         'logs.html',
         reports=reports,
-        page=page,
-        total_pages=total_pages
+        filters=filters,
+        total=total,
+        older_cursor=older_cursor,
+        newer_cursor=newer_cursor
     )
 
-@app.route('/spectrogram/<filename>')
-def spectrogram_page(filename):
-    img_url = f'/wavs/{filename}'
-    return render_template('spectrogram.html', navbar=NAVBAR, title='Spectrogram', img_url=img_url)
+@app.route('/export')
+def export():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(sorted(EXPORT_FORMATS))}"}), 400
+    chunks = export_signal_reports(fmt, **log_filters(request.args))
+    try:
+        # Start the generator now so a missing optional dependency is a 501,
+        # not a truncated download.
+        first = next(chunks, b'')
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 501
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        yield first
+        yield from chunks
+
+    filename = f"signal_reports_{time.strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/api/search')
+def api_search():
+    limit = min(max(request.args.get('limit', LOGS_PER_PAGE, type=int), 1), 200)
+    try:
+        reports, next_cursor = search_signal_reports(request.args.get('q', ''), limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+    return jsonify({
+        'results': [dict(zip(SIGNAL_REPORT_COLUMNS, r)) for r in reports],
+        'next_cursor': next_cursor,
+    })
+
+# --- Statistics ---
+# Served from the rollup tables maintained by signal_db; never scans the
+# report log itself.
+STATS_DEFAULT_DAYS = 30
+
+def stats_params(args):
+    resolution = args.get('resolution', 'day')
+    if resolution not in ('hour', 'day'):
+        resolution = 'day'
+    start = args.get('start') or time.strftime('%Y-%m-%d', time.localtime(time.time() - STATS_DEFAULT_DAYS * 86400))
+    return {
+        'resolution': resolution,
+        'callsign': args.get('callsign', '').strip() or None,
+        'start': start,
+        'end': args.get('end') or None,
+    }
+
+@app.route('/stats')
+def stats():
+    params = stats_params(request.args)
+    summary = get_callsign_summary(params['start'], params['end'], params['callsign'])
+    s_meter = get_s_meter_distribution(params['callsign'], params['start'], params['end'])
+    series = get_signal_stats(params['resolution'], params['callsign'], params['start'], params['end']) if params['callsign'] else []
+    return render_template(
+        'stats.html',
+        navbar=NAVBAR,
+        title='Signal Statistics',
+        params=params,
+        summary=summary,
+        s_meter=s_meter,
+        series=series
+    )
+
+@app.route('/api/stats')
+def api_stats():
+    params = stats_params(request.args)
+    series = get_signal_stats(params['resolution'], params['callsign'], params['start'], params['end'])
+    summary = get_callsign_summary(params['start'], params['end'], params['callsign'])
+    return jsonify({
+        'params': params,
+        'series': [
+            dict(zip(('callsign', 'period', 'reports', 'avg_snr', 'min_snr', 'max_snr', 'airtime_sec'), r))
+            for r in series
+        ],
+        'summary': [
+            dict(zip(('callsign', 'reports', 'avg_snr', 'min_snr', 'max_snr', 'airtime_sec', 'first', 'last'), r))
+            for r in summary
+        ],
+        's_meter': [{'s_meter': r[0], 'reports': r[1]} for r in get_s_meter_distribution(params['callsign'], params['start'], params['end'])],
+    })
+
+# --- Spectrogram Tiles ---
+# Tiles are rendered from the stored uint8 STFT (.npy) of a capture. Window
+# bounds are rounded so nearby zoom/pan requests share cache entries; the
+# cache is bounded by the total size of the PNGs it holds.
+SPECTROGRAM_TILE_CACHE_MB = 16
+SPECTROGRAM_MAX_TILE_SIZE = 2048
+
+
+class TileCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+            return png
+
+    def put(self, key, png):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._items[key] = png
+            self.bytes += len(png)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+
+tile_cache = TileCache(SPECTROGRAM_TILE_CACHE_MB * 1024 * 1024)
+
+
+def _spectrogram_array_path(uid):
+    row = get_signal_report(uid)
+    if row is None or not row[8] or row[8] == 'NULL' or not row[8].endswith('.npy'):
+        return None
+    path = row[8]
+    if not os.path.isabs(path):
+        path = os.path.join(os.getcwd(), path)
+    return path if os.path.exists(path) else None
+
+
+def _cached_tile(path, mtime, t0, t1, f0, f1, width, height, axes):
+    key = (path, mtime, t0, t1, f0, f1, width, height, axes)
+    png = tile_cache.get(key)
+    if png is None:
+        png = render_spectrogram_tile(path, t0, t1, f0, f1, width, height, axes)
+        tile_cache.put(key, png)
+    return png
+
+
+def _float_arg(name, digits):
+    value = request.args.get(name, type=float)
+    return None if value is None else round(value, digits)
+
+
+@app.route('/spectrogram/<uid>')
+def spectrogram_tile(uid):
+    path = _spectrogram_array_path(uid)
+    if path is None:
+        abort(404)
+    width = min(max(request.args.get('w', 720, type=int), 16), SPECTROGRAM_MAX_TILE_SIZE)
+    height = min(max(request.args.get('h', 258, type=int), 16), SPECTROGRAM_MAX_TILE_SIZE)
+    axes = request.args.get('axes', '1') not in ('0', 'false', 'no')
+    png = _cached_tile(
+        path, os.path.getmtime(path),
+        _float_arg('t0', 2), _float_arg('t1', 2), _float_arg('f0', 0), _float_arg('f1', 0),
+        width, height, axes
+    )
+    resp = Response(png, mimetype='image/png')
+    resp.headers['Cache-Control'] = 'public, max-age=86400'
+    return resp
+
+
+@app.route('/spectrogram/<uid>/info')
+def spectrogram_info(uid):
+    path = _spectrogram_array_path(uid)
+    if path is None:
+        abort(404)
+    levels, meta = load_spectrogram_array(path)
+    return jsonify({
+        'uid': uid,
+        'duration': meta['duration'],
+        'max_freq': meta['max_freq'],
+        'frames': int(levels.shape[1]),
+        'bins': int(levels.shape[0]),
+    })
 
 @app.route('/wavs/<path:filename>')
 def serve_wavs(filename):
-    return send_from_directory(os.path.join(os.getcwd(), 'wavs'), filename)
+    path = safe_join(WAVS_DIR, filename)
+    if path is None:
+        abort(404)
+    if not os.path.isfile(path):
+        # Captures that have since been archived (compressed and moved into
+        # a date shard) redirect to wherever the file lives now.
+        archived = resolve_archived(WAVS_DIR, filename)
+        if not archived:
+            abort(404)
+        return redirect(url_for('serve_wavs', filename=archived.replace(os.sep, '/'), **request.args), code=301)
+    fmt = request.args.get('fmt')
+    if fmt:
+        if fmt not in TRANSCODE_FORMATS or os.path.splitext(path)[1].lower() not in AUDIO_EXTENSIONS:
+            abort(400)
+        if not path.endswith('.' + fmt):
+            # Without ffmpeg (or if the transcode fails) there is no such
+            # copy; a 404 lets <audio> move on to the next <source>, and
+            # the original is never cached under the ?fmt= URL.
+            path = transcoded_copy(path, WAVS_CACHE_DIR, fmt, WAVS_CACHE_MAX_MB * 1024 * 1024)
+            if path is None:
+                abort(404)
+    # conditional=True answers Range and If-None-Match/If-Modified-Since;
+    # the ETag is strong (mtime, size and a path checksum). Capture files
+    # are never rewritten in place, only moved or deleted, so they can be
+    # cached for good; anything else (parrot playback) is revalidated.
+    if CAPTURE_DATE_RE.search(os.path.basename(filename)):
+        resp = send_file(path, conditional=True, etag=True, max_age=WAVS_IMMUTABLE_MAX_AGE)
+        resp.cache_control.immutable = True
+        return resp
+    return send_file(path, conditional=True, etag=True)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)